@@ -4,19 +4,376 @@ import sqlite3
 import requests
 from bs4 import BeautifulSoup
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, unquote
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import threading
 import time
 import os
+import uuid
+import hashlib
+import zlib
+import base64
+import array
+import mmap
+import calendar
+import email.utils
+import mimetypes
+import cProfile
+import functools
+import inspect
+import heapq
+import itertools
+import statistics
+import selectors
+import signal
+import socket
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from operator import itemgetter
+from stat import S_ISREG
 from http.server import SimpleHTTPRequestHandler
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from typing import NamedTuple, Optional
 
-class HTMLTableParser:
+try:
+    import numpy as np
+except ImportError:  # Optional: only /api/weather/analytics needs it
+    np = None
+
+try:
+    import orjson
+except ImportError:  # Optional: API JSON falls back to the json module
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are gzip-compressed only
+    brotli = None
+
+DB_PATH = '/app/data/weather_data.db'
+# Station pages give Japan Standard Time wall-clock times; servers may run in any zone (often UTC)
+JST = timezone(timedelta(hours=9), 'JST')
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time; the callback returns a number or {label values: number}"""
+    def __init__(self, name, help, callback, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> per-bucket counts (last one is +Inf), then the sum
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+    
+    @contextmanager
+    def timer(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(label_values, list(counts)) for label_values, counts in sorted(self._series.items())]
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                labels = _format_labels(self.labels, label_values, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {counts[-1]!r}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text exposition format"""
     def __init__(self):
+        self._metrics = []
+    
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+    
+    def gauge(self, name, help, callback, labels=()):
+        return self._register(Gauge(name, help, callback, labels))
+    
+    def histogram(self, name, help, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+    
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+FETCH_SECONDS = METRICS.histogram('isewan_scrape_fetch_seconds', 'Station page request latency', ('station',))
+FETCH_BYTES = METRICS.counter('isewan_scrape_fetch_bytes_total', 'Station page bytes downloaded', ('station',))
+FETCH_RESULTS = METRICS.counter('isewan_scrape_fetches_total', 'Station page fetches by result', ('station', 'result'))
+PARSE_SECONDS = METRICS.histogram('isewan_scrape_parse_seconds', 'Station page table parse time', ('station',))
+ALIGN_SECONDS = METRICS.histogram('isewan_scrape_align_seconds', 'Alignment to the reference station time axis')
+SCRAPE_CYCLE_SECONDS = METRICS.histogram('isewan_scrape_cycle_seconds', 'Scrape of a set of stations, fetch to parse')
+INGEST_ROWS = METRICS.counter('isewan_ingest_rows_total', 'Rows handed to WeatherDatabase.ingest by outcome', ('result',))
+DB_QUERY_SECONDS = METRICS.histogram('isewan_db_query_seconds', 'WeatherDatabase method latency', ('method',))
+HTTP_REQUEST_SECONDS = METRICS.histogram('isewan_http_request_seconds', 'API request latency',
+                                         ('method', 'route', 'status'))
+
+def timed(histogram, *label_values):
+    """Decorator observing a function's run time; generator functions are timed until exhausted or closed"""
+    def decorate(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    yield from func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *label_values)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *label_values)
+        return wrapper
+    return decorate
+
+def timed_query(func):
+    return timed(DB_QUERY_SECONDS, func.__name__)(func)
+
+# PROFILE=requests: requests with ?profile=1 are run under cProfile
+# PROFILE=scrapes: every scrape cycle is run under cProfile
+# (comma-separated for both); .prof files are written to PROFILE_DIR
+PROFILE_TARGETS = {target.strip() for target in os.environ.get('PROFILE', '').split(',') if target.strip()}
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/isewan-profiles')
+
+class profiled:
+    """Context manager / decorator that cProfiles its block when `target` is listed in PROFILE"""
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self.enabled = target in PROFILE_TARGETS
+        self.path = None
+    
+    def __enter__(self):
+        self._profiler = None
+        if self.enabled:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return self  # Another profiler is active in this thread
+            self._profiler = profiler
+        return self
+    
+    def __exit__(self, *exc):
+        if self._profiler is not None:
+            self._profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            name = re.sub(r'[^A-Za-z0-9_.-]+', '_', self.name).strip('_')
+            self.path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{self.target}-{name}.prof")
+            self._profiler.dump_stats(self.path)
+        return False
+    
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiled(self.target, self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+class _FirstTableExtractor(HTMLParser):
+    """Streaming html.parser handler that collects the rows of the first table with data.
+
+    Mirrors BeautifulSoup's html.parser tree semantics (no implicit closing of
+    td/tr, nested rows and cells included in their ancestors) without building
+    the tree, and stops as soon as the first data-bearing table has closed.
+    """
+    CELL_TAGS = ('td', 'th')
+    SKIP_TEXT_TAGS = ('script', 'style')
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = None
+        self._stack = []  # Open tags as (tag, row_or_cell)
+        self._table_rows = []
+        self._open_rows = []
+        self._open_cells = []
+        self._text = []
+        self._skip_text = 0
+    
+    @property
+    def done(self):
+        return self.rows is not None
+    
+    def _flush_text(self):
+        # BeautifulSoup strips each string between tags separately
+        if self._text:
+            text = ''.join(self._text).strip()
+            self._text = []
+            if text:
+                for cell in self._open_cells:
+                    cell.append(text)
+    
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        self._flush_text()
+        if tag in self.SKIP_TEXT_TAGS:
+            self._skip_text += 1
+            self._stack.append((tag, None))
+        elif tag == 'table':
+            if not any(t == 'table' for t, _ in self._stack):
+                self._table_rows = []
+            self._stack.append((tag, None))
+        elif not self._stack:
+            return  # Outside any table: nothing to track
+        elif tag == 'tr':
+            row = []
+            self._table_rows.append(row)
+            self._open_rows.append(row)
+            self._stack.append((tag, row))
+        elif tag in self.CELL_TAGS:
+            cell = []
+            for row in self._open_rows:
+                row.append(cell)
+            self._open_cells.append(cell)
+            self._stack.append((tag, cell))
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        if self.done or not any(t == tag for t, _ in self._stack):
+            return
+        self._flush_text()
+        while self._stack:
+            open_tag, obj = self._stack.pop()
+            if open_tag == 'tr':
+                self._open_rows.pop()
+            elif open_tag in self.CELL_TAGS:
+                self._open_cells.pop()
+            elif open_tag in self.SKIP_TEXT_TAGS:
+                self._skip_text -= 1
+            if open_tag == tag:
+                break
+        
+        if tag == 'table' and not any(t == 'table' for t, _ in self._stack):
+            rows = [[''.join(cell) for cell in row] for row in self._table_rows if row]
+            self._table_rows = []
+            if rows:
+                self.rows = rows
+    
+    def handle_data(self, data):
+        if not self.done and not self._skip_text and self._open_cells:
+            self._text.append(data)
+    
+    def handle_comment(self, data):
+        self._flush_text()
+    
+    def close(self):
+        super().close()
+        # Unterminated table at EOF: BeautifulSoup closes it implicitly
+        for tag, _ in self._stack:
+            if tag == 'table':
+                self.handle_endtag('table')
+                break
+
+class HTMLTableParser:
+    CHUNK_SIZE = 16384
+    
+    def __init__(self, backend='stream'):
         self.rows = []
+        self.backend = backend
     
     def parse_html(self, html_content):
+        if self.backend == 'bs4':
+            self.parse_html_bs4(html_content)
+        else:
+            self.parse_html_stream(html_content)
+    
+    def parse_html_stream(self, html_content):
+        """Parse HTML incrementally, stopping after the first table with data"""
+        extractor = _FirstTableExtractor()
+        for start in range(0, len(html_content), self.CHUNK_SIZE):
+            extractor.feed(html_content[start:start + self.CHUNK_SIZE])
+            if extractor.done:
+                break
+        if not extractor.done:
+            extractor.close()
+        
+        if extractor.rows:
+            self.rows = extractor.rows
+    
+    def parse_html_bs4(self, html_content):
         """Parse HTML content using BeautifulSoup"""
         soup = BeautifulSoup(html_content, 'html.parser')
         tables = soup.find_all('table')
@@ -34,131 +391,1643 @@ class HTMLTableParser:
                 self.rows = rows
                 break  # Use the first table with data
 
+class ConnectionPool:
+    """Process-wide SQLite connections: one per (thread, database path), schema set up once per path"""
+    PRAGMAS = (
+        'PRAGMA synchronous=NORMAL',    # Safe with WAL; fsync only at checkpoints
+        'PRAGMA cache_size=-32000',     # 32 MiB page cache per connection
+        'PRAGMA mmap_size=268435456',   # Read through a 256 MiB memory map
+        'PRAGMA temp_store=MEMORY',
+    )
+    
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized = set()
+    
+    def get(self, db_path):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, timeout=self.timeout)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            connections[db_path] = conn
+        return conn
+    
+    def ensure_initialized(self, db_path, init):
+        with self._lock:
+            if db_path not in self._initialized:
+                init()
+                self._initialized.add(db_path)
+
+_connection_pool = ConnectionPool()
+
+class LatestSnapshot:
+    def __init__(self, version, records):
+        self.version = version
+        self.records = records
+        self.body = dumps_json(records)
+        self.etag = f'"latest-{version}-{hashlib.sha1(self.body).hexdigest()[:12]}"'
+        self.variants = {}  # Content-Encoding -> compressed body
+
+class LatestSnapshotCache:
+    """Per-database cache of the newest record per station.
+
+    Kept current on write by WeatherDatabase.ingest in this process. Writes
+    from other processes (the scraper) are picked up through the data_version
+    counter in db_meta, which is checked with a single primary-key read.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+    
+    def get(self, db):
+        version = db._read_data_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._snapshot = LatestSnapshot(version, db.query_latest_records())
+            return snapshot
+    
+    def apply_write(self, db, previous_version, station_codes):
+        """Refresh only the stations touched by an ingest that moved data_version past previous_version"""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            if snapshot.version != previous_version:
+                self._snapshot = None  # Missed another writer; reload on next read
+                return
+            
+            by_station = {record['station_code']: record for record in snapshot.records}
+            for record in db.query_latest_records(station_codes):
+                by_station[record['station_code']] = record
+            records = [by_station[code] for code in sorted(by_station)]
+            self._snapshot = LatestSnapshot(previous_version + 1, records)
+
+_latest_snapshots = {}
+_latest_snapshots_lock = threading.Lock()
+
+class ResponseVariants(dict):
+    """Content-Encoding -> compressed body; on_add(size) is called for each body stored"""
+    def __init__(self, on_add=None):
+        super().__init__()
+        self.on_add = on_add
+    
+    def __setitem__(self, encoding, body):
+        previous = self.get(encoding)
+        super().__setitem__(encoding, body)
+        if self.on_add:
+            self.on_add(len(body) - (len(previous) if previous is not None else 0))
+
+class CachedResponse:
+    def __init__(self, version, span, body):
+        self.version = version
+        self.span = span
+        self.body = body
+        self.size = len(body)  # body plus its compressed variants, as counted by the cache
+        self.etag = f'"q-{hashlib.sha1(body).hexdigest()[:16]}"'
+        self.variants = ResponseVariants()
+
+class QueryResultCache:
+    """Bounded LRU of serialized query responses, stamped with data_version.
+    
+    Each entry remembers the data_version it was built at and the (start, end)
+    ts span its result depends on (None for an open end). Once data_version
+    moves on, version_log tells whether any write since touched that span: if
+    not, the entry is still current. So closed historical ranges survive the
+    scraper's ingests, while open ranges are rebuilt after every write.
+    max_bytes bounds the bodies together with the gzip / brotli variants
+    stored on them as they are first sent.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hit': 0, 'revalidated': 0, 'stale': 0, 'miss': 0, 'evicted': 0}
+    
+    @property
+    def size(self):
+        return self._bytes
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, db, key):
+        """(entry or None, current data_version); pass the version on to put() after a miss"""
+        version = db._read_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        
+        if entry is None:
+            result = 'miss'
+        elif entry.version == version:
+            result = 'hit'
+        elif db.span_unchanged(entry.version, version, entry.span):
+            entry.version = version
+            result = 'revalidated'
+        else:
+            result = 'stale'
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._bytes -= entry.size
+            entry = None
+        
+        with self._lock:
+            self.stats[result] += 1
+        QUERY_CACHE_LOOKUPS.inc(result)
+        return entry, version
+    
+    def put(self, key, version, span, body):
+        """Store body for key; returns the CachedResponse (not kept when over max_entry_bytes)"""
+        entry = CachedResponse(version, span, body)
+        if len(body) > self.max_entry_bytes:
+            return entry
+        entry.variants.on_add = lambda size: self._grow(key, entry, size)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+    
+    def _grow(self, key, entry, size):
+        """Count a compressed variant stored on a cached entry (nothing once it has left the cache)"""
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            entry.size += size
+            self._bytes += size
+            self._evict()
+    
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.stats['evicted'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+_query_caches = {}
+_query_caches_lock = threading.Lock()
+
+def get_query_cache(db_path, max_bytes=64 * 1024 * 1024):
+    with _query_caches_lock:
+        cache = _query_caches.get(db_path)
+        if cache is None:
+            cache = _query_caches[db_path] = QueryResultCache(max_bytes)
+        return cache
+
+QUERY_CACHE_LOOKUPS = METRICS.counter('isewan_query_cache_lookups_total',
+                                      'Query result cache lookups (hit, revalidated after an unrelated write, '
+                                      'stale, miss)', ('result',))
+METRICS.gauge('isewan_query_cache_bytes',
+              'Serialized responses and their compressed variants held by the query result cache',
+              lambda: sum(cache.size for cache in list(_query_caches.values())))
+METRICS.gauge('isewan_query_cache_entries', 'Entries in the query result cache',
+              lambda: sum(len(cache) for cache in list(_query_caches.values())))
+
+class SegmentColumns(NamedTuple):
+    """Decoded archive segment, ts ascending; None values are NaN (floats) / code 0 (directions)"""
+    ts: array.array  # 'q'
+    direction_codes: array.array  # 'H', index + 1 into directions
+    directions: list
+    wind_speed: array.array  # 'd'
+    wave_height: array.array  # 'd'
+    created_at: array.array  # 'q' microseconds
+    seq: array.array  # 'q'
+    
+    def rows(self, start=0, stop=None):
+        """(ts, wind_direction, wind_speed, wave_height, created_at, seq) tuples of positions start:stop"""
+        directions = [None] + self.directions
+        window = slice(start, stop)
+        return [(ts, directions[code], None if speed != speed else speed, None if wave != wave else wave, created, seq)
+                for ts, code, speed, wave, created, seq in zip(
+                    self.ts[window], self.direction_codes[window], self.wind_speed[window],
+                    self.wave_height[window], self.created_at[window], self.seq[window])]
+
+class ArchiveSegment:
+    """One station-month of archived observations in a compressed columnar file.
+    
+    Layout: MAGIC, a 4-byte header length, a JSON header (station, month, row
+    count, ts range, wind direction dictionary and the offset / length of each
+    column), then one zlib block per column. ts, created_at and seq are delta
+    encoded, so the regular 15-minute steps compress to almost nothing. Files
+    are read through mmap: only the header and the column blocks are touched.
+    """
+    MAGIC = b'ISEWANSEG1\n'
+    # name -> (array typecode, delta encoded)
+    COLUMNS = {
+        'ts': ('q', True),
+        'direction_codes': ('H', False),
+        'wind_speed': ('d', False),
+        'wave_height': ('d', False),
+        'created_at': ('q', True),
+        'seq': ('q', True),
+    }
+    
+    @classmethod
+    def write(cls, path, station_code, month, rows):
+        """Write (ts, wind_direction, wind_speed, wave_height, created_at, seq) rows, ts ascending; returns the size"""
+        directions = sorted({row[1] for row in rows if row[1] is not None})
+        codes = {name: index + 1 for index, name in enumerate(directions)}
+        nan = float('nan')
+        values = {
+            'ts': [row[0] for row in rows],
+            'direction_codes': [codes.get(row[1], 0) for row in rows],
+            'wind_speed': [nan if row[2] is None else row[2] for row in rows],
+            'wave_height': [nan if row[3] is None else row[3] for row in rows],
+            'created_at': [row[4] for row in rows],
+            'seq': [row[5] for row in rows],
+        }
+        blocks, columns, offset = [], {}, 0
+        for name, (typecode, delta) in cls.COLUMNS.items():
+            column = values[name]
+            if delta:
+                column = [b - a for a, b in zip([0] + column, column)]
+            block = zlib.compress(array.array(typecode, column).tobytes(), 9)
+            columns[name] = [offset, len(block)]
+            blocks.append(block)
+            offset += len(block)
+        header = json.dumps({
+            'station_code': station_code, 'month': month, 'rows': len(rows),
+            'min_ts': rows[0][0], 'max_ts': rows[-1][0], 'directions': directions, 'columns': columns,
+        }, ensure_ascii=False).encode('utf-8')
+        
+        # Readers may have the old file mapped; replacing the name leaves their mapping intact
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(cls.MAGIC + len(header).to_bytes(4, 'little') + header)
+            for block in blocks:
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+    
+    @classmethod
+    def map(cls, path):
+        """Map a segment file read-only; the mapping stays readable after the file is unlinked or replaced"""
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    @classmethod
+    def read(cls, path):
+        with cls.map(path) as mapped:
+            return cls.decode(mapped, path)
+    
+    @classmethod
+    def decode(cls, mapped, name='segment'):
+        """SegmentColumns of a mapped segment file"""
+        with memoryview(mapped) as view:
+            if view[:len(cls.MAGIC)] != cls.MAGIC:
+                raise ValueError(f"Not an archive segment: {name}")
+            header_start = len(cls.MAGIC) + 4
+            header_end = header_start + int.from_bytes(view[len(cls.MAGIC):header_start], 'little')
+            header = json.loads(bytes(view[header_start:header_end]))
+            columns = {}
+            for column_name, (typecode, delta) in cls.COLUMNS.items():
+                offset, length = header['columns'][column_name]
+                block = view[header_end + offset:header_end + offset + length]
+                column = array.array(typecode, zlib.decompress(block))
+                block.release()
+                if delta:
+                    column = array.array(typecode, itertools.accumulate(column))
+                columns[column_name] = column
+        return SegmentColumns(directions=header['directions'], **columns)
+
 class WeatherDatabase:
+    # resolution -> bucket width in seconds (buckets start at local midnight / the full hour)
+    ROLLUP_RESOLUTIONS = {
+        'hour': 3600,
+        'day': 86400,
+    }
+    COLUMNS = ['id', 'station_name', 'station_code', 'timestamp',
+               'wind_direction', 'wind_speed', 'wave_height', 'created_at']
+    
+    # Observation times are local (JST) wall-clock times stored as the epoch seconds of that
+    # wall-clock time read as UTC, so datetime(ts, 'unixepoch') gives back the original text
+    TS_FROM_TEXT = "CAST(strftime('%s', {value}) AS INTEGER)"
+    TS_TO_TEXT = "datetime({ts}, 'unixepoch')"
+    # created_at is kept in microseconds and rendered like datetime.isoformat()
+    US_FROM_TEXT = ("(CAST(strftime('%s', {value}) AS INTEGER) * 1000000 + CASE WHEN instr({value}, '.') "
+                    "THEN CAST(substr(substr({value}, instr({value}, '.') + 1) || '000000', 1, 6) AS INTEGER) "
+                    "ELSE 0 END)")
+    US_TO_TEXT = ("strftime('%Y-%m-%dT%H:%M:%S', {us} / 1000000, 'unixepoch') || "
+                  "CASE WHEN {us} % 1000000 THEN printf('.%06d', {us} % 1000000) ELSE '' END")
+    # API ids are derived from the clustered key: station_id << 32 | ts
+    ID_SHIFT = 32
+    
+    VERSION_LOG_SIZE = 4096  # data_version steps kept for QueryResultCache revalidation
+    SEGMENT_GRACE_SECONDS = 3600  # Segment files out of archive_segments are kept this long for readers
+    
+    # Null-safe "values differ" test between an existing row and an incoming one
+    CHANGED_CONDITION = (
+        '{old}.wind_direction IS NOT {new}.wind_direction OR '
+        '{old}.wind_speed IS NOT {new}.wind_speed OR '
+        '{old}.wave_height IS NOT {new}.wave_height'
+    )
+    # Date / time text that TS_FROM_TEXT / US_FROM_TEXT (SQLite's strftime) converts; anything else becomes NULL
+    TIMESTAMP_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+                                   r'([ T]([01]\d|2[0-4]):[0-5]\d(:[0-5]\d(\.\d+)?)?)?')
+    
     def __init__(self, db_path='weather_data.db'):
         self.db_path = db_path
-        self.init_database()
+        # Segment files of archived months (see archive_observations)
+        self.archive_dir = f'{os.path.splitext(db_path)[0]}_archive'
+        _connection_pool.ensure_initialized(db_path, self.init_database)
+    
+    def connection(self):
+        return _connection_pool.get(self.db_path)
     
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connection()
+        # WAL lets API reads proceed while the scraper writes (persisted in the database file)
+        conn.execute('PRAGMA journal_mode=WAL')
         cursor = conn.cursor()
         
+        # Station dimension: observations refer to stations by a small integer id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stations (
+                station_id INTEGER PRIMARY KEY,
+                station_code TEXT NOT NULL UNIQUE,
+                station_name TEXT NOT NULL
+            )
+        ''')
+        # Clustered on (station_id, ts): a station's time range is one contiguous b-tree range
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS weather_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                station_name TEXT NOT NULL,
-                station_code TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
+            CREATE TABLE IF NOT EXISTS observations (
+                station_id INTEGER NOT NULL REFERENCES stations(station_id),
+                ts INTEGER NOT NULL,
                 wind_direction TEXT,
                 wind_speed REAL,
                 wave_height REAL,
-                created_at TEXT NOT NULL,
-                UNIQUE(station_code, timestamp)
+                created_at INTEGER NOT NULL,
+                seq INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (station_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        if 'seq' not in [column[1] for column in cursor.execute('PRAGMA table_info(observations)')]:
+            # Databases from before the change feed; numbered by _number_unsequenced_rows below
+            cursor.execute('ALTER TABLE observations ADD COLUMN seq INTEGER NOT NULL DEFAULT 0')
+        
+        # Small key/value table; data_version is bumped by every ingest that changes rows
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('data_version', 0)")
+        # Last observations.seq handed out; every real insert or update takes the next one
+        cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('change_seq', 0)")
+        # ts span written by each data_version step (NULL: not bounded)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS version_log (
+                version INTEGER PRIMARY KEY,
+                min_ts INTEGER,
+                max_ts INTEGER
             )
         ''')
+        # Station-months moved out of observations into ArchiveSegment files; path is relative to archive_dir
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_segments (
+                station_id INTEGER NOT NULL,
+                month_start INTEGER NOT NULL,
+                month_end INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                min_ts INTEGER NOT NULL,
+                max_ts INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                min_seq INTEGER,
+                max_seq INTEGER,
+                PRIMARY KEY (station_id, month_start)
+            ) WITHOUT ROWID
+        ''')
+        if 'max_seq' not in [column[1] for column in cursor.execute('PRAGMA table_info(archive_segments)')]:
+            # Segments archived before the change feed read them; filled in from the files below
+            cursor.execute('ALTER TABLE archive_segments ADD COLUMN min_seq INTEGER')
+            cursor.execute('ALTER TABLE archive_segments ADD COLUMN max_seq INTEGER')
+        for station_id, month_start, path in cursor.execute(
+                'SELECT station_id, month_start, path FROM archive_segments WHERE max_seq IS NULL').fetchall():
+            seq = ArchiveSegment.read(os.path.join(self.archive_dir, path)).seq
+            cursor.execute('UPDATE archive_segments SET min_seq = ?, max_seq = ? WHERE station_id = ? AND month_start = ?',
+                           (min(seq), max(seq), station_id, month_start))
         
-        # Create indexes for better performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_station_timestamp ON weather_data(station_code, timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON weather_data(timestamp)')
+        legacy = self.has_legacy_schema(cursor)
+        if not legacy and cursor.execute("SELECT 1 FROM db_meta WHERE key = 'row_count'").fetchone() is None:
+            # One scan on first start; ingest keeps it current afterwards
+            cursor.execute("INSERT INTO db_meta (key, value) SELECT 'row_count', COUNT(*) FROM observations")
+        if not legacy:
+            rollup_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weather_rollup'").fetchone()
+            self._create_derived_schema(cursor)
+            self._number_unsequenced_rows(cursor)
         
         conn.commit()
-        conn.close()
+        if legacy:
+            # Database from before the station / epoch layout (manage.py migrate-schema does this online)
+            self.migrate_legacy_schema()
+        elif not rollup_exists:
+            # First start on an existing database: one-off backfill, later kept current by ingest
+            self.rebuild_rollups()
         print(f"Database initialized: {self.db_path}")
     
-    def save_weather_data(self, data_list):
-        conn = sqlite3.connect(self.db_path)
+    @staticmethod
+    def has_legacy_schema(cursor):
+        """True while weather_data is still the original text-keyed table (not the compatibility view)"""
+        return cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weather_data'").fetchone() is not None
+    
+    def _create_derived_schema(self, cursor):
+        # Read-only view in the original weather_data shape for ad-hoc SQL and external tools
+        cursor.execute(f'''
+            CREATE VIEW IF NOT EXISTS weather_data AS
+            SELECT (o.station_id << {self.ID_SHIFT}) | o.ts AS id,
+                   s.station_name, s.station_code,
+                   {self.TS_TO_TEXT.format(ts='o.ts')} AS timestamp,
+                   o.wind_direction, o.wind_speed, o.wave_height,
+                   {self.US_TO_TEXT.format(us='o.created_at')} AS created_at
+            FROM observations o JOIN stations s ON s.station_id = o.station_id
+        ''')
+        
+        # Hourly / daily aggregates per station, refreshed by ingest for the buckets it touches
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weather_rollup (
+                resolution TEXT NOT NULL,
+                station_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                wind_speed_min REAL,
+                wind_speed_max REAL,
+                wind_speed_mean REAL,
+                wave_height_max REAL,
+                wind_direction TEXT,
+                PRIMARY KEY (resolution, station_id, bucket)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rollup_bucket ON weather_rollup(resolution, bucket)')
+        # Change feed: rows changed after a given seq
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_observations_seq ON observations(seq)')
+    
+    def migrate_legacy_schema(self, batch_size=50000):
+        """Move the original weather_data table into stations / observations.
+        
+        Rows are copied in id order, one short transaction per batch, so the API
+        and the old scraper keep running; progress is kept in db_meta and an
+        interrupted run resumes. A final write transaction copies rows written in
+        the meantime, drops the old table and replaces it with the view.
+        Returns the number of rows in observations.
+        """
+        conn = self.connection()
         cursor = conn.cursor()
+        if not self.has_legacy_schema(cursor):
+            return cursor.execute('SELECT COUNT(*) FROM observations').fetchone()[0]
         
-        saved_count = 0
+        with conn:
+            # migration_started is on the created_at scale (local wall clock, microseconds)
+            cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('migration_last_id', 0)")
+            cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('migration_started', ?)",
+                           (calendar.timegm(datetime.now().timetuple()) * 1000000,))
+        last_id, started = [cursor.execute('SELECT value FROM db_meta WHERE key = ?', (key,)).fetchone()[0]
+                            for key in ('migration_last_id', 'migration_started')]
+        total = cursor.execute('SELECT COUNT(*) FROM weather_data WHERE id > ?', (last_id,)).fetchone()[0]
+        
+        copied = 0
+        while True:
+            batch_end = cursor.execute(
+                'SELECT MAX(id) FROM (SELECT id FROM weather_data WHERE id > ? ORDER BY id LIMIT ?)',
+                (last_id, batch_size)).fetchone()[0]
+            if batch_end is None:
+                break
+            with conn:
+                copied += self._copy_legacy_rows(cursor, 'w.id > ? AND w.id <= ?', (last_id, batch_end))
+                cursor.execute("UPDATE db_meta SET value = ? WHERE key = 'migration_last_id'", (batch_end,))
+            last_id = batch_end
+            print(f"  migrated {copied:,} / {total:,} rows")
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Rows inserted or rewritten by other writers since the copy started
+            self._copy_legacy_rows(
+                cursor, f"w.id > ? OR {self.US_FROM_TEXT.format(value='w.created_at')} >= ?", (last_id, started))
+            cursor.execute('DROP TABLE weather_data')
+            cursor.execute('DROP TABLE IF EXISTS weather_rollup')
+            cursor.execute("DELETE FROM db_meta WHERE key IN ('migration_last_id', 'migration_started')")
+            self._create_derived_schema(cursor)
+            self._number_unsequenced_rows(cursor)
+            self._rebuild_rollups(cursor)
+            self._bump_data_version(cursor)
+            count = cursor.execute('SELECT COUNT(*) FROM observations').fetchone()[0]
+            cursor.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('row_count', ?)", (count,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print(f"Migrated weather_data to the station / epoch layout: {count:,} rows")
+        return count
+    
+    def _copy_legacy_rows(self, cursor, condition, params):
+        """Upsert the legacy weather_data rows matching condition (alias w); returns the row count"""
+        cursor.execute(f'''
+            INSERT INTO stations (station_code, station_name)
+            SELECT station_code, station_name
+            FROM (SELECT w.station_code, w.station_name, MAX(w.timestamp)
+                  FROM weather_data w WHERE {condition} GROUP BY w.station_code)
+            WHERE true
+            ON CONFLICT(station_code) DO UPDATE SET station_name = excluded.station_name
+            WHERE station_name IS NOT excluded.station_name
+        ''', params)
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO observations
+            (station_id, ts, wind_direction, wind_speed, wave_height, created_at)
+            SELECT s.station_id, {self.TS_FROM_TEXT.format(value='w.timestamp')},
+                   w.wind_direction, w.wind_speed, w.wave_height,
+                   {self.US_FROM_TEXT.format(value='w.created_at')}
+            FROM weather_data w JOIN stations s ON s.station_code = w.station_code
+            WHERE {condition}
+        ''', params)
+        return cursor.rowcount
+    
+    def save_weather_data(self, data_list):
+        stats = self.ingest(data_list)
+        saved_count = stats['inserted'] + stats['updated']
+        skipped = f", {stats['skipped']} skipped" if stats['skipped'] else ''
+        print(f"Saved {saved_count} weather records to database "
+              f"({stats['inserted']} inserted, {stats['updated']} updated, {stats['unchanged']} unchanged{skipped})")
+        return saved_count
+    
+    @timed_query
+    def ingest(self, data_list):
+        """Upsert records in one transaction, only rewriting rows whose values changed.
+        
+        Records are Observations or dicts with the same keys. Later records win
+        over earlier ones with the same (station_code, timestamp). Records with
+        a missing key or an unparseable timestamp are reported and skipped.
+        Returns a dict with inserted / updated / unchanged / skipped counts.
+        """
+        created_at = datetime.now().isoformat()
+        valid_timestamp = self.TIMESTAMP_PATTERN.fullmatch
+        rows = []
+        skipped = 0
         for data in data_list:
             try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO weather_data 
-                    (station_name, station_code, timestamp, wind_direction, wind_speed, wave_height, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    data['station_name'],
-                    data['station_code'],
-                    data['timestamp'],
-                    data.get('wind_direction'),
-                    data.get('wind_speed'),
-                    data.get('wave_height'),
-                    datetime.now().isoformat()
-                ))
-                saved_count += 1
-            except Exception as e:
+                if isinstance(data, Observation):
+                    given_created_at = data.created_at
+                    row = data[:6] + (given_created_at or created_at,)
+                else:
+                    given_created_at = data.get('created_at')
+                    row = (
+                        data['station_code'],
+                        data['station_name'],
+                        data['timestamp'],
+                        data.get('wind_direction'),
+                        data.get('wind_speed'),
+                        data.get('wave_height'),
+                        given_created_at or created_at
+                    )
+                if row[0] is None or row[1] is None:
+                    raise ValueError("missing station")
+                if not valid_timestamp(row[2]):
+                    raise ValueError(f"invalid timestamp {row[2]!r}")
+                if given_created_at and not valid_timestamp(given_created_at):
+                    raise ValueError(f"invalid created_at {given_created_at!r}")
+            except (KeyError, TypeError, ValueError) as e:
                 print(f"Error saving data: {e}")
+                skipped += 1
+                continue
+            rows.append(row)
         
-        conn.commit()
-        conn.close()
-        print(f"Saved {saved_count} weather records to database")
-        return saved_count
+        conn = self.connection()
+        with conn:
+            cursor = conn.cursor()
+            # Stage the batch so duplicates collapse and change detection is one set-based join
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS ingest_batch (
+                    station_code TEXT NOT NULL,
+                    station_name TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    wind_direction TEXT,
+                    wind_speed REAL,
+                    wave_height REAL,
+                    created_at INTEGER NOT NULL,
+                    PRIMARY KEY (station_code, ts)
+                )
+            ''')
+            cursor.execute('DELETE FROM temp.ingest_batch')
+            cursor.executemany(f'''
+                INSERT OR REPLACE INTO temp.ingest_batch
+                (station_code, station_name, ts, wind_direction, wind_speed, wave_height, created_at)
+                VALUES (?1, ?2, {self.TS_FROM_TEXT.format(value='?3')}, ?4, ?5, ?6, {self.US_FROM_TEXT.format(value='?7')})
+            ''', rows)
+            
+            # New stations, and renames (the name of a station's newest row in the batch wins)
+            cursor.execute('''
+                INSERT INTO stations (station_code, station_name)
+                SELECT station_code, station_name
+                FROM (SELECT station_code, station_name, MAX(ts) FROM temp.ingest_batch GROUP BY station_code)
+                WHERE true
+                ON CONFLICT(station_code) DO UPDATE SET station_name = excluded.station_name
+                WHERE station_name IS NOT excluded.station_name
+            ''')
+            stations_changed = cursor.rowcount
+            # Writes into archived months bring the whole month back first
+            self._restore_archived_months(cursor)
+            
+            # Rollup buckets of rows that are new or changed (computed before the upsert overwrites them)
+            self._stage_rollup_buckets(cursor, f'''
+                SELECT s.station_id, b.ts
+                FROM temp.ingest_batch b
+                JOIN stations s ON s.station_code = b.station_code
+                LEFT JOIN observations o ON o.station_id = s.station_id AND o.ts = b.ts
+                WHERE o.ts IS NULL OR {self.CHANGED_CONDITION.format(old='o', new='b')}
+            ''')
+            
+            changed = f"o.ts IS NULL OR {self.CHANGED_CONDITION.format(old='o', new='b')}"
+            staged, inserted, updated, min_ts, max_ts = cursor.execute(f'''
+                SELECT COUNT(*),
+                       COALESCE(SUM(o.ts IS NULL), 0),
+                       COALESCE(SUM(o.ts IS NOT NULL AND ({self.CHANGED_CONDITION.format(old='o', new='b')})), 0),
+                       MIN(CASE WHEN {changed} THEN b.ts END),
+                       MAX(CASE WHEN {changed} THEN b.ts END)
+                FROM temp.ingest_batch b
+                JOIN stations s ON s.station_code = b.station_code
+                LEFT JOIN observations o ON o.station_id = s.station_id AND o.ts = b.ts
+            ''').fetchone()
+            
+            # Only new or changed rows are written, each with the next change sequence number
+            cursor.execute(f'''
+                INSERT INTO observations
+                (station_id, ts, wind_direction, wind_speed, wave_height, created_at, seq)
+                SELECT s.station_id, b.ts, b.wind_direction, b.wind_speed, b.wave_height, b.created_at,
+                       (SELECT value FROM db_meta WHERE key = 'change_seq') + ROW_NUMBER() OVER (ORDER BY s.station_id, b.ts)
+                FROM temp.ingest_batch b
+                JOIN stations s ON s.station_code = b.station_code
+                LEFT JOIN observations o ON o.station_id = s.station_id AND o.ts = b.ts
+                WHERE {changed}
+                ON CONFLICT(station_id, ts) DO UPDATE SET
+                    wind_direction = excluded.wind_direction,
+                    wind_speed = excluded.wind_speed,
+                    wave_height = excluded.wave_height,
+                    created_at = excluded.created_at,
+                    seq = excluded.seq
+                WHERE {self.CHANGED_CONDITION.format(old='observations', new='excluded')}
+            ''')
+            
+            previous_version = None
+            if inserted or updated:
+                cursor.execute("UPDATE db_meta SET value = value + ? WHERE key = 'change_seq'", (inserted + updated,))
+            if inserted:
+                cursor.execute("UPDATE db_meta SET value = value + ? WHERE key = 'row_count'", (inserted,))
+            if inserted or updated or stations_changed:
+                self._refresh_staged_rollups(cursor)
+                # A rename changes station_name in every row of the station
+                span = None if stations_changed else (min_ts, max_ts)
+                previous_version = self._bump_data_version(cursor, span)
+                touched_stations = [row[0] for row in cursor.execute(
+                    'SELECT DISTINCT station_code FROM temp.ingest_batch')]
+            cursor.execute('DELETE FROM temp.ingest_batch')
+        
+        if previous_version is not None:
+            self._latest_snapshot().apply_write(self, previous_version, touched_stations)
+            notify_data_changed(self.db_path)
+        
+        INGEST_ROWS.inc('inserted', amount=inserted)
+        INGEST_ROWS.inc('updated', amount=updated)
+        INGEST_ROWS.inc('unchanged', amount=staged - inserted - updated)
+        INGEST_ROWS.inc('skipped', amount=skipped)
+        return {'inserted': inserted, 'updated': updated, 'unchanged': staged - inserted - updated,
+                'skipped': skipped}
     
-    def get_weather_data(self, start_date=None, end_date=None, station_code=None, limit=None):
-        conn = sqlite3.connect(self.db_path)
+    def _restore_archived_months(self, cursor):
+        """Move the archived station-months that temp.ingest_batch writes into back into observations.
+        
+        Change detection and the rollup refresh then see the whole month again;
+        rows keep their change seq. Segment files are retired, not deleted, as
+        readers may still be about to map them (see _remove_unindexed_segments).
+        Returns the number of rows restored.
+        """
+        # Months are at most 31 days, so the month_start range is a short PK seek per batch row
+        segments = cursor.execute('''
+            SELECT DISTINCT a.station_id, a.month_start, a.path
+            FROM temp.ingest_batch b
+            JOIN stations s ON s.station_code = b.station_code
+            JOIN archive_segments a ON a.station_id = s.station_id
+                AND a.month_start <= b.ts AND a.month_start > b.ts - 31 * 86400 AND a.month_end > b.ts
+        ''').fetchall()
+        restored = 0
+        for station_id, month_start, path in segments:
+            segment = ArchiveSegment.read(os.path.join(self.archive_dir, path))
+            cursor.executemany('''
+                INSERT OR IGNORE INTO observations
+                (station_id, ts, wind_direction, wind_speed, wave_height, created_at, seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(station_id,) + row for row in segment.rows()])
+            restored += cursor.rowcount
+            cursor.execute('DELETE FROM archive_segments WHERE station_id = ? AND month_start = ?',
+                           (station_id, month_start))
+            self._retire_segment(path)
+        if restored:
+            cursor.execute("UPDATE db_meta SET value = value + ? WHERE key = 'row_count'", (restored,))
+        return restored
+    
+    @staticmethod
+    def month_start(epoch):
+        """Start of the month containing epoch (on the ts scale)"""
+        year, month = time.gmtime(epoch)[:2]
+        return calendar.timegm((year, month, 1, 0, 0, 0))
+    
+    @timed_query
+    def archive_observations(self, before):
+        """Move observations of months before the one containing epoch `before` into segment files.
+        
+        Each station-month becomes one ArchiveSegment file under archive_dir,
+        written before the transaction that deletes its rows from observations
+        and records it in archive_segments. Reads merge the segments back in and
+        the rollups of archived months are kept, so query results are unchanged
+        and data_version is not bumped.
+        Returns a dict with segments / rows / bytes written.
+        """
+        cutoff = self.month_start(before)
+        conn = self.connection()
+        cursor = conn.cursor()
+        self._remove_unindexed_segments(cursor)
+        totals = {'segments': 0, 'rows': 0, 'bytes': 0}
+        for station_id, code, _ in self._stations(cursor):
+            months = cursor.execute('''
+                SELECT DISTINCT strftime('%Y-%m', ts, 'unixepoch') FROM observations WHERE station_id = ? AND ts < ?
+            ''', (station_id, cutoff)).fetchall()
+            for (month,) in months:
+                month_start = calendar.timegm(time.strptime(month, '%Y-%m'))
+                month_end = self.month_start(month_start + 31 * 86400)
+                relative_path = os.path.join(str(station_id), f'{month}.seg')
+                path = os.path.join(self.archive_dir, relative_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    rows = cursor.execute('''
+                        SELECT ts, wind_direction, wind_speed, wave_height, created_at, seq
+                        FROM observations WHERE station_id = ? AND ts >= ? AND ts < ? ORDER BY ts
+                    ''', (station_id, month_start, month_end)).fetchall()
+                    existing = cursor.execute('SELECT path FROM archive_segments WHERE station_id = ? AND month_start = ?',
+                                              (station_id, month_start)).fetchone()
+                    if existing:
+                        # Observation rows win over the archived copy of the same ts
+                        merged = {row[0]: row for row in ArchiveSegment.read(
+                            os.path.join(self.archive_dir, existing[0])).rows()}
+                        merged.update((row[0], row) for row in rows)
+                        rows = [merged[ts] for ts in sorted(merged)]
+                    size = ArchiveSegment.write(path, code, month, rows)
+                    cursor.execute('DELETE FROM observations WHERE station_id = ? AND ts >= ? AND ts < ?',
+                                   (station_id, month_start, month_end))
+                    cursor.execute("UPDATE db_meta SET value = value - ? WHERE key = 'row_count'", (cursor.rowcount,))
+                    seqs = [row[5] for row in rows]
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO archive_segments
+                        (station_id, month_start, month_end, path, row_count, min_ts, max_ts, size, min_seq, max_seq)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (station_id, month_start, month_end, relative_path, len(rows), rows[0][0], rows[-1][0], size,
+                          min(seqs), max(seqs)))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                totals['segments'] += 1
+                totals['rows'] += len(rows)
+                totals['bytes'] += size
+        return totals
+    
+    @timed_query
+    def drop_archived_months(self, before):
+        """Delete archived station-months ending before the month containing epoch `before` (retention).
+        
+        Their rollup buckets go too. Returns a dict with the segments / rows dropped.
+        """
+        cutoff = self.month_start(before)
+        conn = self.connection()
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            dropped = cursor.execute('''
+                SELECT station_id, month_start, month_end, path, row_count, min_ts
+                FROM archive_segments WHERE month_end <= ?
+            ''', (cutoff,)).fetchall()
+            for station_id, month_start, month_end, path, *_ in dropped:
+                cursor.execute('DELETE FROM weather_rollup WHERE station_id = ? AND bucket >= ? AND bucket < ?',
+                               (station_id, month_start, month_end))
+                self._retire_segment(path)
+            cursor.execute('DELETE FROM archive_segments WHERE month_end <= ?', (cutoff,))
+            if dropped:
+                self._bump_data_version(cursor, (min(row[5] for row in dropped), cutoff - 1))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self._remove_unindexed_segments(cursor)
+        return {'segments': len(dropped), 'rows': sum(row[4] for row in dropped)}
+    
+    def _retire_segment(self, relative_path):
+        """Start the grace period of a segment file that was just removed from archive_segments"""
+        try:
+            os.utime(os.path.join(self.archive_dir, relative_path))
+        except FileNotFoundError:
+            pass
+    
+    def _remove_unindexed_segments(self, cursor):
+        """Delete segment files no longer in archive_segments (restored or dropped months, interrupted writes).
+        
+        A reader maps the segments it needs right after reading archive_segments,
+        and a mapping outlives the file; files are only deleted once they have been
+        out of the index for SEGMENT_GRACE_SECONDS, so no reader can still be about
+        to map one.
+        """
+        indexed = {os.path.join(self.archive_dir, row[0]) for row in cursor.execute('SELECT path FROM archive_segments')}
+        retired_before = time.time() - self.SEGMENT_GRACE_SECONDS
+        for directory, _, files in os.walk(self.archive_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                if path not in indexed and os.path.getmtime(path) < retired_before:
+                    os.unlink(path)
+    
+    def get_archive_stats(self):
+        """Segment count, archived rows and bytes on disk"""
+        segments, rows, size = self.connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(size), 0) FROM archive_segments').fetchone()
+        return {'segments': segments, 'rows': rows, 'bytes': size}
+    
+    def _bump_data_version(self, cursor, span=None):
+        """Increment data_version inside the caller's transaction; returns the previous value.
         
-        query = 'SELECT * FROM weather_data WHERE 1=1'
+        span is the (min_ts, max_ts) of the rows written; None when the change is not bounded.
+        """
+        previous = self._read_data_version(cursor)
+        cursor.execute("UPDATE db_meta SET value = ? WHERE key = 'data_version'", (previous + 1,))
+        min_ts, max_ts = span or (None, None)
+        cursor.execute('INSERT OR REPLACE INTO version_log (version, min_ts, max_ts) VALUES (?, ?, ?)',
+                       (previous + 1, min_ts, max_ts))
+        cursor.execute('DELETE FROM version_log WHERE version <= ?', (previous + 1 - self.VERSION_LOG_SIZE,))
+        return previous
+    
+    def _number_unsequenced_rows(self, cursor):
+        """Give rows without a change seq (migrated or pre-feed data) the next numbers, oldest write first"""
+        if cursor.execute('SELECT 1 FROM observations WHERE seq = 0 LIMIT 1').fetchone() is None:
+            return 0
+        cursor.execute('''
+            UPDATE observations SET seq = numbered.seq
+            FROM (SELECT station_id, ts,
+                         (SELECT value FROM db_meta WHERE key = 'change_seq')
+                         + ROW_NUMBER() OVER (ORDER BY created_at, station_id, ts) AS seq
+                  FROM observations WHERE seq = 0) AS numbered
+            WHERE observations.station_id = numbered.station_id AND observations.ts = numbered.ts
+        ''')
+        numbered = cursor.rowcount
+        cursor.execute("UPDATE db_meta SET value = value + ? WHERE key = 'change_seq'", (numbered,))
+        return numbered
+    
+    def span_unchanged(self, since_version, version, span):
+        """True if no write after since_version (up to version) touched ts in span: (start, end), None = open"""
+        start, end = span
+        logged, overlapping = self.connection().execute('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(min_ts IS NULL OR ((?1 IS NULL OR max_ts >= ?1) AND (?2 IS NULL OR min_ts <= ?2))), 0)
+            FROM version_log WHERE version > ?3 AND version <= ?4
+        ''', (start, end, since_version, version)).fetchone()
+        # Steps trimmed from the log (or written before it existed) count as changes
+        return logged == version - since_version and not overlapping
+    
+    def _read_data_version(self, cursor=None):
+        cursor = cursor or self.connection().cursor()
+        row = cursor.execute("SELECT value FROM db_meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def to_epoch(value):
+        """Epoch seconds of a date / datetime query parameter, on the same wall-clock scale as ts"""
+        try:
+            moment = datetime.fromisoformat(value.strip())
+        except (AttributeError, ValueError) as e:
+            raise ValueError(f"Invalid date: {value}") from e
+        return calendar.timegm(moment.timetuple())
+    
+    def _stations(self, cursor, station_code=None):
+        """(station_id, station_code, station_name) tuples ordered by station_code"""
+        query = 'SELECT station_id, station_code, station_name FROM stations'
         params = []
+        if station_code:
+            query += ' WHERE station_code = ?'
+            params.append(station_code)
+        return cursor.execute(query + ' ORDER BY station_code', params).fetchall()
+    
+    def _stage_rollup_buckets(self, cursor, source_query):
+        """Collect the hour and day buckets of (station_id, ts) rows from source_query"""
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS rollup_buckets (
+                resolution TEXT NOT NULL,
+                station_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                bucket_end INTEGER NOT NULL,
+                PRIMARY KEY (resolution, station_id, bucket)
+            )
+        ''')
+        cursor.execute('DELETE FROM temp.rollup_buckets')
+        for resolution, width in self.ROLLUP_RESOLUTIONS.items():
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO temp.rollup_buckets (resolution, station_id, bucket, bucket_end)
+                SELECT ?1, station_id, bucket, bucket + ?2
+                FROM (SELECT DISTINCT station_id, ts - ts % ?2 AS bucket FROM ({source_query}))
+            ''', (resolution, width))
+    
+    def _refresh_staged_rollups(self, cursor):
+        """Recompute the staged rollup buckets from observations (each is a short clustered range scan)"""
+        cursor.execute('''
+            DELETE FROM weather_rollup WHERE (resolution, station_id, bucket) IN (
+                SELECT resolution, station_id, bucket FROM temp.rollup_buckets)
+        ''')
+        cursor.execute('''
+            INSERT INTO weather_rollup
+            (resolution, station_id, bucket, sample_count,
+             wind_speed_min, wind_speed_max, wind_speed_mean, wave_height_max, wind_direction)
+            SELECT b.resolution, b.station_id, b.bucket, COUNT(*),
+                   MIN(o.wind_speed), MAX(o.wind_speed), AVG(o.wind_speed), MAX(o.wave_height),
+                   (SELECT d.wind_direction FROM observations d
+                    WHERE d.station_id = b.station_id AND d.ts >= b.bucket
+                      AND d.ts < b.bucket_end AND d.wind_direction IS NOT NULL
+                    GROUP BY d.wind_direction ORDER BY COUNT(*) DESC, d.wind_direction LIMIT 1)
+            FROM temp.rollup_buckets b
+            JOIN observations o ON o.station_id = b.station_id
+                AND o.ts >= b.bucket AND o.ts < b.bucket_end
+            GROUP BY b.resolution, b.station_id, b.bucket
+        ''')
+        cursor.execute('DELETE FROM temp.rollup_buckets')
+    
+    def _rebuild_rollups(self, cursor):
+        # Buckets of archived months cannot be recomputed from observations and are kept
+        cursor.execute('''
+            DELETE FROM weather_rollup WHERE NOT EXISTS (
+                SELECT 1 FROM archive_segments a
+                WHERE a.station_id = weather_rollup.station_id
+                  AND weather_rollup.bucket >= a.month_start AND weather_rollup.bucket < a.month_end)
+        ''')
+        self._stage_rollup_buckets(cursor, 'SELECT station_id, ts FROM observations')
+        self._refresh_staged_rollups(cursor)
+        return cursor.execute('SELECT COUNT(*) FROM weather_rollup').fetchone()[0]
+    
+    @timed_query
+    def rebuild_rollups(self):
+        """Recompute every rollup bucket from observations (backfill / repair)"""
+        conn = self.connection()
+        with conn:
+            count = self._rebuild_rollups(conn.cursor())
+        print(f"Rebuilt {count} rollup buckets")
+        return count
+    
+    @timed_query
+    def get_rollup_data(self, resolution, start_date=None, end_date=None, station_code=None):
+        """Aggregated rows, newest bucket first; wind_speed is the bucket mean, wave_height the maximum"""
+        width = self.ROLLUP_RESOLUTIONS[resolution]
+        query = f'''
+            SELECT r.resolution, s.station_code, s.station_name, {self.TS_TO_TEXT.format(ts='r.bucket')},
+                   r.sample_count, r.wind_speed_min, r.wind_speed_max, r.wind_speed_mean,
+                   r.wave_height_max, r.wind_direction
+            FROM weather_rollup r JOIN stations s ON s.station_id = r.station_id
+            WHERE r.resolution = ?
+        '''
+        params = [resolution]
         
         if start_date:
-            query += ' AND timestamp >= ?'
-            params.append(start_date)
+            # Include the bucket that contains start_date
+            start = self.to_epoch(start_date)
+            query += ' AND r.bucket >= ?'
+            params.append(start - start % width)
         
         if end_date:
-            query += ' AND timestamp <= ?'
-            params.append(end_date)
+            query += ' AND r.bucket <= ?'
+            params.append(self.to_epoch(end_date))
         
         if station_code:
-            query += ' AND station_code = ?'
+            query += ' AND s.station_code = ?'
             params.append(station_code)
         
-        query += ' ORDER BY timestamp DESC'
+        query += ' ORDER BY r.bucket DESC, s.station_code DESC'
+        
+        records = []
+        for row in self.connection().execute(query, params):
+            (resolution, code, station_name, bucket, sample_count,
+             wind_speed_min, wind_speed_max, wind_speed_mean, wave_height_max, wind_direction) = row
+            records.append({
+                'station_name': station_name,
+                'station_code': code,
+                'timestamp': bucket,
+                'resolution': resolution,
+                'sample_count': sample_count,
+                'wind_direction': wind_direction,
+                'wind_speed': wind_speed_mean,
+                'wind_speed_min': wind_speed_min,
+                'wind_speed_max': wind_speed_max,
+                'wave_height': wave_height_max
+            })
+        return records
+    
+    @timed_query
+    def choose_resolution(self, start_date=None, end_date=None, station_code=None, max_points=5000):
+        """Finest resolution (raw, hour, day) whose estimated point count fits max_points"""
+        cursor = self.connection().cursor()
+        try:
+            start = self.to_epoch(start_date) if start_date else None
+            end = self.to_epoch(end_date) if end_date else None
+        except ValueError:
+            return 'day'
+        if start is None or end is None:
+            # Per-station MIN / MAX are seeks at either end of each clustered range
+            first, last = cursor.execute('''
+                SELECT MIN((SELECT MIN(ts) FROM observations o WHERE o.station_id = s.station_id)),
+                       MAX((SELECT MAX(ts) FROM observations o WHERE o.station_id = s.station_id))
+                FROM stations s
+            ''').fetchone()
+            archived_first = cursor.execute('SELECT MIN(min_ts) FROM archive_segments').fetchone()[0]
+            if archived_first is not None:
+                first = archived_first if first is None else min(first, archived_first)
+            start, end = first if start is None else start, last if end is None else end
+        if start is None or end is None:
+            return 'day'
+        span = end - start
+        stations = 1 if station_code else max(1, cursor.execute('SELECT COUNT(*) FROM stations').fetchone()[0])
+        
+        for resolution, step_seconds in (('raw', 15 * 60), ('hour', 3600), ('day', 86400)):
+            if (span / step_seconds + 1) * stations <= max_points:
+                return resolution
+        return 'day'
+    
+    @timed_query
+    def get_weather_data(self, start_date=None, end_date=None, station_code=None, limit=None):
+        return list(self.iter_weather_data(start_date, end_date, station_code, limit))
+    
+    @timed_query
+    def iter_weather_data(self, start_date=None, end_date=None, station_code=None, limit=None,
+                          after=None, batch_size=1000):
+        """Yield rows newest first, ordered by (timestamp, station_code) descending.
+        
+        `after` is a (timestamp, station_code) keyset cursor: only rows strictly
+        after it in that order are returned. Each station is read as one range of
+        the clustered (station_id, ts) key and the streams are merged, so memory
+        stays flat however large the range is.
+        """
+        start = self.to_epoch(start_date) if start_date else None
+        end = self.to_epoch(end_date) if end_date else None
+        after_ts, after_code = (self.to_epoch(after[0]), after[1]) if after else (None, None)
+        
+        conn = self.connection()
+        cursors = []
+        streams = []
+        for station in self._stations(conn.cursor(), station_code):
+            cursor = conn.cursor()
+            cursors.append(cursor)
+            streams.append(self._iter_station_rows(
+                cursor, station, start, end, after_ts, after_code, limit, batch_size))
+        
+        # Rows are (ts, station_code, ...) tuples, so the merge compares them natively
+        rows = heapq.merge(*streams, reverse=True) if len(streams) > 1 else itertools.chain(*streams)
+        created_at_text = {}
+        try:
+            for ts, code, timestamp, row_id, name, wind_direction, wind_speed, wave_height, created_at in \
+                    itertools.islice(rows, limit or None):
+                # created_at is shared by every row of an ingest batch; memoize its formatting
+                created = created_at_text.get(created_at)
+                if created is None:
+                    if len(created_at_text) > 4096:
+                        created_at_text.clear()
+                    created = created_at_text[created_at] = self.format_created_at(created_at)
+                yield {
+                    'id': row_id,
+                    'station_name': name,
+                    'station_code': code,
+                    'timestamp': timestamp,
+                    'wind_direction': wind_direction,
+                    'wind_speed': wind_speed,
+                    'wave_height': wave_height,
+                    'created_at': created
+                }
+        finally:
+            # Also releases the read snapshot when a client disconnects mid-stream
+            for cursor in cursors:
+                cursor.close()
+    
+    @staticmethod
+    def format_created_at(microseconds):
+        """created_at in microseconds -> datetime.isoformat() text"""
+        seconds, fraction = divmod(microseconds, 1000000)
+        text = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+        return f'{text}.{fraction:06d}' if fraction else text
+    
+    def _iter_station_rows(self, cursor, station, start, end, after_ts, after_code, limit, batch_size):
+        """One station's rows, newest first, as (ts, station_code, timestamp, id, station_name,
+        wind_direction, wind_speed, wave_height, created_at microseconds) tuples"""
+        station_id, code, name = station
+        query = f'''
+            SELECT ts, {self.TS_TO_TEXT.format(ts='ts')}, wind_direction, wind_speed, wave_height, created_at
+            FROM observations WHERE station_id = ?
+        '''
+        params = [station_id]
+        
+        if start is not None:
+            query += ' AND ts >= ?'
+            params.append(start)
+        
+        if end is not None:
+            query += ' AND ts <= ?'
+            params.append(end)
+        
+        if after_ts is not None:
+            # Same timestamp: only stations that sort below the cursor's station are still ahead
+            query += ' AND ts <= ?' if code < after_code else ' AND ts < ?'
+            params.append(after_ts)
+        
+        query += ' ORDER BY ts DESC'
         
         if limit:
             query += ' LIMIT ?'
             params.append(limit)
         
+        id_base = station_id << self.ID_SHIFT
         cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        columns = ['id', 'station_name', 'station_code', 'timestamp', 
-                  'wind_direction', 'wind_speed', 'wave_height', 'created_at']
+        # Read while the observations statement is active: same snapshot, so a concurrent
+        # archive run moves rows either before or after both reads
+        segments = cursor.connection.execute('''
+            SELECT path, max_ts FROM archive_segments
+            WHERE station_id = ?1 AND (?2 IS NULL OR max_ts >= ?2) AND (?3 IS NULL OR min_ts <= ?3)
+            ORDER BY month_start DESC
+        ''', (station_id, start, end if after_ts is None else after_ts if end is None else min(end, after_ts))).fetchall()
+        rows = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(batch_size), []))
+        if segments:
+            archived = self._iter_archived_rows([os.path.join(self.archive_dir, row[0]) for row in segments],
+                                                start, end, after_ts, after_ts is not None and code < after_code)
+            rows = itertools.islice(self._merge_archived_rows(rows, segments[0][1], archived), limit or None)
+        for ts, timestamp, wind_direction, wind_speed, wave_height, created_at in rows:
+            yield (ts, code, timestamp, id_base | ts, name, wind_direction, wind_speed, wave_height, created_at)
+    
+    @staticmethod
+    def _merge_archived_rows(rows, archived_max_ts, archived):
+        """Merge newest-first observations rows with archived ones; observations win on equal ts"""
+        # Rows newer than the archive pass straight through, so recent queries never open a segment
+        for row in rows:
+            if row[0] <= archived_max_ts:
+                rows = itertools.chain([row], rows)
+                break
+            yield row
+        # Stable merge: an observations row comes before an archived copy of the same ts, which is skipped
+        merged = heapq.merge(rows, archived, key=itemgetter(0), reverse=True)
+        for _, group in itertools.groupby(merged, key=itemgetter(0)):
+            yield next(group)
+    
+    @staticmethod
+    def _iter_archived_rows(paths, start, end, after_ts, after_inclusive):
+        """Rows of segment files (given newest month first) in the shape of the observations query, newest first.
         
-        return [dict(zip(columns, row)) for row in rows]
+        Every file is mapped as soon as the first archived row is wanted; a file
+        retired after that stays readable through its mapping for the rest of the
+        stream (and until then through the grace period of _remove_unindexed_segments).
+        """
+        mappings = [ArchiveSegment.map(path) for path in paths]
+        clock_text = {}
+        try:
+            for mapped in mappings:
+                segment = ArchiveSegment.decode(mapped)
+                low = 0 if start is None else bisect_left(segment.ts, start)
+                high = len(segment.ts) if end is None else bisect_right(segment.ts, end)
+                if after_ts is not None:
+                    high = min(high, (bisect_right if after_inclusive else bisect_left)(segment.ts, after_ts))
+                # Same text as datetime(ts, 'unixepoch'), built from per-day and per-time-of-day parts
+                day = day_text = None
+                for ts, wind_direction, wind_speed, wave_height, created_at, _ in reversed(segment.rows(low, high)):
+                    days, seconds = divmod(ts, 86400)
+                    if days != day:
+                        day, day_text = days, time.strftime('%Y-%m-%d ', time.gmtime(ts))
+                    clock = clock_text.get(seconds)
+                    if clock is None:
+                        clock = clock_text[seconds] = time.strftime('%H:%M:%S', time.gmtime(seconds))
+                    yield (ts, day_text + clock, wind_direction, wind_speed, wave_height, created_at)
+                mapped.close()
+        finally:
+            for mapped in mappings:
+                mapped.close()
+    
+    @timed_query
+    def get_weather_page(self, start_date=None, end_date=None, station_code=None, page_size=1000, cursor=None):
+        """One keyset page: (records, next_cursor); next_cursor is None on the last page"""
+        after = self.decode_page_cursor(cursor) if cursor else None
+        records = list(self.iter_weather_data(start_date, end_date, station_code, page_size + 1, after))
+        next_cursor = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_cursor = self.encode_page_cursor(records[-1])
+        return records, next_cursor
+    
+    @staticmethod
+    def encode_page_cursor(record):
+        token = json.dumps([record['timestamp'], record['station_code']], ensure_ascii=False)
+        return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_page_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            timestamp, station_code = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        return str(timestamp), str(station_code)
     
     def get_latest_data(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return list(self._latest_snapshot().get(self).records)
+    
+    @timed_query
+    def get_latest_snapshot(self):
+        """Latest records per station with their pre-serialized JSON body and ETag"""
+        return self._latest_snapshot().get(self)
+    
+    def _latest_snapshot(self):
+        with _latest_snapshots_lock:
+            cache = _latest_snapshots.get(self.db_path)
+            if cache is None:
+                cache = _latest_snapshots[self.db_path] = LatestSnapshotCache()
+            return cache
+    
+    @timed_query
+    def query_latest_records(self, station_codes=None):
+        """Newest row per station: one seek to the end of each station's clustered range"""
+        if station_codes is None:
+            station_codes = [code for _, code, _ in self._stations(self.connection().cursor())]
+        return [record for station_code in station_codes
+                for record in self.iter_weather_data(station_code=station_code, limit=1)]
+    
+    @timed_query
+    def get_changes(self, since=0, limit=1000):
+        """Rows inserted or updated after change seq `since`, oldest change first.
         
-        cursor.execute('''
-            SELECT * FROM weather_data w1
-            WHERE timestamp = (
-                SELECT MAX(timestamp) FROM weather_data w2 
-                WHERE w2.station_code = w1.station_code
-            )
-            ORDER BY station_code
-        ''')
+        Returns (records, next_since, has_more): records carry their `seq`, and
+        next_since is the cursor for the following batch. Each change is reported
+        once, with the row's current values; a row changed again moves to its new seq.
+        Archived rows keep their seq and are read from the segments that hold seqs
+        after `since`.
+        """
+        cursor = self.connection().cursor()
+        rows = cursor.execute(f'''
+            SELECT o.seq, (o.station_id << {self.ID_SHIFT}) | o.ts, s.station_name, s.station_code,
+                   {self.TS_TO_TEXT.format(ts='o.ts')}, o.wind_direction, o.wind_speed, o.wave_height, o.created_at
+            FROM observations o JOIN stations s ON s.station_id = o.station_id
+            WHERE o.seq > ?
+            ORDER BY o.seq
+            LIMIT ?
+        ''', (since, limit + 1)).fetchall()
+        segments = cursor.execute('''
+            SELECT a.path, a.station_id, a.min_seq, s.station_name, s.station_code
+            FROM archive_segments a JOIN stations s ON s.station_id = a.station_id
+            WHERE a.max_seq > ?
+            ORDER BY a.min_seq
+        ''', (since,)).fetchall()
+        for path, station_id, min_seq, name, code in segments:
+            # Segments are taken in min_seq order, so none after this one can reach the first limit + 1 changes
+            if len(rows) > limit and min_seq > rows[limit][0]:
+                break
+            segment = ArchiveSegment.read(os.path.join(self.archive_dir, path))
+            rows += [(seq, (station_id << self.ID_SHIFT) | ts, name, code,
+                      time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)), wind_direction, wind_speed, wave_height, created_at)
+                     for ts, wind_direction, wind_speed, wave_height, created_at, seq in segment.rows() if seq > since]
+            rows.sort(key=itemgetter(0))
+            del rows[limit + 1:]
+        has_more = len(rows) > limit
+        records = [{
+            'seq': seq,
+            'id': row_id,
+            'station_name': name,
+            'station_code': code,
+            'timestamp': timestamp,
+            'wind_direction': wind_direction,
+            'wind_speed': wind_speed,
+            'wave_height': wave_height,
+            'created_at': self.format_created_at(created_at)
+        } for seq, row_id, name, code, timestamp, wind_direction, wind_speed, wave_height, created_at in rows[:limit]]
+        next_since = records[-1]['seq'] if records else since
+        return records, next_since, has_more
+    
+    def get_change_seq(self):
+        row = self.connection().execute("SELECT value FROM db_meta WHERE key = 'change_seq'").fetchone()
+        return row[0] if row else 0
+    
+    @timed_query
+    def get_data_count(self):
+        """Row count, maintained by ingest instead of scanning observations, plus the archived rows"""
+        cursor = self.connection().cursor()
+        row = cursor.execute("SELECT value FROM db_meta WHERE key = 'row_count'").fetchone()
+        archived = cursor.execute('SELECT COALESCE(SUM(row_count), 0) FROM archive_segments').fetchone()[0]
+        if row is None:
+            return cursor.execute('SELECT COUNT(*) FROM observations').fetchone()[0] + archived
+        return row[0] + archived
+
+    @timed_query
+    def load_observation_columns(self, station_code, start=None, end=None):
+        """One station's rows between epoch start and end as ObservationColumns, oldest first.
         
+        A single range read of the clustered key; wind_direction is turned into
+        its sector index by SQLite while reading, so no strings reach Python.
+        Archived months are decoded straight from their segment columns.
+        """
+        sector = 'CASE wind_direction {} ELSE -1 END'.format(
+            ' '.join(f"WHEN '{name}' THEN {index}" for index, name in enumerate(WIND_SECTORS)))
+        query = f'''
+            SELECT o.ts, {sector}, o.wind_speed, o.wave_height
+            FROM observations o JOIN stations s ON s.station_id = o.station_id
+            WHERE s.station_code = ?
+        '''
+        params = [station_code]
+        if start is not None:
+            query += ' AND o.ts >= ?'
+            params.append(start)
+        if end is not None:
+            query += ' AND o.ts <= ?'
+            params.append(end)
+        conn = self.connection()
+        cursor = conn.execute(query + ' ORDER BY o.ts', params)
+        # Same snapshot as the observations read (see _iter_station_rows)
+        segments = conn.execute('''
+            SELECT a.path FROM archive_segments a JOIN stations s ON s.station_id = a.station_id
+            WHERE s.station_code = ?1 AND (?2 IS NULL OR a.max_ts >= ?2) AND (?3 IS NULL OR a.min_ts <= ?3)
+        ''', (station_code, start, end)).fetchall()
         rows = cursor.fetchall()
-        conn.close()
-        
-        columns = ['id', 'station_name', 'station_code', 'timestamp', 
-                  'wind_direction', 'wind_speed', 'wave_height', 'created_at']
+        # None becomes NaN in the float conversion
+        table = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        columns = ObservationColumns(table[:, 0].astype(np.int64), table[:, 1].astype(np.int8),
+                                     np.ascontiguousarray(table[:, 2]), np.ascontiguousarray(table[:, 3]))
+        if not segments:
+            return columns
         
-        return [dict(zip(columns, row)) for row in rows]
+        parts = [columns]
+        for (path,) in segments:
+            segment = ArchiveSegment.read(os.path.join(self.archive_dir, path))
+            ts = np.frombuffer(segment.ts, dtype=np.int64)
+            low = 0 if start is None else np.searchsorted(ts, start)
+            high = len(ts) if end is None else np.searchsorted(ts, end, side='right')
+            sectors = np.array([-1] + [WIND_SECTORS.index(name) if name in WIND_SECTORS else -1
+                                       for name in segment.directions], dtype=np.int8)
+            parts.append(ObservationColumns(
+                ts[low:high], sectors[np.frombuffer(segment.direction_codes, dtype=np.uint16)[low:high]],
+                np.frombuffer(segment.wind_speed, dtype=np.float64)[low:high],
+                np.frombuffer(segment.wave_height, dtype=np.float64)[low:high]))
+        # Sorted by ts; np.unique keeps the first occurrence, so observations rows win over archived copies
+        _, first = np.unique(np.concatenate([part.ts for part in parts]), return_index=True)
+        return ObservationColumns(*(np.concatenate(column)[first] for column in zip(*parts)))
+
+class Observation(NamedTuple):
+    """One parsed station table row; the field order is the row layout WeatherDatabase.ingest stages"""
+    station_code: str
+    station_name: str
+    timestamp: str  # 'YYYY-MM-DD HH:MM:SS' local time
+    wind_direction: Optional[str]
+    wind_speed: Optional[float]
+    wave_height: Optional[float]
+    created_at: Optional[str] = None
+
+# 16-point compass as written on the station pages, clockwise from north; the index is the sector
+WIND_SECTORS = ['北', '北北東', '北東', '東北東', '東', '東南東', '南東', '南南東',
+                '南', '南南西', '南西', '西南西', '西', '西北西', '北西', '北北西']
+
+class ObservationColumns(NamedTuple):
+    """A station's observations as NumPy arrays (see WeatherDatabase.load_observation_columns)"""
+    ts: 'np.ndarray'  # int64 epoch seconds of the local wall-clock time
+    sector: 'np.ndarray'  # int8 index into WIND_SECTORS, -1 for calm / missing / unknown
+    wind_speed: 'np.ndarray'  # float64, NaN when missing
+    wave_height: 'np.ndarray'  # float64, NaN when missing
+
+def _value_summary(values, percentiles, thresholds):
+    """Count, mean, max, percentiles and exceedance (% of values >= threshold) of a NaN-free array"""
+    if not len(values):
+        return {'count': 0, 'mean': None, 'max': None,
+                'percentiles': {f'p{p:g}': None for p in percentiles},
+                'exceedance': {f'{t:g}': None for t in thresholds}}
+    points = np.percentile(values, percentiles) if percentiles else []
+    # One sort gives every threshold's count
+    ordered = np.sort(values)
+    at_least = len(ordered) - np.searchsorted(ordered, thresholds, side='left')
+    return {
+        'count': int(len(values)),
+        'mean': round(float(values.mean()), 3),
+        'max': round(float(ordered[-1]), 3),
+        'percentiles': {f'p{p:g}': round(float(v), 3) for p, v in zip(percentiles, points)},
+        'exceedance': {f'{t:g}': round(float(n) * 100 / len(values), 2) for t, n in zip(thresholds, at_least)},
+    }
+
+def summarize_observations(columns, speed_bins=(0, 2, 4, 6, 8, 10, 15), percentiles=(50, 75, 90, 95, 99),
+                           wind_thresholds=(5, 10, 15), wave_thresholds=(1, 2, 3)):
+    """Wind rose, wind speed / wave height percentiles and exceedance for ObservationColumns.
+    
+    The wind rose is the percentage of observations with a wind speed that fall in
+    each (sector, speed bin); bins are [speed_bins[i], speed_bins[i + 1]) and the
+    last one is open. Observations without a sector count as calm_or_variable.
+    """
+    ts, sector, wind_speed, wave_height = columns
+    has_wind = ~np.isnan(wind_speed)
+    wind = wind_speed[has_wind]
+    wave = wave_height[~np.isnan(wave_height)]
+    
+    edges = np.asarray(speed_bins, dtype=np.float64)
+    in_rose = has_wind & (sector >= 0)
+    speed_bin = np.clip(np.searchsorted(edges, wind_speed[in_rose], side='right') - 1, 0, len(edges) - 1)
+    cells = sector[in_rose].astype(np.intp) * len(edges) + speed_bin
+    counts = np.bincount(cells, minlength=len(WIND_SECTORS) * len(edges)).reshape(len(WIND_SECTORS), len(edges))
+    share = counts * (100 / len(wind)) if len(wind) else counts.astype(np.float64)
+    labels = [f'{low:g}-{high:g}' for low, high in zip(speed_bins, speed_bins[1:])] + [f'{speed_bins[-1]:g}+']
+    
+    return {
+        'count': int(len(ts)),
+        'start': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(ts[0]))) if len(ts) else None,
+        'end': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(ts[-1]))) if len(ts) else None,
+        'wind_speed': _value_summary(wind, percentiles, wind_thresholds),
+        'wave_height': _value_summary(wave, percentiles, wave_thresholds),
+        'wind_rose': {
+            'sectors': WIND_SECTORS,
+            'speed_bins': labels,
+            'percent': np.round(share, 2).tolist(),
+            'calm_or_variable': round((len(wind) - int(in_rose.sum())) * 100 / len(wind), 2) if len(wind) else None,
+        },
+    }
+
+def summarize_by_month(columns, **options):
+    """summarize_observations for each calendar month present in ts-ordered columns"""
+    if not len(columns.ts):
+        return []
+    months = columns.ts.astype('datetime64[s]').astype('datetime64[M]')
+    starts = np.concatenate(([0], np.flatnonzero(months[1:] != months[:-1]) + 1))
+    ends = np.append(starts[1:], len(months))
+    summaries = []
+    for start, end in zip(starts, ends):
+        part = ObservationColumns(*(column[start:end] for column in columns))
+        summaries.append(dict(month=str(months[start]), **summarize_observations(part, **options)))
+    return summaries
+
+_NUMBER_PATTERN = re.compile(r'(\d+\.?\d*)')  # "8m", "8.5m/s", ...
+
+@functools.lru_cache(maxsize=4096)
+def _parse_clock(time_text):
+    """'HH:MM:00' for an 'H:MM' cell, or None when the row is not an observation"""
+    if ':' not in time_text:
+        return None
+    parts = time_text.split(':')
+    try:
+        hours, minutes = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return f'{hours:02d}:{minutes:02d}:00'
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date(date_text):
+    """'YYYY-MM-DD' for a 'YYYY/MM/DD' cell, or None when it is not a valid date"""
+    parts = date_text.split('/')
+    try:
+        return date(int(parts[0]), int(parts[1]), int(parts[2])).isoformat()
+    except (ValueError, IndexError):
+        return None
+
+def _parse_number(text):
+    if not text or text == '-':
+        return None
+    match = _NUMBER_PATTERN.search(text)
+    return float(match.group(1)) if match else None
+
+# fetch_page_content の戻り値: 前回取得時からページが変わっていない
+NOT_MODIFIED = object()
+
+class StationFetchCache:
+    """Persistent per-station HTTP validators (ETag / Last-Modified), page content hashes and parsed rows.
+    
+    The rows of the last saved page stand in for a page that comes back unchanged,
+    so the other stations can still be aligned to the reference station's times.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.pending = {}
+        self._lock = threading.Lock()
+        self.load()
+    
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable fetch cache {self.path}: {e}")
+            self.entries = {}
+    
+    def get(self, station_code):
+        with self._lock:
+            return self.entries.get(station_code)
+    
+    def stage(self, station_code, etag, last_modified, content_hash):
+        """Remember a fetched page; it only counts as seen once commit() is called after saving"""
+        with self._lock:
+            self.pending[station_code] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'content_hash': content_hash,
+                'fetched_at': datetime.now().isoformat()
+            }
+    
+    def stage_records(self, station_code, records):
+        """Attach the parsed rows to the page staged for station_code"""
+        with self._lock:
+            if station_code in self.pending:
+                self.pending[station_code]['records'] = [
+                    [data.timestamp, data.wind_direction, data.wind_speed, data.wave_height] for data in records]
+    
+    def get_records(self, station):
+        """Observations of the last saved page of station, or None when not stored (older cache files)"""
+        with self._lock:
+            rows = self.entries.get(station['code'], {}).get('records')
+        if rows is None:
+            return None
+        return [Observation(station['code'], station['name'], *row) for row in rows]
+    
+    def commit(self):
+        with self._lock:
+            if not self.pending:
+                return
+            self.entries.update(self.pending)
+            self.pending = {}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+class HostRateLimiter:
+    """Per-host politeness limit: caps concurrent requests and spaces out request starts"""
+    def __init__(self, max_concurrent=2, min_interval=0.5):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._hosts = {}
+    
+    def _host_state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = {
+                    'semaphore': threading.BoundedSemaphore(self.max_concurrent),
+                    'lock': threading.Lock(),
+                    'next_start': 0.0
+                }
+                self._hosts[host] = state
+            return state
     
-    def get_data_count(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM weather_data')
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+    @contextmanager
+    def limit(self, url):
+        state = self._host_state(urlparse(url).netloc)
+        with state['semaphore']:
+            # 同一ホストへのリクエスト開始間隔を min_interval 以上空ける
+            with state['lock']:
+                now = time.monotonic()
+                start_at = max(now, state['next_start'])
+                state['next_start'] = start_at + self.min_interval
+            if start_at > now:
+                time.sleep(start_at - now)
+            yield
 
 class WeatherScraper:
-    def __init__(self):
+    REFERENCE_STATION = 'iragomisaki_vtss'  # Other stations are aligned to its timestamps
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    CLOCK_SKEW = timedelta(hours=1)  # How far a station's clock may run ahead of ours
+    
+    def __init__(self, max_workers=5, per_host_concurrency=2, per_host_interval=0.5, request_delay=2,
+                 fetch_cache=None, clock=time.time):
+        self.max_workers = max_workers
+        self.fetch_cache = fetch_cache
+        self.clock = clock  # Epoch seconds; dates the rows of pages that only show a time
+        self.unchanged_stations = set()
+        self.request_delay = request_delay  # Sequential mode only
+        self.rate_limiter = HostRateLimiter(per_host_concurrency, per_host_interval)
+        self._session = None
+        self._session_lock = threading.Lock()
         self.stations = [
             {
                 'name': '伊良湖岬',
@@ -197,26 +2066,78 @@ class WeatherScraper:
             }
         ]
     
-    def fetch_page_content(self, url):
+    @property
+    def stations(self):
+        return self._stations
+    
+    @stations.setter
+    def stations(self, stations):
+        self._stations = stations
+        self.stations_by_code = {station['code']: station for station in stations}
+    
+    @property
+    def session(self):
+        """Shared keep-alive session, created on first use"""
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                session.headers['User-Agent'] = self.USER_AGENT
+                adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(self.max_workers, 10))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+    
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def fetch_page_content(self, url, station_code=None, conditional=True):
+        """Fetch and decode a page; returns NOT_MODIFIED when the cached copy is still current"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=15)
+            cached = self.fetch_cache.get(station_code) if self.fetch_cache and station_code else None
+            if not conditional:
+                cached = None
+            headers = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+            
+            label = station_code or urlparse(url).netloc
+            with self.rate_limiter.limit(url):
+                with FETCH_SECONDS.timer(label):
+                    response = self.session.get(url, headers=headers, timeout=15)
+            if response.status_code == 304 and cached:
+                FETCH_RESULTS.inc(label, 'not_modified')
+                return NOT_MODIFIED
             response.raise_for_status()
             
+            content = response.content
+            FETCH_BYTES.inc(label, amount=len(content))
+            if self.fetch_cache and station_code:
+                content_hash = hashlib.sha256(content).hexdigest()
+                if cached and cached.get('content_hash') == content_hash:
+                    FETCH_RESULTS.inc(label, 'unchanged')
+                    return NOT_MODIFIED
+                self.fetch_cache.stage(station_code, response.headers.get('ETag'),
+                                       response.headers.get('Last-Modified'), content_hash)
+            
+            FETCH_RESULTS.inc(label, 'ok')
             # Try different encodings
             for encoding in ['utf-8', 'shift_jis', 'euc-jp']:
                 try:
-                    response.encoding = encoding
-                    return response.text
+                    return content.decode(encoding)
                 except UnicodeDecodeError:
                     continue
             
             # Fallback to utf-8 with errors='ignore'
-            response.encoding = 'utf-8'
-            return response.text
+            return content.decode('utf-8', errors='ignore')
         except Exception as e:
+            FETCH_RESULTS.inc(station_code or urlparse(url).netloc, 'error')
             print(f"Failed to fetch {url}: {e}")
             return None
     
@@ -228,10 +2149,21 @@ class WeatherScraper:
             print(f"No table found for station: {station_code}")
             return []
         
+        return self.parse_rows(parser.rows, station_code)
+    
+    def parse_rows(self, rows, station_code):
+        """Observations from a station table's cell rows (rows before the header are skipped)"""
+        station = self.stations_by_code.get(station_code)
+        station_name = station['name'] if station else station_code
+        # Rows without a date column are from today, unless their time is still ahead (23:50 read at 00:05)
+        now = datetime.fromtimestamp(self.clock(), JST).replace(tzinfo=None)
+        today, yesterday = now.strftime('%Y-%m-%d'), (now - timedelta(days=1)).strftime('%Y-%m-%d')
+        latest = now + self.CLOCK_SKEW
+        latest_clock = latest.strftime('%H:%M:%S') if latest.date() == now.date() else '24:00:00'
         data = []
         header_found = False
         
-        for row in parser.rows:
+        for row in rows:
             if not header_found:
                 # Look for header row containing time-related keywords
                 row_text = ' '.join(row).lower()
@@ -239,82 +2171,40 @@ class WeatherScraper:
                     header_found = True
                 continue
             
-            if len(row) < 3:
+            cells = len(row)
+            if cells < 3:
                 continue
             
             try:
                 # Handle different table structures
-                if len(row) >= 4:  # Date and time in separate columns
+                if cells >= 4:  # Date and time in separate columns
                     date_text = row[0].strip()
-                    time_text = row[1].strip()
+                    clock = _parse_clock(row[1].strip())
                     wind_dir_text = row[2].strip()
                     wind_speed_text = row[3].strip()
                     # Check if there's a wave height column (last column)
-                    wave_height_text = row[-1].strip() if len(row) > 4 else ''
+                    wave_height_text = row[-1].strip() if cells > 4 else ''
+                    day = _parse_date(date_text) if '/' in date_text else None
                 else:  # Time in first column
-                    time_text = row[0].strip()
+                    clock = _parse_clock(row[0].strip())
                     wind_dir_text = row[1].strip()
                     wind_speed_text = row[2].strip()
-                    wave_height_text = row[3].strip() if len(row) > 3 else ''
-                    date_text = None
+                    wave_height_text = ''
+                    day = None
                 
-                # Parse time
-                current_date = datetime.now()
-                if ':' in time_text:
-                    try:
-                        time_parts = time_text.split(':')
-                        hours = int(time_parts[0])
-                        minutes = int(time_parts[1]) if len(time_parts) > 1 else 0
-                        timestamp = current_date.replace(hour=hours, minute=minutes, second=0, microsecond=0)
-                        
-                        # If we have a date, use it instead of current date
-                        if date_text and '/' in date_text:
-                            try:
-                                date_parts = date_text.split('/')
-                                year = int(date_parts[0])
-                                month = int(date_parts[1])
-                                day = int(date_parts[2])
-                                timestamp = timestamp.replace(year=year, month=month, day=day)
-                            except (ValueError, IndexError):
-                                pass  # Use current date if date parsing fails
-                    except ValueError:
-                        continue
-                else:
+                if clock is None:
                     continue
+                if day is None:
+                    day = yesterday if clock > latest_clock else today
                 
-                # Parse wind speed
-                wind_speed = None
-                if wind_speed_text and wind_speed_text != '-':
-                    try:
-                        # Extract numeric value (handle formats like "8m", "8.5m/s", etc.)
-                        numeric_match = re.search(r'(\d+\.?\d*)', wind_speed_text)
-                        if numeric_match:
-                            wind_speed = float(numeric_match.group(1))
-                    except ValueError:
-                        pass
-                
-                # Parse wave height
-                wave_height = None
-                if wave_height_text and wave_height_text != '-':
-                    try:
-                        numeric_match = re.search(r'(\d+\.?\d*)', wave_height_text)
-                        if numeric_match:
-                            wave_height = float(numeric_match.group(1))
-                    except ValueError:
-                        pass
-                
-                station_name = next((s['name'] for s in self.stations if s['code'] == station_code), station_code)
-                
-                weather_data = {
-                    'station_name': station_name,
-                    'station_code': station_code,
-                    'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'wind_direction': wind_dir_text if wind_dir_text and wind_dir_text != '-' else None,
-                    'wind_speed': wind_speed,
-                    'wave_height': wave_height
-                }
-                
-                data.append(weather_data)
+                data.append(Observation(
+                    station_code,
+                    station_name,
+                    f'{day} {clock}',
+                    wind_dir_text if wind_dir_text and wind_dir_text != '-' else None,
+                    _parse_number(wind_speed_text),
+                    _parse_number(wave_height_text)
+                ))
                 
             except Exception as e:
                 print(f"Error parsing row for {station_code}: {e}")
@@ -324,107 +2214,1295 @@ class WeatherScraper:
     
     def scrape_station(self, station):
         print(f"Scraping {station['name']}...")
-        html_content = self.fetch_page_content(station['url'])
+        html_content = self.fetch_page_content(station['url'], station['code'])
+        
+        if html_content is NOT_MODIFIED:
+            records = self.fetch_cache.get_records(station)
+            if records is not None:
+                print(f"{station['name']} unchanged since last fetch, reusing its {len(records)} records")
+                self.unchanged_stations.add(station['code'])
+                return records
+            # Validators from a cache without rows: fetch the page once more to have something to align
+            html_content = self.fetch_page_content(station['url'], station['code'], conditional=False)
         
         if not html_content:
             return []
         
-        data = self.parse_table_data(html_content, station['code'], station['has_wave_height'])
+        with PARSE_SECONDS.timer(station['code']):
+            data = self.parse_table_data(html_content, station['code'], station['has_wave_height'])
+        if self.fetch_cache:
+            self.fetch_cache.stage_records(station['code'], data)
         print(f"Scraped {len(data)} records from {station['name']}")
         return data
     
-    def scrape_all_stations(self):
-        all_data = []
+    def _scrape_station_safe(self, station):
+        try:
+            return self.scrape_station(station)
+        except Exception as e:
+            print(f"Failed to scrape {station['name']}: {e}")
+            return []
+    
+    @timed(SCRAPE_CYCLE_SECONDS)
+    def scrape_stations(self, stations, concurrent=True, progress=None):
+        """Scrape the given stations; returns one record list per station, in station order.
         
-        for station in self.stations:
-            try:
-                station_data = self.scrape_station(station)
-                all_data.extend(station_data)
-                time.sleep(2)  # Delay between requests to be respectful
-            except Exception as e:
-                print(f"Failed to scrape {station['name']}: {e}")
+        progress(station, records, seconds), if given, is called as each station finishes.
+        """
+        def scrape(station):
+            start = time.perf_counter()
+            records = self._scrape_station_safe(station)
+            if progress:
+                progress(station, records, time.perf_counter() - start)
+            return records
+        
+        if concurrent:
+            # 並列取得（ホスト毎の同時接続数・間隔は rate_limiter で制限）
+            workers = max(1, min(self.max_workers, len(stations)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map() keeps station order so alignment sees the same input as sequential mode
+                return list(executor.map(scrape, stations))
         
+        results = []
+        for station in stations:
+            results.append(scrape(station))
+            time.sleep(self.request_delay)  # Delay between requests to be respectful
+        return results
+    
+    def scrape_all_stations(self, concurrent=True):
+        all_data = []
+        self.unchanged_stations = set()
+        for station_data in self.scrape_stations(self.stations, concurrent):
+            all_data.extend(station_data)
+        
+        if self.all_unchanged():
+            return []
+        # Unchanged stations contribute their last page, so every station is aligned as before
         return self.align_to_reference_time(all_data)
     
-    def align_to_reference_time(self, all_data):
-        reference_station = 'iragomisaki_vtss'
-        reference_data = [d for d in all_data if d['station_code'] == reference_station]
+    def all_unchanged(self):
+        """True when the last scrape found every station's page unchanged (nothing new to save)"""
+        return len(self.unchanged_stations) == len(self.stations)
+    
+    @timed(ALIGN_SECONDS)
+    def align_to_reference_time(self, all_data, skip_codes=()):
+        """Align all stations to the reference station's timestamps; stations in skip_codes are left out"""
+        reference_data = [d for d in all_data if d.station_code == self.REFERENCE_STATION]
         
         if not reference_data:
             print("No reference station data found, returning all data")
             return all_data
         
-        reference_timestamps = [d['timestamp'] for d in reference_data]
+        reference_timestamps = [d.timestamp for d in reference_data]
         aligned_data = []
         
+        # Parse every distinct timestamp once and index each station's records by time
+        parsed_times = {}
+        def parse_time(timestamp):
+            parsed = parsed_times.get(timestamp)
+            if parsed is None:
+                parsed = parsed_times[timestamp] = datetime.fromisoformat(timestamp)
+            return parsed
+        
+        records_by_station = {}
+        for data in all_data:
+            records_by_station.setdefault(data.station_code, []).append(data)
+        
+        station_indexes = []
+        for station in self.stations:
+            if station['code'] in skip_codes:
+                continue
+            records = records_by_station.get(station['code'])
+            index = _StationTimeIndex(records, parse_time) if records else None
+            station_indexes.append((station, index))
+        
         for ref_time in reference_timestamps:
-            for station in self.stations:
+            for station, index in station_indexes:
                 # Find the closest data point for this station based on update interval
-                station_data = self._find_closest_data(all_data, station, ref_time)
+                station_data = index.find(ref_time, parse_time, station.get('update_interval', 15)) if index else None
                 
                 if station_data:
                     aligned_data.append(station_data)
                 else:
                     # Create empty record for missing data
-                    aligned_data.append({
-                        'station_name': station['name'],
-                        'station_code': station['code'],
-                        'timestamp': ref_time,
-                        'wind_direction': None,
-                        'wind_speed': None,
-                        'wave_height': None
-                    })
+                    aligned_data.append(Observation(station['code'], station['name'], ref_time, None, None, None))
         
         print(f"Aligned {len(aligned_data)} records to reference time")
         return aligned_data
+
+class _StationTimeIndex:
+    """One station's records sorted by parsed time, for align_to_reference_time.
+
+    Lookups return exactly what the former linear scan did: the first record
+    (in scrape order) with an identical timestamp, else the first record in
+    scrape order within the update interval, else the nearest record with ties
+    going to the earlier one in scrape order.
+    """
+    def __init__(self, records, parse_time):
+        self.records = records
+        self.exact = {}
+        for data in records:
+            self.exact.setdefault(data.timestamp, data)
+        
+        parsed = [parse_time(data.timestamp) for data in records]
+        # Sorted by (time, scrape order): the first entry of a run of equal times has the lowest index
+        self.order = sorted(range(len(records)), key=lambda i: (parsed[i], i))
+        self.times = [parsed[i] for i in self.order]
     
-    def _find_closest_data(self, all_data, station, reference_time):
-        """Find the closest data point for a station based on its update interval"""
-        station_data = [d for d in all_data if d['station_code'] == station['code']]
+    def find(self, reference_time, parse_time, update_interval):
+        exact_match = self.exact.get(reference_time)
+        if exact_match is not None:
+            return exact_match
         
-        if not station_data:
-            return None
+        ref_dt = parse_time(reference_time)
+        window = timedelta(minutes=update_interval)
+        lo = bisect_left(self.times, ref_dt - window)
+        hi = bisect_right(self.times, ref_dt + window)
+        if lo < hi:
+            return self.records[min(self.order[lo:hi])]
         
-        # Try exact match first
-        exact_match = next((d for d in station_data if d['timestamp'] == reference_time), None)
-        if exact_match:
-            return exact_match
+        # No data within interval: nearest neighbour on either side of the insertion point
+        candidates = []
+        if lo > 0:
+            left = bisect_left(self.times, self.times[lo - 1])
+            candidates.append((ref_dt - self.times[left], self.order[left]))
+        if lo < len(self.times):
+            candidates.append((self.times[lo] - ref_dt, self.order[lo]))
+        return self.records[min(candidates)[1]]
+
+class ScrapeScheduler:
+    """Resident scrape loop that polls each station shortly after its next observation is due.
+    
+    A station's next poll is its newest observed timestamp + update_interval +
+    its publish lag, the median of recent lag samples. A poll that finds
+    nothing new is retried with exponential backoff. The scraper session
+    (keep-alive connections) and the latest saved timestamp per station stay
+    in memory between polls. `clock` returns epoch seconds (time.time()) and
+    `sleep` waits; both can be replaced for simulations. Observation times are
+    converted from JST explicitly, whatever the process's local time zone.
+    """
+    def __init__(self, scraper, db, clock=time.time, sleep=None, initial_lag=120, min_lag=30,
+                 lag_probe=15, retry_delay=30, max_retry_delay=240, max_sleep=60, lag_samples=9):
+        self.scraper = scraper
+        self.db = db
+        self.clock = clock
+        self._stop = threading.Event()
+        self.sleep = sleep or self._stop.wait
+        self.min_lag = min_lag
+        self.lag_probe = lag_probe  # After an on-time hit, poll this much earlier next time
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_sleep = max_sleep
+        self.stats = {'polls': 0, 'hits': 0, 'misses': 0, 'saved': 0}
+        
+        # Last saved timestamp per station, as used by the cron job to drop already stored rows
+        self.latest_timestamps = {data['station_code']: data['timestamp'] for data in db.get_latest_data()}
+        self.page_records = {}  # Last parsed records per station; the reference station's are reused for alignment
+        
+        now = clock()
+        self.state = {}
+        for station in scraper.stations:
+            latest = self.latest_timestamps.get(station['code'])
+            newest = self._epoch(latest) if latest else None
+            self.state[station['code']] = {
+                # Stations whose next observation is not due yet wait for it, all others are polled now
+                'next_due': max(now, newest + station.get('update_interval', 15) * 60 + initial_lag) if newest else now,
+                'lags': deque([initial_lag], maxlen=lag_samples),
+                'last_poll': None,
+                'misses': 0,
+                'newest': newest
+            }
+    
+    @staticmethod
+    def _epoch(timestamp):
+        """Epoch seconds (comparable with time.time()) of a JST observation timestamp"""
+        return datetime.fromisoformat(timestamp).replace(tzinfo=JST).timestamp()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def next_wakeup(self):
+        return min(state['next_due'] for state in self.state.values())
+    
+    def _record_poll(self, station, now, newest):
+        """Reschedule a station after a poll; newest is the page's newest observation (epoch) or None.
+        
+        Returns True when the page has a newer observation than the station had before.
+        """
+        state = self.state[station['code']]
+        interval = station.get('update_interval', 15) * 60
+        last_poll, state['last_poll'] = state['last_poll'], now
+        if newest is not None:
+            newest = min(newest, now)  # A misdated row must not push the next poll a day out
+        
+        advanced = newest is not None and (state['newest'] is None or newest > state['newest'])
+        if advanced:
+            if last_poll is not None:
+                observed = min(now - newest, interval)
+                if state['misses']:
+                    # Published between the previous (missed) poll and now
+                    sample = (max(last_poll - newest, 0) + observed) / 2
+                else:
+                    # Already up when polled: it may have been published earlier still
+                    sample = observed - self.lag_probe
+                state['lags'].append(max(self.min_lag, sample))
+            state['newest'] = newest
+            next_due = newest + interval + statistics.median(state['lags'])
+            if next_due > now:
+                state['misses'] = 0
+                state['next_due'] = next_due
+                self.stats['hits'] += 1
+                return True
+            # The page is behind schedule: back off instead of polling it in a tight loop
         
-        # If no exact match, find the closest data within the update interval
-        ref_dt = datetime.fromisoformat(reference_time)
-        update_interval = station.get('update_interval', 15)  # Default to 15 minutes
+        state['misses'] += 1
+        backoff = self.retry_delay * 2 ** (state['misses'] - 1)
+        state['next_due'] = now + min(backoff, self.max_retry_delay, interval)
+        self.stats['misses'] += 1
+        return advanced
+    
+    def run_once(self):
+        """Poll the stations that are due and save their new rows; returns the number of rows saved"""
+        now = self.clock()
+        due = [station for station in self.scraper.stations if self.state[station['code']]['next_due'] <= now]
+        if not due:
+            return 0
+        return self._poll(due)
+    
+    @profiled('scrapes', 'scheduler')
+    def _poll(self, due):
+        self.scraper.unchanged_stations = set()
+        results = self.scraper.scrape_stations(due)
+        now = self.clock()
+        self.stats['polls'] += len(due)
+        
+        updated = False
+        for station, records in zip(due, results):
+            newest = max((self._epoch(data.timestamp) for data in records), default=None)
+            if records:
+                self.page_records[station['code']] = records
+            if self._record_poll(station, now, newest):
+                updated = True
+        
+        saved_count = 0
+        if updated:
+            # Align every station's last page: a row published before the reference station's
+            # matching row is only picked up once the reference catches up
+            all_data = [data for station in self.scraper.stations
+                        for data in self.page_records.get(station['code'], [])]
+            skip_codes = {station['code'] for station in self.scraper.stations} - set(self.page_records)
+            aligned = self.scraper.align_to_reference_time(all_data, skip_codes=skip_codes)
+            
+            new_data = [data for data in aligned
+                        if data.station_code not in self.latest_timestamps
+                        or data.timestamp > self.latest_timestamps[data.station_code]]
+            if new_data:
+                saved_count = self.db.save_weather_data(new_data)
+                for data in new_data:
+                    self.latest_timestamps[data.station_code] = max(
+                        data.timestamp, self.latest_timestamps.get(data.station_code, ''))
+                self.stats['saved'] += saved_count
         
-        for data in station_data:
-            data_dt = datetime.fromisoformat(data['timestamp'])
-            time_diff = abs((ref_dt - data_dt).total_seconds() / 60)  # Difference in minutes
+        if self.scraper.fetch_cache:
+            # Only mark pages as seen once their data is safely in the database
+            self.scraper.fetch_cache.commit()
+        return saved_count
+    
+    def run(self):
+        """Poll until stop() is called"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[{datetime.now()}] Scheduled scrape failed: {e}")
+            delay = self.next_wakeup() - self.clock()
+            if delay > 0:
+                self.sleep(min(delay, self.max_sleep))
+
+class ScrapeJob:
+    """A background scrape started through POST /api/weather/scrape"""
+    def __init__(self, stations):
+        self.id = uuid.uuid4().hex[:16]
+        self.status = 'running'
+        self.requests = 1  # Triggers served by this job (coalesced POSTs included)
+        self.requested_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.finished_monotonic = None
+        self.records_saved = None
+        self.message = 'Scraping'
+        self._lock = threading.Lock()
+        self.stations = {station['code']: {'code': station['code'], 'name': station['name'], 'status': 'pending',
+                                           'seconds': None, 'records': None}
+                         for station in stations}
+    
+    def station_done(self, station, records, seconds, unchanged=False):
+        with self._lock:
+            entry = self.stations[station['code']]
+            entry['status'] = 'unchanged' if unchanged else ('done' if records else 'no_data')
+            entry['seconds'] = round(seconds, 3)
+            entry['records'] = len(records)
+    
+    def finish(self, records_saved=None, error=None):
+        with self._lock:
+            self.records_saved = records_saved
+            if error is not None:
+                self.status = 'failed'
+                self.message = f'Scraping failed: {error}'
+            else:
+                self.status = 'succeeded'
+                self.message = ('No data was scraped' if records_saved is None
+                                else f'Successfully scraped and saved {records_saved} records')
+            self.finished_at = datetime.now().isoformat()
+            self.finished_monotonic = time.monotonic()
+    
+    @property
+    def finished(self):
+        return self.finished_monotonic is not None
+    
+    @property
+    def success(self):
+        return self.status == 'succeeded' and self.records_saved is not None
+    
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'success': self.success,
+                'message': self.message,
+                'records_saved': self.records_saved,
+                'requests': self.requests,
+                'requested_at': self.requested_at,
+                'finished_at': self.finished_at,
+                'stations': [dict(entry) for entry in self.stations.values()]
+            }
+
+class ScrapeJobManager:
+    """Single-flight runner for manually triggered scrapes of one database.
+    
+    A trigger while a job is running joins that job instead of starting another
+    scrape, and a trigger within `cooldown` seconds of a successful job gets that
+    job back. Jobs run on a background thread with one shared scraper, created
+    on the first trigger, so its keep-alive session and fetch cache carry over
+    from job to job; the last `history` jobs stay queryable by id.
+    """
+    def __init__(self, db_path, cooldown=60, history=20, scraper_factory=None):
+        self.db_path = db_path
+        self.cooldown = cooldown
+        self.history = history
+        self.scraper_factory = scraper_factory or WeatherScraper
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._current = None
+        self._scraper = None
+    
+    def submit(self):
+        """Start a scrape or join the current one; returns (job, started)"""
+        with self._lock:
+            job = self._current
+            if job is not None:
+                if not job.finished:
+                    with job._lock:
+                        job.requests += 1
+                    return job, False
+                if job.success and time.monotonic() - job.finished_monotonic < self.cooldown:
+                    return job, False
+            
+            if self._scraper is None:
+                self._scraper = self.scraper_factory()
+            scraper = self._scraper
+            job = ScrapeJob(scraper.stations)
+            self._current = self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                del self._jobs[next(iter(self._jobs))]
+        threading.Thread(target=self._run, args=(job, scraper), name=f'scrape-{job.id}', daemon=True).start()
+        return job, True
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def latest(self):
+        with self._lock:
+            return self._current
+    
+    def close(self):
+        with self._lock:
+            scraper, self._scraper = self._scraper, None
+        if scraper is not None:
+            scraper.close()
+    
+    @profiled('scrapes', 'job')
+    def _run(self, job, scraper):
+        # Jobs never overlap, so the shared scraper is only used by this one
+        scraper.unchanged_stations = set()
+        try:
+            results = scraper.scrape_stations(
+                scraper.stations,
+                progress=lambda station, records, seconds: job.station_done(
+                    station, records, seconds, station['code'] in scraper.unchanged_stations))
+            all_data = [data for records in results for data in records]
+            if not all_data or scraper.all_unchanged():
+                job.finish()
+                return
+            aligned = scraper.align_to_reference_time(all_data)
+            job.finish(WeatherDatabase(self.db_path).save_weather_data(aligned))
+        except Exception as e:
+            print(f"[{datetime.now()}] Scrape job {job.id} failed: {e}")
+            job.finish(error=e)
+
+_scrape_jobs = {}
+_scrape_jobs_lock = threading.Lock()
+
+def get_scrape_jobs(db_path, cooldown=60):
+    """The ScrapeJobManager shared by all handlers serving db_path"""
+    with _scrape_jobs_lock:
+        manager = _scrape_jobs.get(db_path)
+        if manager is None:
+            manager = _scrape_jobs[db_path] = ScrapeJobManager(db_path, cooldown=cooldown)
+        return manager
+
+class KeepAliveHTTPServer(HTTPServer):
+    """HTTP/1.1 server with a bounded worker pool.
+
+    Workers only hold a connection while a request is being handled. New
+    connections and idle keep-alive connections are parked in a selector and
+    handed to the pool once request bytes arrive, so clients that connect and
+    send nothing cannot starve other clients and idle clients cost no thread.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+    
+    def __init__(self, server_address, handler_class, max_workers=32, keepalive_timeout=15):
+        super().__init__(server_address, handler_class)
+        self.keepalive_timeout = keepalive_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http-worker')
+        self._selector = selectors.DefaultSelector()
+        self._parked = {}  # socket -> (client_address, parked_at)
+        self._parked_lock = threading.Lock()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._closing = False
+        self._idle_thread = threading.Thread(target=self._watch_idle_connections, name='http-keepalive', daemon=True)
+        self._idle_thread.start()
+    
+    def process_request(self, request, client_address):
+        # Wait for the first request in the selector rather than in a worker's readline
+        if not self.park(request, client_address):
+            self.shutdown_request(request)
+    
+    def _process_request_thread(self, request, client_address):
+        parked = False
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+            parked = getattr(handler, 'parked', False)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if not parked:
+                self.shutdown_request(request)
+    
+    def park(self, request, client_address):
+        """Wait for the next request on a new or idle keep-alive connection without holding a worker"""
+        with self._parked_lock:
+            if self._closing:
+                return False
+            request.setblocking(False)
+            self._parked[request] = (client_address, time.monotonic())
+            self._selector.register(request, selectors.EVENT_READ)
+        self._wakeup_send.send(b'x')
+        return True
+    
+    def _unpark(self, request):
+        with self._parked_lock:
+            self._selector.unregister(request)
+            client_address, _ = self._parked.pop(request)
+        request.setblocking(True)
+        return client_address
+    
+    def _watch_idle_connections(self):
+        while not self._closing:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup_recv:
+                    self._wakeup_recv.recv(4096)
+                    continue
+                request = key.fileobj
+                client_address = self._unpark(request)
+                self.executor.submit(self._process_request_thread, request, client_address)
+            
+            # Close keep-alive connections that stayed idle too long
+            now = time.monotonic()
+            with self._parked_lock:
+                expired = [r for r, (_, parked_at) in self._parked.items()
+                           if now - parked_at > self.keepalive_timeout]
+            for request in expired:
+                self._unpark(request)
+                self.shutdown_request(request)
+    
+    def server_close(self):
+        """Stop accepting, let in-flight requests finish, then drop idle connections"""
+        super().server_close()
+        with self._parked_lock:
+            self._closing = True
+        self._wakeup_send.send(b'x')
+        self._idle_thread.join()
+        self.executor.shutdown(wait=True)
+        with self._parked_lock:
+            parked = list(self._parked)
+        for request in parked:
+            self._unpark(request)
+            self.shutdown_request(request)
+        self._selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+class EventStreamBroadcaster:
+    """Server-Sent Events fan-out of changes to the latest record per station.
+    
+    Subscribed sockets are non-blocking and served by a single thread waiting in
+    a selector, so idle subscribers hold no worker thread. Each event is encoded
+    once and written to every subscriber; a subscriber that falls more than
+    max_buffer bytes behind is dropped. Ingests in this process wake the thread
+    directly, writes from other processes (the scraper) are noticed by polling
+    data_version. Event ids are data_version values: a client reconnecting with
+    Last-Event-ID gets the events it missed from a short history, or a full
+    snapshot when they are no longer held.
+    """
+    RETRY_MS = 5000
+    
+    def __init__(self, db_path, poll_interval=1.0, heartbeat=15, history=64, max_buffer=1 << 20):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_buffer = max_buffer
+        self.stats = {'subscribers': 0, 'events': 0, 'dropped': 0}
+        self._selector = selectors.DefaultSelector()
+        self._buffers = {}  # socket -> bytes not yet written
+        self._pending = deque()  # (socket, last_event_id) handed over by request handlers
+        self._events = deque(maxlen=history)  # (previous_version, version, encoded event or None)
+        self._snapshot = None
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='event-stream', daemon=True)
+        self._thread.start()
+    
+    def subscribe(self, sock, last_event_id=None):
+        """Take over a socket whose response headers have been sent"""
+        sock.setblocking(False)
+        self._pending.append((sock, last_event_id))
+        self.wake()
+    
+    def wake(self):
+        try:
+            self._wakeup_send.send(b'x')
+        except OSError:
+            pass  # Wakeup already pending (buffer full) or closing
+    
+    def close(self):
+        self._closing = True
+        self.wake()
+        self._thread.join()
+    
+    @staticmethod
+    def encode_event(event, version, records):
+        data = dumps_json(records).decode('utf-8')  # Single line: no embedded newlines
+        return f'id: {version}\nevent: {event}\ndata: {data}\n\n'.encode('utf-8')
+    
+    def _run(self):
+        db = WeatherDatabase(self.db_path)
+        self._snapshot = db.get_latest_snapshot()
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while not self._closing:
+            for key, events in self._selector.select(timeout=self.poll_interval):
+                sock = key.fileobj
+                if sock is self._wakeup_recv:
+                    try:
+                        sock.recv(4096)
+                    except BlockingIOError:
+                        pass
+                elif events & selectors.EVENT_WRITE:
+                    self._flush(sock)
+                else:
+                    # Clients send nothing after the request; readable means closed (or garbage)
+                    self._drop(sock)
             
-            # If within update interval, use this data
-            if time_diff <= update_interval:
-                return data
+            try:
+                self._check_for_changes(db)
+            except Exception as e:
+                print(f"[{datetime.now()}] Event stream update failed: {e}")
+            while self._pending:
+                self._add(*self._pending.popleft())
+            
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                # Comment line: keeps proxies from timing out idle streams and finds dead peers
+                self._broadcast(b': ping\n\n')
+                next_heartbeat = now + self.heartbeat
+        
+        for sock in list(self._buffers):
+            self._drop(sock)
+        self._selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+    
+    def _check_for_changes(self, db):
+        previous = self._snapshot
+        if db._read_data_version() == previous.version:
+            return
+        snapshot = self._snapshot = db.get_latest_snapshot()
+        before = {record['station_code']: record for record in previous.records}
+        changed = [record for record in snapshot.records if before.get(record['station_code']) != record]
+        # Versions without a new latest record (e.g. corrections to older rows) are kept so replay stays contiguous
+        event = self.encode_event('observations', snapshot.version, changed) if changed else None
+        self._events.append((previous.version, snapshot.version, event))
+        if event:
+            self.stats['events'] += 1
+            self._broadcast(event)
+    
+    def _add(self, sock, last_event_id):
+        try:
+            self._selector.register(sock, selectors.EVENT_READ)
+        except (ValueError, OSError):
+            sock.close()  # Already closed by the client
+            return
+        self._buffers[sock] = b''
+        self.stats['subscribers'] += 1
+        
+        snapshot = self._snapshot
+        replay = None
+        if last_event_id is not None and last_event_id <= snapshot.version:
+            if last_event_id == snapshot.version:
+                replay = []
+            elif self._events and self._events[0][0] <= last_event_id:
+                replay = [event for _, version, event in self._events if version > last_event_id and event]
+        if replay is None:
+            replay = [self.encode_event('snapshot', snapshot.version, snapshot.records)]
+        self._send(sock, f'retry: {self.RETRY_MS}\n\n'.encode('ascii') + b''.join(replay))
+    
+    def _broadcast(self, data):
+        for sock in list(self._buffers):
+            self._send(sock, data)
+    
+    def _send(self, sock, data):
+        buffered = self._buffers.get(sock)
+        if buffered is None:
+            return
+        if buffered:
+            # Already waiting for the socket to drain; keep ordering
+            if len(buffered) + len(data) > self.max_buffer:
+                self._drop(sock)
+            else:
+                self._buffers[sock] = buffered + data
+            return
+        try:
+            sent = sock.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        if sent < len(data):
+            self._buffers[sock] = data[sent:]
+            self._selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+    
+    def _flush(self, sock):
+        try:
+            sent = sock.send(self._buffers[sock])
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(sock)
+            return
+        remaining = self._buffers[sock] = self._buffers[sock][sent:]
+        if not remaining:
+            self._selector.modify(sock, selectors.EVENT_READ)
+    
+    def _drop(self, sock):
+        if self._buffers.pop(sock, None) is None:
+            return
+        self._selector.unregister(sock)
+        self.stats['subscribers'] -= 1
+        self.stats['dropped'] += 1
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+_event_streams = {}
+_event_streams_lock = threading.Lock()
+
+def get_event_stream(db_path):
+    """The EventStreamBroadcaster for db_path, started on first use"""
+    with _event_streams_lock:
+        broadcaster = _event_streams.get(db_path)
+        if broadcaster is None:
+            broadcaster = _event_streams[db_path] = EventStreamBroadcaster(db_path)
+        return broadcaster
+
+METRICS.gauge('isewan_stream_subscribers', 'Open /api/weather/stream connections',
+              lambda: sum(broadcaster.stats['subscribers'] for broadcaster in list(_event_streams.values())))
+
+def notify_data_changed(db_path):
+    """Wake the event stream (if any) after an ingest committed in this process"""
+    broadcaster = _event_streams.get(db_path)
+    if broadcaster is not None:
+        broadcaster.wake()
+
+def dumps_json(data):
+    """API JSON as UTF-8 bytes: orjson (compact) when installed, else json.dumps(ensure_ascii=False)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+def iter_json_array(records, batch_size=1000):
+    """JSON array bytes, batch_size records per piece; joined they equal dumps_json(list(records))"""
+    records = iter(records)
+    separator = b',' if orjson is not None else b', '
+    yield b'['
+    first = True
+    # One dumps call per batch instead of per record; the batch's brackets are stripped
+    for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+        yield (b'' if first else separator) + dumps_json(batch)[1:-1]
+        first = False
+    yield b']'
+
+def iter_ndjson(records):
+    for record in records:
+        yield dumps_json(record) + b'\n'
+
+def to_columns(records):
+    """Records as one array per field, for chart clients.
+    
+    station_name moves to a station_code -> name map, so the repeated names are
+    sent once: {"stations": {...}, "id": [...], "station_code": [...], ...}.
+    """
+    stations = {}
+    columns = {}
+    for record in records:
+        if not columns:
+            columns = {name: [] for name in record if name != 'station_name'}
+        if 'station_name' in record:
+            stations[record['station_code']] = record['station_name']
+        for name, values in columns.items():
+            values.append(record[name])
+    return {'stations': stations, **columns}
+
+def compress_body(body, encoding):
+    """One-shot Content-Encoding of a response body ('gzip' or 'br')"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+CSV_EXPORT_HEADERS = ['観測地点', '地点コード', '日時', '風向', '風速(m/s)', '波高(m)', '登録日時']
+
+def _csv_timestamp(value):
+    # Same text as formatTimestampForCSV in src/utils/csvExport.ts: 2024/01/15 14:00
+    return value[:16].replace('-', '/').replace('T', ' ') if value else ''
+
+def _csv_value(value):
+    # Mirrors `value || ''` in csvExport.ts (None and 0 become empty) and JS number formatting
+    if not value:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_csv_export(records):
+    """CSV in the frontend's download format: BOM, Japanese headers, \\n line breaks"""
+    yield ('\ufeff' + ','.join(CSV_EXPORT_HEADERS)).encode('utf-8')
+    for record in records:
+        yield ('\n' + ','.join([
+            f'"{record["station_name"]}"',
+            record['station_code'],
+            _csv_timestamp(record['timestamp']),
+            _csv_value(record['wind_direction']),
+            _csv_value(record['wind_speed']),
+            _csv_value(record['wave_height']),
+            _csv_timestamp(record['created_at'])
+        ])).encode('utf-8')
+
+class ChunkedWriter:
+    """Buffers small writes into HTTP/1.1 chunks of roughly chunk_size bytes, optionally compressed.
+    
+    With chunked=False the data is written as it is, for HTTP/1.0 responses
+    whose end is marked by closing the connection.
+    """
+    def __init__(self, wfile, chunk_size=65536, encoding=None, chunked=True):
+        self.wfile = wfile
+        self.chunk_size = chunk_size
+        self.chunked = chunked
+        self._buffer = []
+        self._buffered = 0
+        self._compressor = None
+        self._finish = None
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=5)
+            self._compressor, self._finish = compressor.process, compressor.finish
+        elif encoding == 'gzip':
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._compressor, self._finish = compressor.compress, compressor.flush
+    
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.chunk_size:
+            self.flush()
+    
+    def flush(self):
+        if self._buffered:
+            data = b''.join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            if self._compressor:
+                data = self._compressor(data)
+            self._write_chunk(data)
+    
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data) if self.chunked else data)
+    
+    def close(self):
+        self.flush()
+        if self._finish:
+            self._write_chunk(self._finish())
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+class StaticFile:
+    def __init__(self, path, stat, content_type, cache_control, max_cached_bytes):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.body = None
+        if self.size <= max_cached_bytes:
+            with open(path, 'rb') as f:
+                self.body = f.read()
+        self.checked_at = time.monotonic()
+        self.encodings = {}  # 'br' / 'gzip' -> StaticFile of the precompressed sibling
+
+class StaticFiles:
+    """Files under `root` with cached metadata, HTTP validators and precompressed siblings.
+    
+    Entries are revalidated with one stat() at most every `check_interval`
+    seconds. Files up to `max_cached_bytes` are held in memory, larger ones
+    are streamed with sendfile. `name.br` / `name.gz` next to a file are
+    served when the client accepts them. Vite's content-hashed assets never
+    change under the same name and are cached by browsers for a year;
+    everything else is revalidated (ETag / Last-Modified, 304).
+    """
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # Preference order
+    CONTENT_TYPES = {
+        '.html': 'text/html; charset=utf-8',
+        '.js': 'application/javascript; charset=utf-8',
+        '.mjs': 'application/javascript; charset=utf-8',
+        '.css': 'text/css; charset=utf-8',
+        '.json': 'application/json',
+        '.map': 'application/json',
+        '.svg': 'image/svg+xml',
+        '.png': 'image/png',
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.gif': 'image/gif',
+        '.ico': 'image/x-icon',
+        '.webp': 'image/webp',
+        '.woff': 'font/woff',
+        '.woff2': 'font/woff2',
+        '.txt': 'text/plain; charset=utf-8',
+        '.webmanifest': 'application/manifest+json',
+    }
+    HASHED_ASSET = re.compile(r'(^|/)assets/[^/]+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+    REVALIDATE = 'no-cache'
+    
+    def __init__(self, root, max_cached_bytes=256 * 1024, check_interval=1.0, max_entries=1024):
+        self.root = os.path.realpath(root)
+        self.max_cached_bytes = max_cached_bytes
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def resolve(self, relative_path):
+        """Absolute path of a file below root, or None (missing, a directory, or escaping root)"""
+        if '\0' in relative_path:
+            return None
+        path = os.path.realpath(os.path.join(self.root, relative_path.lstrip('/')))
+        if not path.startswith(self.root + os.sep):
+            return None  # ../ traversal or a symlink pointing outside
+        return path
+    
+    def get(self, relative_path):
+        """The StaticFile for a request path, or None"""
+        entry = self._entries.get(relative_path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked_at < self.check_interval:
+            return entry
+        
+        path = self.resolve(relative_path)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            with self._lock:
+                self._entries.pop(relative_path, None)
+            return None
         
-        # If no data within interval, return the closest one
-        closest_data = min(station_data, key=lambda d: abs((ref_dt - datetime.fromisoformat(d['timestamp'])).total_seconds()))
-        return closest_data
+        if entry is not None and entry.path == path and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            entry.checked_at = now
+            if all(self._sibling_current(sibling) for sibling in entry.encodings.values()):
+                return entry
+        
+        entry = self._load(relative_path, path, stat)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()  # Only reachable with far more files than a frontend build has
+            self._entries[relative_path] = entry
+        return entry
+    
+    def _load(self, relative_path, path, stat):
+        extension = os.path.splitext(path)[1].lower()
+        content_type = self.CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        cache_control = self.IMMUTABLE if self.HASHED_ASSET.search(relative_path) else self.REVALIDATE
+        entry = StaticFile(path, stat, content_type, cache_control, self.max_cached_bytes)
+        for encoding, suffix in self.ENCODINGS:
+            try:
+                sibling_stat = os.stat(path + suffix)
+            except OSError:
+                continue
+            if sibling_stat.st_mtime_ns < stat.st_mtime_ns:
+                continue  # Stale: the original was rebuilt after compressing
+            sibling = StaticFile(path + suffix, sibling_stat, content_type, cache_control, self.max_cached_bytes)
+            sibling.etag = f'{entry.etag[:-1]}-{encoding}"'
+            entry.encodings[encoding] = sibling
+        return entry
+    
+    @staticmethod
+    def _sibling_current(sibling):
+        try:
+            stat = os.stat(sibling.path)
+        except OSError:
+            return False
+        return stat.st_size == sibling.size and stat.st_mtime_ns == sibling.mtime_ns
+
+_static_files = {}
+_static_files_lock = threading.Lock()
+
+def get_static_files(root):
+    with _static_files_lock:
+        files = _static_files.get(root)
+        if files is None:
+            files = _static_files[root] = StaticFiles(root)
+        return files
 
 class WeatherAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive; every response must carry Content-Length or be chunked
+    timeout = 30  # Socket timeout while reading a request
+    db_path = DB_PATH
+    static_root = '/app/static'
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes; don't wait for the delayed ACK
+    MAX_PAGE_SIZE = 10000
+    DEFAULT_MAX_POINTS = 5000
+    DEFAULT_CHANGES_LIMIT = 1000
+    SCRAPE_COOLDOWN = 60  # Seconds a finished manual scrape is reused for new triggers
+    QUERY_CACHE_BYTES = 64 * 1024 * 1024  # Serialized /api/weather/data responses kept per database
+    COMPRESS_MIN_BYTES = 1024  # Smaller JSON bodies are sent as they are
+    EXPORT_FORMATS = {
+        'csv': ('text/csv; charset=utf-8', iter_csv_export),
+        'ndjson': ('application/x-ndjson; charset=utf-8', iter_ndjson),
+    }
+    # Route labels for request metrics; anything else is counted as 'other'
+    ROUTES = {'/api/weather/latest', '/api/weather/stream', '/api/weather/data', '/api/weather/export',
+              '/api/weather/changes', '/api/weather/analytics', '/api/weather/stats', '/api/stations', '/api/weather/scrape', '/metrics'}
+    
     def __init__(self, *args, **kwargs):
-        self.db = WeatherDatabase('/app/data/weather_data.db')
+        # Cheap: connections are pooled per thread and the schema is set up once per process
+        self.db = WeatherDatabase(self.db_path)
         self.scraper = WeatherScraper()
+        self.parked = False
         super().__init__(*args, **kwargs)
     
+    def handle(self):
+        """Serve requests on this connection until it idles, then hand it back to the server"""
+        self.handle_one_request()
+        park = getattr(self.server, 'park', None)
+        while not self.close_connection:
+            if park and not self._has_pending_input():
+                self.parked = park(self.request, self.client_address)
+                self.close_connection = not self.parked  # Server is shutting down
+                return
+            self.handle_one_request()
+    
+    def handle_one_request(self):
+        self._status = None
+        self._profile = None
+        start = time.perf_counter()
+        try:
+            super().handle_one_request()
+        finally:
+            if self._profile is not None:
+                self._profile.__exit__(None, None, None)
+                print(f"Profile of {self.command} {self.path} written to {self._profile.path}")
+            if self._status is not None:
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, self.command, self.route_label(),
+                                             str(self._status))
+    
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if 'requests' in PROFILE_TARGETS and 'profile=1' in urlparse(self.path).query.split('&'):
+            self._profile = profiled('requests', f'{self.command} {urlparse(self.path).path}').__enter__()
+        return True
+    
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+    
+    def route_label(self):
+        path = urlparse(self.path).path
+        if path in self.ROUTES:
+            return path
+        if path.startswith('/api/weather/scrape/'):
+            return '/api/weather/scrape/{job_id}'
+        if path.startswith('/static/'):
+            return '/static/'
+        return 'other'
+    
+    def _has_pending_input(self):
+        # Pipelined bytes may already sit in rfile's buffer; peek without blocking
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def send_json_response(self, data, status_code=200):
+        self.send_body(dumps_json(data), 'application/json', status_code)
+    
+    def send_json_stream(self, records):
+        """Write a JSON array as records are produced; same bytes as send_json_response(list(records))"""
+        self.send_stream(iter_json_array(records), 'application/json', encoding=self.negotiate_encoding())
+    
+    @staticmethod
+    def number_list(query_params, name, default):
+        """Comma-separated numbers of a query parameter (ascending, at most 32), or default"""
+        value = query_params.get(name, [None])[0]
+        if value is None:
+            return default
+        numbers = sorted({float(part) for part in value.split(',') if part.strip()})
+        if len(numbers) > 32:
+            raise ValueError(f"Too many values for {name}")
+        return tuple(numbers)
+    
+    def query_cache(self):
+        return get_query_cache(self.db_path, self.QUERY_CACHE_BYTES)
+    
+    def send_cached(self, entry):
+        self.send_body(entry.body, 'application/json', etag=entry.etag, variants=entry.variants)
+    
+    def send_cached_json(self, key, span, build):
+        """Send the cached JSON for key, or build() the data, serialize it once and cache it"""
+        cache = self.query_cache()
+        entry, version = cache.get(self.db, key)
+        if entry is None:
+            entry = cache.put(key, version, span, dumps_json(build()))
+        self.send_cached(entry)
+    
+    def send_cached_stream(self, key, span, records):
+        """Like send_cached_json for streamed arrays: a miss is streamed and kept if it fits the cache"""
+        cache = self.query_cache()
+        entry, version = cache.get(self.db, key)
+        if entry is not None:
+            self.send_cached(entry)
+            return
+        
+        captured = []
+        complete = False
+        
+        def capture(chunks):
+            nonlocal complete
+            size = 0
+            for chunk in chunks:
+                size += len(chunk)
+                if size <= cache.max_entry_bytes:
+                    captured.append(chunk)
+                elif captured:
+                    captured.clear()  # Too large to cache; stop holding on to it
+                yield chunk
+            complete = size <= cache.max_entry_bytes
+        self.send_stream(capture(iter_json_array(records())), 'application/json', encoding=self.negotiate_encoding())
+        if complete:
+            cache.put(key, version, span, b''.join(captured))
+    
+    def send_stream(self, chunks, content_type, headers=None, encoding=None):
+        """Write byte chunks with chunked transfer encoding, compressed with encoding ('gzip' / 'br') if given.
+        
+        HTTP/1.0 clients (and proxies such as nginx with its default proxy_http_version)
+        cannot decode chunks: they get the bytes as they are, ended by closing the connection.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        
+        writer = ChunkedWriter(self.wfile, encoding=encoding, chunked=chunked)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+        except Exception as e:
+            # Headers are out; all we can do is drop the connection so the client sees a truncated body
+            print(f"Error while streaming response: {e}")
+            self.close_connection = True
+    
+    def accepts_gzip(self):
+        return self.accepts_encoding('gzip')
+    
+    def negotiate_encoding(self, size=None):
+        """Content-Encoding for a response of size bytes (None: streamed, size unknown), or None"""
+        if size is not None and size < self.COMPRESS_MIN_BYTES:
+            return None
+        if brotli is not None and self.accepts_encoding('br'):
+            return 'br'
+        return 'gzip' if self.accepts_gzip() else None
+    
+    def accepts_encoding(self, encoding):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.strip().partition(';')
+            if name.strip().lower() in (encoding, '*'):
+                return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+        return False
+    
+    def send_body(self, body, content_type, status_code=200, etag=None, variants=None):
+        """Send body, compressed when the client accepts it and it is at least COMPRESS_MIN_BYTES.
+        
+        With an etag, a matching If-None-Match gets a 304; each encoding has its own
+        ETag. variants memoizes the compressed bodies of responses sent repeatedly.
+        """
+        negotiable = len(body) >= self.COMPRESS_MIN_BYTES
+        encoding = self.negotiate_encoding(len(body))
+        if etag and encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+        if etag and self.etag_matches(etag):
+            self.send_not_modified(etag, vary=negotiable)
+            return
+        if encoding:
+            compressed = variants.get(encoding) if variants is not None else None
+            if compressed is None:
+                compressed = compress_body(body, encoding)
+                if variants is not None:
+                    variants[encoding] = compressed
+            body = compressed
+        
         self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if negotiable:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def etag_matches(self, etag):
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+    
+    def send_static(self, relative_path):
+        files = get_static_files(self.static_root)
+        entry = files.get(relative_path or 'index.html')
+        if entry is None:
+            # SPAのため、存在しないパスはindex.htmlを返す
+            entry = files.get('index.html')
+            if entry is None:
+                self.send_json_response({'error': 'Not found'}, 404)
+                return
+        
+        encoding = next((name for name in entry.encodings if self.accepts_encoding(name)), None)
+        selected = entry.encodings[encoding] if encoding else entry
+        headers = {'ETag': selected.etag, 'Last-Modified': selected.last_modified,
+                   'Cache-Control': selected.cache_control}
+        if entry.encodings:
+            headers['Vary'] = 'Accept-Encoding'
+        
+        if self.etag_matches(selected.etag) or self.not_modified_since(selected.mtime_ns):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', selected.content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(selected.size))
+        self.end_headers()
+        if selected.body is not None:
+            self.wfile.write(selected.body)
+        else:
+            with open(selected.path, 'rb') as f:
+                self.connection.sendfile(f, 0, selected.size)
+    
+    def not_modified_since(self, mtime_ns):
+        """If-Modified-Since check; only consulted when the request has no If-None-Match"""
+        since = self.headers.get('If-Modified-Since')
+        if not since or 'If-None-Match' in self.headers:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return mtime_ns // 1_000_000_000 <= since
+    
+    def send_not_modified(self, etag, vary=False):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
         self.send_header('Access-Control-Allow-Origin', '*')
+        if vary:
+            self.send_header('Vary', 'Accept-Encoding')
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
     
     def do_GET(self):
         parsed_url = urlparse(self.path)
@@ -433,21 +3511,135 @@ class WeatherAPIHandler(BaseHTTPRequestHandler):
         
         try:
             if path == '/api/weather/latest':
-                data = self.db.get_latest_data()
-                self.send_json_response(data)
+                snapshot = self.db.get_latest_snapshot()
+                self.send_body(snapshot.body, 'application/json', etag=snapshot.etag, variants=snapshot.variants)
+                
+            elif path == '/api/weather/stream':
+                self.send_event_stream()
+                
+            elif path == '/metrics':
+                self.send_body(METRICS.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
                 
             elif path == '/api/weather/data':
                 start_date = query_params.get('start_date', [None])[0]
                 end_date = query_params.get('end_date', [None])[0]
                 station_code = query_params.get('station_code', [None])[0]
                 limit = query_params.get('limit', [None])[0]
+                page_size = query_params.get('page_size', [None])[0]
+                
+                resolution = query_params.get('resolution', [None])[0]
+                # shape=columns: {"stations": {...}, field: [...]} instead of an array of records
+                shape = query_params.get('shape', ['rows'])[0]
+                if shape not in ('rows', 'columns'):
+                    raise ValueError(f"Unsupported shape: {shape}")
+                shaped = to_columns if shape == 'columns' else (lambda data: data)
                 
                 if limit:
                     limit = int(limit)
                 
-                data = self.db.get_weather_data(start_date, end_date, station_code, limit)
-                self.send_json_response(data)
+                if resolution == 'auto':
+                    max_points = int(query_params.get('max_points', [self.DEFAULT_MAX_POINTS])[0])
+                    resolution = self.db.choose_resolution(start_date, end_date, station_code, max_points)
+                
+                # Cache key over normalized parameters; span is the ts range the result depends on
+                start = WeatherDatabase.to_epoch(start_date) if start_date else None
+                end = WeatherDatabase.to_epoch(end_date) if end_date else None
+                span = (start, end)
+                key = (start, end, station_code or None, limit or None, shape)
                 
+                if resolution and resolution != 'raw':
+                    if resolution not in WeatherDatabase.ROLLUP_RESOLUTIONS:
+                        raise ValueError(f"Unsupported resolution: {resolution}")
+                    # Buckets overlapping the range: the first starts before start, the last ends after end
+                    width = WeatherDatabase.ROLLUP_RESOLUTIONS[resolution]
+                    span = (None if start is None else start - start % width, None if end is None else end + width)
+                    
+                    def build():
+                        data = self.db.get_rollup_data(resolution, start_date, end_date, station_code)
+                        return shaped(data[:limit] if limit else data)
+                    self.send_cached_json(('rollup', resolution) + key, span, build)
+                elif page_size:
+                    # Keyset pagination: {"data": [...], "next_cursor": "..."}
+                    page_size = max(1, min(int(page_size), self.MAX_PAGE_SIZE))
+                    cursor = query_params.get('cursor', [None])[0]
+                    
+                    def build():
+                        data, next_cursor = self.db.get_weather_page(start_date, end_date, station_code,
+                                                                     page_size, cursor)
+                        return {'data': shaped(data), 'next_cursor': next_cursor}
+                    self.send_cached_json(('page', page_size, cursor) + key, span, build)
+                elif limit:
+                    self.send_cached_json(('raw',) + key, span,
+                                          lambda: shaped(self.db.get_weather_data(start_date, end_date, station_code,
+                                                                                  limit)))
+                elif shape == 'columns':
+                    # Columns need every row before the first value of the next field: built in memory
+                    self.send_cached_json(('raw',) + key, span,
+                                          lambda: to_columns(self.db.iter_weather_data(start_date, end_date,
+                                                                                       station_code)))
+                else:
+                    # Unbounded range: stream the same JSON array row by row
+                    self.send_cached_stream(('raw',) + key, span,
+                                            lambda: self.db.iter_weather_data(start_date, end_date, station_code))
+                
+            elif path == '/api/weather/export':
+                start_date = query_params.get('start_date', [None])[0]
+                end_date = query_params.get('end_date', [None])[0]
+                station_code = query_params.get('station_code', [None])[0]
+                export_format = query_params.get('format', ['csv'])[0]
+                if export_format not in self.EXPORT_FORMATS:
+                    raise ValueError(f"Unsupported export format: {export_format}")
+                
+                content_type, encode = self.EXPORT_FORMATS[export_format]
+                encoding = self.negotiate_encoding() if query_params.get('gzip', ['1'])[0] != '0' else None
+                station_part = f"_{re.sub(r'[^A-Za-z0-9_-]', '', station_code)}" if station_code else '_all_stations'
+                filename = f"isewan_weather_{datetime.now().strftime('%Y%m%d_%H%M')}{station_part}.{export_format}"
+                records = self.db.iter_weather_data(start_date, end_date, station_code)
+                self.send_stream(encode(records), content_type,
+                                 {'Content-Disposition': f'attachment; filename="{filename}"'}, encoding)
+                
+            elif path == '/api/weather/changes':
+                # Change feed for mirrors: rows inserted / updated after the `since` cursor
+                since = int(query_params.get('since', ['0'])[0])
+                limit = max(1, min(int(query_params.get('limit', [self.DEFAULT_CHANGES_LIMIT])[0]), self.MAX_PAGE_SIZE))
+                changes, next_since, has_more = self.db.get_changes(since, limit)
+                self.send_json_response({'changes': changes, 'next_since': next_since, 'has_more': has_more,
+                                         'change_seq': self.db.get_change_seq()})
+            
+            elif path == '/api/weather/analytics':
+                if np is None:
+                    self.send_json_response({'error': 'Analytics requires numpy'}, 501)
+                    return
+                start_date = query_params.get('start_date', [None])[0]
+                end_date = query_params.get('end_date', [None])[0]
+                station_code = query_params.get('station_code', [None])[0]
+                group = query_params.get('group', [None])[0]
+                if group not in (None, 'month'):
+                    raise ValueError(f"Unsupported group: {group}")
+                options = {
+                    'speed_bins': self.number_list(query_params, 'speed_bins', (0, 2, 4, 6, 8, 10, 15)),
+                    'percentiles': self.number_list(query_params, 'percentiles', (50, 75, 90, 95, 99)),
+                    'wind_thresholds': self.number_list(query_params, 'wind_thresholds', (5, 10, 15)),
+                    'wave_thresholds': self.number_list(query_params, 'wave_thresholds', (1, 2, 3)),
+                }
+                if not options['speed_bins'] or any(not 0 <= p <= 100 for p in options['percentiles']):
+                    raise ValueError("speed_bins must not be empty and percentiles must be within 0-100")
+                start = WeatherDatabase.to_epoch(start_date) if start_date else None
+                end = WeatherDatabase.to_epoch(end_date) if end_date else None
+                
+                def build():
+                    stations = []
+                    for _, code, name in self.db._stations(self.db.connection().cursor(), station_code):
+                        columns = self.db.load_observation_columns(code, start, end)
+                        summary = summarize_observations(columns, **options)
+                        if group == 'month':
+                            summary['months'] = summarize_by_month(columns, **options)
+                        stations.append(dict(station_code=code, station_name=name, **summary))
+                    return {'start_date': start_date, 'end_date': end_date, 'stations': stations}
+                # Closed ranges stay cached across ingests of newer observations
+                key = ('analytics', start, end, station_code or None, group) + tuple(map(tuple, options.values()))
+                self.send_cached_json(key, (start, end), build)
+            
             elif path == '/api/weather/stats':
                 count = self.db.get_data_count()
                 self.send_json_response({'total_records': count})
@@ -455,72 +3647,61 @@ class WeatherAPIHandler(BaseHTTPRequestHandler):
             elif path == '/api/stations':
                 self.send_json_response(self.scraper.stations)
                 
+            elif path == '/api/weather/scrape' or path.startswith('/api/weather/scrape/'):
+                job_id = path[len('/api/weather/scrape/'):]
+                jobs = self.scrape_jobs()
+                job = jobs.get(job_id) if job_id else jobs.latest()
+                if job is None:
+                    self.send_json_response({'error': 'Scrape job not found'}, 404)
+                else:
+                    self.send_json_response(job.to_dict())
+                
             elif path.startswith('/static/'):
                 # 静的ファイルの配信
-                static_path = path[8:]  # Remove '/static/' prefix
-                if not static_path:
-                    static_path = 'index.html'
-                
-                file_path = os.path.join('/app/static', static_path)
-                if os.path.exists(file_path):
-                    if static_path.endswith('.html'):
-                        content_type = 'text/html'
-                    elif static_path.endswith('.js'):
-                        content_type = 'application/javascript'
-                    elif static_path.endswith('.css'):
-                        content_type = 'text/css'
-                    else:
-                        content_type = 'application/octet-stream'
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', content_type)
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    
-                    with open(file_path, 'rb') as f:
-                        self.wfile.write(f.read())
-                else:
-                    # SPAのため、存在しないパスはindex.htmlを返す
-                    index_path = '/app/static/index.html'
-                    if os.path.exists(index_path):
-                        self.send_response(200)
-                        self.send_header('Content-Type', 'text/html')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.end_headers()
-                        
-                        with open(index_path, 'rb') as f:
-                            self.wfile.write(f.read())
-                    else:
-                        self.send_json_response({'error': 'Not found'}, 404)
+                self.send_static(unquote(path[len('/static/'):]))
                 
             else:
                 self.send_json_response({'error': 'Not found'}, 404)
                 
+        except ValueError as e:
+            self.send_json_response({'error': str(e)}, 400)
         except Exception as e:
             print(f"Error handling GET request: {e}")
             self.send_json_response({'error': str(e)}, 500)
     
+    def send_event_stream(self):
+        """Send SSE headers, then hand the connection to the broadcaster thread"""
+        try:
+            last_event_id = int(self.headers.get('Last-Event-ID', ''))
+        except ValueError:
+            last_event_id = None
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('X-Accel-Buffering', 'no')  # nginx: pass events through unbuffered
+        self.send_header('Connection', 'close')  # The body ends when either side closes
+        self.end_headers()
+        self.wfile.flush()
+        get_event_stream(self.db_path).subscribe(self.connection, last_event_id)
+        self.parked = True  # The server must not close the socket now
+    
+    def scrape_jobs(self):
+        return get_scrape_jobs(self.db_path, self.SCRAPE_COOLDOWN)
+    
     def do_POST(self):
         parsed_url = urlparse(self.path)
         path = parsed_url.path
         
         try:
             if path == '/api/weather/scrape':
-                print("Starting weather data scraping...")
-                scraped_data = self.scraper.scrape_all_stations()
-                
-                if scraped_data:
-                    saved_count = self.db.save_weather_data(scraped_data)
-                    self.send_json_response({
-                        'success': True,
-                        'message': f'Successfully scraped and saved {saved_count} records',
-                        'records_saved': saved_count
-                    })
-                else:
-                    self.send_json_response({
-                        'success': False,
-                        'message': 'No data was scraped'
-                    })
+                # Runs in the background; poll GET /api/weather/scrape/<job_id> for the result
+                job, started = self.scrape_jobs().submit()
+                if started:
+                    print(f"Starting weather data scraping (job {job.id})...")
+                result = job.to_dict()
+                result['status_url'] = f'/api/weather/scrape/{job.id}'
+                self.send_json_response(result, 200 if job.finished else 202)
             else:
                 self.send_json_response({'error': 'Not found'}, 404)
                 
@@ -528,32 +3709,51 @@ class WeatherAPIHandler(BaseHTTPRequestHandler):
             print(f"Error handling POST request: {e}")
             self.send_json_response({'error': str(e)}, 500)
 
-def run_server(port=8000):
+def run_server(port=8000, max_workers=32, keepalive_timeout=15):
+    WeatherDatabase(WeatherAPIHandler.db_path)  # Schema check once at startup, not per request
     server_address = ('0.0.0.0', port)  # Docker環境では0.0.0.0でリッスン
-    httpd = HTTPServer(server_address, WeatherAPIHandler)
-    print(f"Starting Python weather API server on port {port}")
-    print(f"Database will be saved as: /app/data/weather_data.db")
+    httpd = KeepAliveHTTPServer(server_address, WeatherAPIHandler, max_workers, keepalive_timeout)
+    print(f"Starting Python weather API server on port {port} ({max_workers} workers)")
+    print(f"Database will be saved as: {WeatherAPIHandler.db_path}")
     print("Available endpoints:")
     print("  GET  /api/weather/latest - Get latest data from all stations")
     print("  GET  /api/weather/data - Get weather data with optional filters")
+    print("  GET  /api/weather/stream - Server-Sent Events with new observations")
+    print("  GET  /api/weather/changes?since=N - Rows inserted or updated after change seq N")
+    print("  GET  /api/weather/analytics - Wind rose, percentiles and exceedance per station")
     print("  GET  /api/weather/stats - Get database statistics")
     print("  GET  /api/stations - Get station information")
-    print("  POST /api/weather/scrape - Scrape new data from all stations")
+    print("  POST /api/weather/scrape - Start (or join) a background scrape of all stations")
+    print("  GET  /api/weather/scrape/<job_id> - Scrape job status and per-station timings")
+    print("  GET  /metrics - Prometheus metrics")
     print("  GET  /static/ - Static files (frontend)")
     
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\nShutting down server...")
-        httpd.shutdown()
+    # serve_forever runs in a thread so the main thread can call shutdown() on SIGTERM / Ctrl+C
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    server_thread = threading.Thread(target=httpd.serve_forever, name='http-accept')
+    server_thread.start()
+    stop.wait()
+    
+    print("\nShutting down server...")
+    httpd.shutdown()
+    server_thread.join()
+    httpd.server_close()  # Waits for in-flight requests
+    for broadcaster in list(_event_streams.values()):
+        broadcaster.close()
+    print("Server stopped")
 
 if __name__ == '__main__':
     import os
     # Docker環境では8000番ポートを使用
     port = int(os.environ.get('PORT', 8000))
+    max_workers = int(os.environ.get('HTTP_WORKERS', 32))
+    keepalive_timeout = float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', 15))
+    WeatherAPIHandler.SCRAPE_COOLDOWN = float(os.environ.get('SCRAPE_COOLDOWN', WeatherAPIHandler.SCRAPE_COOLDOWN))
     
     # データディレクトリを作成
-    os.makedirs('/app/data', exist_ok=True)
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     os.makedirs('/app/logs', exist_ok=True)
     
-    run_server(port)
\ No newline at end of file
+    run_server(port, max_workers, keepalive_timeout)
\ No newline at end of file
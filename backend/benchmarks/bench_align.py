@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+align_to_reference_time benchmark on synthetic history
+Checks output identity against the former quadratic implementation on a
+small sample, then times the indexed alignment on the full data set.
+Usage: python benchmarks/bench_align.py [--days 30] [--stations 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import Observation, WeatherScraper
+
+
+def legacy_align(scraper, all_data):
+    """The pre-index alignment (refs x stations x records), kept for parity checks"""
+    def find_closest(station, reference_time):
+        station_data = [d for d in all_data if d.station_code == station['code']]
+        if not station_data:
+            return None
+        exact_match = next((d for d in station_data if d.timestamp == reference_time), None)
+        if exact_match:
+            return exact_match
+        ref_dt = datetime.fromisoformat(reference_time)
+        update_interval = station.get('update_interval', 15)
+        for data in station_data:
+            data_dt = datetime.fromisoformat(data.timestamp)
+            if abs((ref_dt - data_dt).total_seconds() / 60) <= update_interval:
+                return data
+        return min(station_data, key=lambda d: abs((ref_dt - datetime.fromisoformat(d.timestamp)).total_seconds()))
+
+    reference_data = [d for d in all_data if d.station_code == 'iragomisaki_vtss']
+    if not reference_data:
+        return all_data
+    aligned = []
+    for ref_time in [d.timestamp for d in reference_data]:
+        for station in scraper.stations:
+            found = find_closest(station, ref_time)
+            aligned.append(found if found else Observation(station['code'], station['name'], ref_time, None, None, None))
+    return aligned
+
+
+def make_dataset(days, station_count, seed=0):
+    """Scraped-order records: 15/30 minute stations with gaps, jitter, duplicates and shuffling"""
+    rng = random.Random(seed)
+    end = datetime(2025, 1, 1)
+    stations, all_data = [], []
+    for i in range(station_count):
+        code = 'iragomisaki_vtss' if i == 0 else f'station_{i:03d}'
+        interval = 15 if i == 0 or i % 2 else 30
+        stations.append({'name': code, 'code': code, 'update_interval': interval})
+        if i and i % 7 == 0:
+            continue  # station with no data at all
+        records = []
+        for step in range(days * 24 * 60 // interval):
+            if i and rng.random() < 0.05:
+                continue  # missed observation
+            offset = rng.choice((0, 0, 0, 5, -5, 45)) if i else 0
+            ts = end - timedelta(minutes=interval * step + offset)
+            records.append(Observation(code, code, ts.strftime('%Y-%m-%d %H:%M:%S'), '北', rng.random() * 10, None))
+        if i and i % 5 == 0:
+            records += rng.sample(records, len(records) // 20)  # duplicate timestamps
+            rng.shuffle(records)
+        all_data.extend(records)
+    return stations, all_data
+
+
+def run(scraper, all_data, align):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        aligned = align(all_data)
+        return aligned, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--stations', type=int, default=50)
+    parser.add_argument('--parity-days', type=int, default=2)
+    parser.add_argument('--parity-stations', type=int, default=12)
+    args = parser.parse_args()
+
+    scraper = WeatherScraper()
+
+    # Identity check: the new alignment must return the very same record objects
+    scraper.stations, sample = make_dataset(args.parity_days, args.parity_stations, seed=1)
+    expected, legacy_time = run(scraper, sample, lambda d: legacy_align(scraper, d))
+    actual, new_time = run(scraper, sample, scraper.align_to_reference_time)
+    scraped_ids = {id(d) for d in sample}
+    identical = len(expected) == len(actual) and all(
+        a is b if id(a) in scraped_ids else a == b for a, b in zip(expected, actual))
+    print(f"Parity ({args.parity_days}d x {args.parity_stations} stations, {len(sample)} records): "
+          f"{'identical' if identical else 'MISMATCH'}  legacy {legacy_time:.2f}s  indexed {new_time:.3f}s")
+
+    scraper.stations, all_data = make_dataset(args.days, args.stations)
+    aligned, elapsed = run(scraper, all_data, scraper.align_to_reference_time)
+    print(f"Indexed alignment ({args.days}d x {args.stations} stations, {len(all_data)} records "
+          f"-> {len(aligned)} aligned): {elapsed:.2f}s")
+
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
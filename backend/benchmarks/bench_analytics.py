@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+/api/weather/analytics over 10 years of 5-station data
+Compares the spreadsheet-style computation (rows as dicts, Python loops) with
+load_observation_columns + summarize_observations, checks both give the same
+numbers, and times the endpoint cold and from the query result cache.
+Usage: python benchmarks/bench_analytics.py [--years 10] [--stations 5]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase, WIND_SECTORS,
+                 summarize_by_month, summarize_observations)
+from synthetic import build_database
+
+SPEED_BINS = (0, 2, 4, 6, 8, 10, 15)
+PERCENTILES = (50, 75, 90, 95, 99)
+WIND_THRESHOLDS = (5, 10, 15)
+
+
+def percentile(ordered, p):
+    """numpy's default (linear) percentile of a sorted list"""
+    k = (len(ordered) - 1) * p / 100
+    low, high = math.floor(k), math.ceil(k)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def python_summary(records):
+    """What the port-operations spreadsheet does with an export, row by row"""
+    speeds = sorted(r['wind_speed'] for r in records if r['wind_speed'] is not None)
+    rose = [[0] * len(SPEED_BINS) for _ in WIND_SECTORS]
+    sectors = {name: index for index, name in enumerate(WIND_SECTORS)}
+    for r in records:
+        if r['wind_speed'] is None or r['wind_direction'] not in sectors:
+            continue
+        speed_bin = max(i for i, edge in enumerate(SPEED_BINS) if r['wind_speed'] >= edge)
+        rose[sectors[r['wind_direction']]][speed_bin] += 1
+    return {
+        'percentiles': {f'p{p}': round(percentile(speeds, p), 3) for p in PERCENTILES},
+        'exceedance': {f'{t}': round(sum(s >= t for s in speeds) * 100 / len(speeds), 2) for t in WIND_THRESHOLDS},
+        'rose': [[round(n * 100 / len(speeds), 2) for n in row] for row in rose],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8029)
+    args = parser.parse_args()
+    rows = args.years * 365 * 96 * args.stations  # 15-minute observations
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        print(f"Building {rows:,} rows ({args.years} years x {args.stations} stations)...")
+        build_database(db_path, rows, args.stations)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+        code = 'station_1'
+
+        start = time.perf_counter()
+        records = db.get_weather_data(station_code=code)
+        load_dicts = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = python_summary(records)
+        python_stats = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columns = db.load_observation_columns(code)
+        load_columns = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = summarize_observations(columns, SPEED_BINS, PERCENTILES, WIND_THRESHOLDS)
+        numpy_stats = time.perf_counter() - start
+        start = time.perf_counter()
+        months = summarize_by_month(columns, speed_bins=SPEED_BINS, percentiles=PERCENTILES,
+                                    wind_thresholds=WIND_THRESHOLDS)
+        monthly = time.perf_counter() - start
+
+        same = (expected['percentiles'] == summary['wind_speed']['percentiles']
+                and expected['exceedance'] == summary['wind_speed']['exceedance']
+                and expected['rose'] == summary['wind_rose']['percent'])
+        print(f"\none station, {len(records):,} rows: results {'identical' if same else 'DIFFER'}")
+        print(f"  dicts + Python loops   load {load_dicts:6.2f}s  stats {python_stats * 1000:8.1f} ms")
+        print(f"  NumPy columns          load {load_columns:6.2f}s  stats {numpy_stats * 1000:8.1f} ms  "
+              f"({len(months)} months {monthly * 1000:.1f} ms)")
+        print(f"  column memory {sum(column.nbytes for column in columns) / 2**20:.1f} MiB")
+        del records
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=300)
+        try:
+            for label, path in (('all stations', '/api/weather/analytics?end_date=2024-12-31T23:59:59'),
+                                ('all, by month', '/api/weather/analytics?end_date=2024-12-31T23:59:59&group=month')):
+                times = []
+                for _ in range(3):
+                    start = time.perf_counter()
+                    conn.request('GET', path)
+                    body = conn.getresponse().read()
+                    times.append(time.perf_counter() - start)
+                result = json.loads(body)
+                print(f"{label:14s} cold {times[0]:6.2f}s  cached {min(times[1:]) * 1000:6.2f} ms  "
+                      f"{len(body):>9,} bytes, {len(result['stations'])} stations")
+        finally:
+            conn.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
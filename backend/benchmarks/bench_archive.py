@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Cold-storage archive: database size, hot-query latency and archived-range scans
+Builds years of 5-station data, captures query results, archives everything
+before the last months into segment files (manage.py archive) and compares:
+file sizes, latency of the queries the pages make against recent data, and
+throughput of scans over archived months. Checks every query returns the same
+records before and after, and that a correction to an archived month restores it.
+Usage: python benchmarks/bench_archive.py [--years 5] [--stations 5] [--hot-months 6]
+"""
+
+import argparse
+import calendar
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherDatabase, np
+from synthetic import build_database
+
+# The synthetic data ends at 2025-01-01 00:00
+HOT_QUERIES = [
+    ('latest', lambda db: db.query_latest_records()),
+    ('last 24 hours', lambda db: db.get_weather_data('2024-12-31T00:00:00')),
+    ('last 7 days', lambda db: db.get_weather_data('2024-12-25T00:00:00')),
+    ('page of 1000', lambda db: db.get_weather_page('2024-12-01', page_size=1000)[0]),
+]
+ARCHIVED_QUERIES = [
+    ('1 month, all', lambda db: db.get_weather_data('2024-03-01', '2024-03-31T23:59:59')),
+    ('1 year, station', lambda db: db.get_weather_data('2023-06-01', '2024-05-31T23:59:59', 'station_1')),
+    ('all, station', lambda db: db.get_weather_data(station_code='station_2')),
+    ('all, every station', lambda db: db.get_weather_data()),
+]
+
+
+def files_size(db_path, archive_dir):
+    database = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+    archive = sum(os.path.getsize(os.path.join(directory, name))
+                  for directory, _, names in os.walk(archive_dir) for name in names)
+    return database, archive
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--hot-months', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rows = args.years * 365 * 96 * args.stations
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        print(f"Building {rows:,} rows ({args.years} years x {args.stations} stations)...")
+        build_database(db_path, rows, args.stations)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+        conn = db.connection()
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size_before = files_size(db_path, db.archive_dir)
+        count_before = db.get_data_count()
+
+        queries = HOT_QUERIES + ARCHIVED_QUERIES
+        before = {label: best_time(lambda: query(db), 1 if label.startswith('all') else args.repeat)
+                  for label, query in queries}
+        columns_before = db.load_observation_columns('station_1') if np is not None else None
+
+        # Keep the last hot_months months before 2025-01 in observations
+        year, month = divmod(2025 * 12 - args.hot_months, 12)
+        cutoff = calendar.timegm((year, month + 1, 1, 0, 0, 0))
+        start = time.perf_counter()
+        totals = db.archive_observations(cutoff)
+        archive_seconds = time.perf_counter() - start
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size_after = files_size(db_path, db.archive_dir)
+        hot_rows = conn.execute('SELECT COUNT(*) FROM observations').fetchone()[0]
+        print(f"archived {totals['rows']:,} rows into {totals['segments']:,} segments in {archive_seconds:.1f}s "
+              f"({totals['rows'] / archive_seconds:,.0f} rows/s), {hot_rows:,} rows stay in observations")
+        print(f"size: database {size_before[0] / 2**20:7.1f} MiB -> {size_after[0] / 2**20:7.1f} MiB + "
+              f"archive {size_after[1] / 2**20:5.1f} MiB ({size_after[1] / max(totals['rows'], 1):.2f} bytes/row); "
+              f"total {sum(size_before) / sum(size_after):.1f}x smaller")
+
+        after = {label: best_time(lambda: query(db), 1 if label.startswith('all') else args.repeat)
+                 for label, query in queries}
+        print(f"\n{'query':20s} {'rows':>10s} {'before':>10s} {'after':>10s}  {'rows/s after':>14s}")
+        for label, _ in queries:
+            (old_result, old_time), (new_result, new_time) = before[label], after[label]
+            same = 'identical' if old_result == new_result else 'DIFFERENT'
+            print(f"{label:20s} {len(new_result):>10,} {old_time * 1000:8.1f}ms {new_time * 1000:8.1f}ms  "
+                  f"{len(new_result) / new_time:>14,.0f}  {same}")
+        print(f"row count {'unchanged' if db.get_data_count() == count_before else 'CHANGED'} ({count_before:,})")
+        if columns_before is not None:
+            columns, load = best_time(lambda: db.load_observation_columns('station_1'), args.repeat)
+            same = all(np.array_equal(a, b, equal_nan=True) for a, b in zip(columns_before, columns))
+            print(f"analytics columns, station_1: {len(columns.ts):,} rows {load * 1000:.1f} ms, "
+                  f"{'identical' if same else 'DIFFERENT'}")
+
+        # A CSV correction inside an archived month brings the month back into observations
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = db.ingest([{'station_name': '観測地点1', 'station_code': 'station_1',
+                                'timestamp': '2024-03-15 12:00:00', 'wind_direction': '南',
+                                'wind_speed': 99.0, 'wave_height': 9.9}])
+        record = db.get_weather_data('2024-03-15T12:00:00', '2024-03-15T12:00:00', 'station_1')
+        print(f"correction in an archived month: {stats}, value {record[0]['wind_speed']}, "
+              f"row count {'unchanged' if db.get_data_count() == count_before else 'CHANGED'}, "
+              f"{conn.execute('SELECT COUNT(*) FROM observations').fetchone()[0] - hot_rows:,} rows restored")
+        again = db.archive_observations(cutoff)
+        print(f"re-archived: {again['segments']} segment, {again['rows']:,} rows; "
+              f"stats {db.get_archive_stats()}")
+
+
+if __name__ == '__main__':
+    main()
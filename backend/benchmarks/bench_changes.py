@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Mirror sync: re-downloading /api/weather/data vs following /api/weather/changes
+A mirror first copies the whole database, then after each scraper ingest (new rows
+for every station plus one corrected historical value) catches up again. Compares
+bytes transferred and wall time for both approaches, and checks the mirror built
+from the change feed matches the source.
+Usage: python benchmarks/bench_changes.py [--rows 1000000] [--batch 10000] [--rounds 3]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase
+from synthetic import build_database
+
+
+def get(conn, path):
+    conn.request('GET', path)
+    return conn.getresponse().read()
+
+
+def full_download(conn):
+    body = get(conn, '/api/weather/data')
+    return {(r['station_code'], r['timestamp']): r for r in json.loads(body)}, len(body)
+
+
+def follow_changes(conn, mirror, since, batch):
+    """Apply changes after `since` to mirror; returns (new since, bytes, requests)"""
+    transferred = requests = 0
+    while True:
+        body = get(conn, f'/api/weather/changes?since={since}&limit={batch}')
+        transferred += len(body)
+        requests += 1
+        page = json.loads(body)
+        for record in page['changes']:
+            record.pop('seq')
+            mirror[(record['station_code'], record['timestamp'])] = record
+        since = page['next_since']
+        if not page['has_more']:
+            return since, transferred, requests
+
+
+def scraper_round(db, round_number):
+    """New observations for every station and one corrected old value, like a scrape plus a CSV fix"""
+    timestamp = datetime(2025, 1, 1) + timedelta(minutes=15 * round_number)
+    records = [{'station_name': f'観測地点{i}', 'station_code': f'station_{i}',
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'), 'wind_direction': '北',
+                'wind_speed': 3.0 + round_number, 'wave_height': None} for i in range(5)]
+    records.append({'station_name': '観測地点2', 'station_code': 'station_2',
+                    'timestamp': (datetime(2024, 6, 1) + timedelta(hours=round_number)).strftime('%Y-%m-%d %H:%M:%S'),
+                    'wind_direction': '南', 'wind_speed': 50.0 + round_number, 'wave_height': 1.0})
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.save_weather_data(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8028)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        start = time.perf_counter()
+        build_database(db_path, args.rows)
+        print(f"Built {args.rows:,} rows in {time.perf_counter() - start:.1f}s "
+              f"({args.rows / (time.perf_counter() - start):,.0f} rows/s through ingest)")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+
+        class Handler(WeatherAPIHandler):
+            QUERY_CACHE_BYTES = 0  # Measure the queries, not the response cache
+
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=300)
+        try:
+            start = time.perf_counter()
+            _, size = full_download(conn)
+            print(f"\ninitial copy   full download  {size / 2**20:8.1f} MiB  {time.perf_counter() - start:8.2f}s")
+            mirror = {}
+            start = time.perf_counter()
+            since, size, requests = follow_changes(conn, mirror, 0, args.batch)
+            print(f"               change feed    {size / 2**20:8.1f} MiB  {time.perf_counter() - start:8.2f}s  "
+                  f"({requests} batches of {args.batch:,})")
+
+            for round_number in range(1, args.rounds + 1):
+                scraper_round(db, round_number)
+                start = time.perf_counter()
+                source, size = full_download(conn)
+                download = time.perf_counter() - start
+                start = time.perf_counter()
+                since, changes_size, requests = follow_changes(conn, mirror, since, args.batch)
+                feed = time.perf_counter() - start
+                print(f"sync round {round_number}   full download  {size / 2**20:8.1f} MiB  {download:8.2f}s   "
+                      f"change feed {changes_size:6,} bytes  {feed * 1000:6.1f} ms")
+            print(f"mirror {'matches' if mirror == source else 'DIFFERS FROM'} the source "
+                  f"({len(mirror):,} rows, change seq {since:,})")
+        finally:
+            conn.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
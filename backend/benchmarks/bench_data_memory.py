@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Peak server memory for a full-range /api/weather/data response
+Runs a fresh server process per mode and reads its peak RSS (VmHWM, Linux):
+  buffered  - ?limit=<rows>: fetchall + one json.dumps buffer (the former behaviour)
+  streaming - no limit: cursor batches written as chunked JSON
+  paginated - ?page_size=N, following next_cursor to the end
+Usage: python benchmarks/bench_data_memory.py [--rows 10000000] [--db PATH] [--modes streaming paginated buffered]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from synthetic import build_database
+
+
+def peak_rss_mib(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def wait_for_server(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/weather/stats')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def fetch_all(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    total = 0
+    while True:
+        chunk = response.read(1 << 20)
+        if not chunk:
+            break
+        total += len(chunk)
+    conn.close()
+    return total
+
+
+def fetch_pages(port, page_size):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    total, cursor = 0, None
+    while True:
+        path = f'/api/weather/data?page_size={page_size}' + (f'&cursor={cursor}' if cursor else '')
+        conn.request('GET', path)
+        body = conn.getresponse().read()
+        total += len(body)
+        cursor = json.loads(body)['next_cursor']
+        if not cursor:
+            break
+    conn.close()
+    return total
+
+
+def run_mode(mode, db_path, rows, port, page_size):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_synthetic.py'), '--db', db_path, '--port', str(port)],
+        stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        baseline = peak_rss_mib(server.pid)
+        start = time.perf_counter()
+        if mode == 'buffered':
+            size = fetch_all(port, f'/api/weather/data?limit={rows}')
+        elif mode == 'streaming':
+            size = fetch_all(port, '/api/weather/data')
+        else:
+            size = fetch_pages(port, page_size)
+        elapsed = time.perf_counter() - start
+        peak = peak_rss_mib(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    print(f"{mode:10s} {size / 1024 / 1024:9.1f} MiB body  {elapsed:7.1f}s  "
+          f"server peak RSS {peak:8.1f} MiB (idle {baseline:.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--db', help='existing database to use (built with --rows if missing)')
+    parser.add_argument('--modes', nargs='+', default=['streaming', 'paginated', 'buffered'])
+    parser.add_argument('--page-size', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=8021)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'weather_data.db')
+        if not os.path.exists(db_path):
+            print(f"Building {args.rows:,} row database at {db_path}...")
+            build_database(db_path, args.rows, verbose=True)
+        for mode in args.modes:
+            run_mode(mode, db_path, args.rows, args.port, args.page_size)
+
+
+if __name__ == '__main__':
+    main()
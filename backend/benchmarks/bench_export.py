@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+/api/weather/export throughput (CSV / NDJSON, with and without gzip)
+Runs the server in a separate process and reports MB/s of uncompressed export
+data, bytes on the wire and the server's peak RSS.
+Usage: python benchmarks/bench_export.py [--rows 1000000] [--db PATH]
+"""
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from bench_data_memory import peak_rss_mib, wait_for_server
+from synthetic import build_database
+
+
+def export(port, export_format, gzip):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+    start = time.perf_counter()
+    conn.request('GET', f'/api/weather/export?format={export_format}', headers=headers)
+    response = conn.getresponse()
+    decompressor = zlib.decompressobj(31) if response.getheader('Content-Encoding') == 'gzip' else None
+    wire = raw = 0
+    while True:
+        chunk = response.read(1 << 20)
+        if not chunk:
+            break
+        wire += len(chunk)
+        raw += len(decompressor.decompress(chunk)) if decompressor else len(chunk)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return raw, wire, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db', help='existing database to use (built with --rows if missing)')
+    parser.add_argument('--port', type=int, default=8022)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'weather_data.db')
+        if not os.path.exists(db_path):
+            print(f"Building {args.rows:,} row database at {db_path}...")
+            build_database(db_path, args.rows)
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'serve_synthetic.py'), '--db', db_path, '--port', str(args.port)],
+            stdout=subprocess.DEVNULL)
+        try:
+            wait_for_server(args.port)
+            for export_format in ('csv', 'ndjson'):
+                for gzip in (False, True):
+                    raw, wire, elapsed = export(args.port, export_format, gzip)
+                    label = f"{export_format}{'+gzip' if gzip else ''}"
+                    print(f"{label:12s} {raw / 1e6:9.1f} MB in {elapsed:6.2f}s = {raw / 1e6 / elapsed:7.1f} MB/s  "
+                          f"wire {wire / 1e6:8.1f} MB  server peak RSS {peak_rss_mib(server.pid):7.1f} MiB")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
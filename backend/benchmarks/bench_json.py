@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+JSON encoding and bytes on the wire for /api/weather/data
+Times encoding 100k records with per-record json.dumps (the old streaming path),
+one json.dumps per batch and orjson (if installed), then fetches a week and a
+year of data over HTTP in the row and column shapes with no compression, gzip
+and brotli, reporting response bytes and time per 100k rows.
+Usage: python benchmarks/bench_json.py [--rows 1000000] [--stations 5]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from app import KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase, brotli, orjson
+from synthetic import build_database
+
+# The synthetic data ends at 2025-01-01 00:00
+RANGES = [
+    ('7 days', 'start_date=2024-12-25T00:00:00'),
+    ('1 year', 'start_date=2024-01-01T00:00:00'),
+]
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def encoders():
+    def per_record(records):
+        return b'[' + b', '.join(json.dumps(r, ensure_ascii=False).encode('utf-8') for r in records) + b']'
+
+    def batched(records):
+        saved, app.orjson = app.orjson, None
+        try:
+            return b''.join(app.iter_json_array(records))
+        finally:
+            app.orjson = saved
+    yield 'json.dumps per record', per_record
+    yield 'json.dumps per batch', batched
+    if orjson is not None:
+        yield 'orjson per batch', lambda records: b''.join(app.iter_json_array(records))
+
+
+def fetch(conn, path, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    return response.getheader('Content-Encoding'), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8030)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        print(f"Building {args.rows:,} rows ({args.stations} stations)...")
+        build_database(db_path, args.rows, args.stations)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+
+        records = db.get_weather_data(limit=100000)
+        print(f"\nencoding {len(records):,} records")
+        reference = json.loads(json.dumps(records, ensure_ascii=False))
+        for label, encode in encoders():
+            body, seconds = best_time(lambda: encode(records))
+            same = 'identical' if json.loads(body) == reference else 'DIFFERENT'
+            print(f"  {label:24s} {seconds * 1000:8.1f} ms  {len(body) / 2**20:6.1f} MiB  {same}")
+
+        class Handler(WeatherAPIHandler):
+            QUERY_CACHE_BYTES = 0  # Every request encodes and compresses
+
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=300)
+        encodings = [None, 'gzip'] + (['br'] if brotli is not None else [])
+        try:
+            print(f"\n{'range':8s} {'shape':8s} {'encoding':8s} {'rows':>9s} {'bytes':>12s} {'bytes/row':>9s} "
+                  f"{'ms/100k rows':>12s}")
+            for label, query in RANGES:
+                rows = None
+                for shape in ('rows', 'columns'):
+                    path = f'/api/weather/data?{query}&shape={shape}'
+                    for encoding in encodings:
+                        (sent, body), seconds = best_time(lambda: fetch(conn, path, encoding))
+                        if sent != encoding:
+                            print(f"  expected Content-Encoding {encoding}, got {sent}")
+                        if rows is None:
+                            rows = len(json.loads(body))
+                        print(f"{label:8s} {shape:8s} {encoding or 'identity':8s} {rows:>9,} {len(body):>12,} "
+                              f"{len(body) / rows:>9.1f} {seconds * 1000 * 100000 / rows:>12.1f}")
+        finally:
+            conn.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
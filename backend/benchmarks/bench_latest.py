@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+/api/weather/latest latency benchmark
+Compares the former per-call pattern (new connection + schema check + correlated
+MAX(timestamp) query per request) with the current WeatherDatabase, directly and
+over HTTP, including ETag revalidation (304).
+Usage: python benchmarks/bench_latest.py [--rows 200000] [--requests 500]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import HTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherAPIHandler
+from synthetic import build_database, build_legacy_database
+
+
+def legacy_latest(db_path):
+    """What every /latest request used to do: connect, re-run schema DDL, query, close"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE IF NOT EXISTS weather_data (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                 'station_name TEXT NOT NULL, station_code TEXT NOT NULL, timestamp TEXT NOT NULL, '
+                 'wind_direction TEXT, wind_speed REAL, wave_height REAL, created_at TEXT NOT NULL, '
+                 'UNIQUE(station_code, timestamp))')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_station_timestamp ON weather_data(station_code, timestamp)')
+    conn.commit()
+    rows = conn.execute('''
+        SELECT * FROM weather_data w1
+        WHERE timestamp = (SELECT MAX(timestamp) FROM weather_data w2 WHERE w2.station_code = w1.station_code)
+        ORDER BY station_code
+    ''').fetchall()
+    conn.close()
+    return rows
+
+
+def timed(func, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples
+
+
+def report(label, samples):
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    print(f"{label:28s} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = build_database(db_path, args.rows)
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        build_legacy_database(legacy_path, args.rows)
+        print(f"{args.rows:,} rows")
+
+        report('legacy (connect per call)', timed(lambda: legacy_latest(legacy_path), args.requests))
+        report('get_latest_data', timed(db.get_latest_data, args.requests))
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *a):
+                pass
+        Handler.db_path = db_path
+        httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+        def fetch(headers={}):
+            conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1])
+            conn.request('GET', '/api/weather/latest', headers=headers)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            return response.getheader('ETag')
+        report('HTTP /api/weather/latest', timed(fetch, args.requests))
+        etag = fetch()
+        report('HTTP If-None-Match (304)', timed(lambda: fetch({'If-None-Match': etag}), args.requests))
+        httpd.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead and /metrics output check
+Times Histogram.observe / Counter.inc, and instrumented WeatherDatabase methods against
+their undecorated originals. Then serves a few requests, prints a sample of /metrics
+and the top of a per-request cProfile (PROFILE=requests, ?profile=1).
+Usage: python benchmarks/bench_metrics.py [--rows 100000] [--calls 20000]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PROFILE', 'requests')
+OWN_PROFILE_DIR = 'PROFILE_DIR' not in os.environ
+if OWN_PROFILE_DIR:
+    os.environ['PROFILE_DIR'] = tempfile.mkdtemp(prefix='isewan-profiles-')
+
+from app import PROFILE_DIR, Counter, Histogram, KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase
+from synthetic import build_database
+
+
+def per_call_us(func, calls):
+    return min(timeit.repeat(func, number=calls, repeat=5)) / calls * 1e6
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', path)
+    body = conn.getresponse().read()
+    conn.close()
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    histogram = Histogram('bench_seconds', 'benchmark', ('method',))
+    counter = Counter('bench_total', 'benchmark', ('station', 'result'))
+    print(f"Histogram.observe    {per_call_us(lambda: histogram.observe(0.003, 'bench'), args.calls):6.2f} us")
+    print(f"Counter.inc          {per_call_us(lambda: counter.inc('bench', 'ok'), args.calls):6.2f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        build_database(db_path, args.rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+        cases = [
+            ('get_latest_snapshot', lambda: db.get_latest_snapshot(),
+             lambda: WeatherDatabase.get_latest_snapshot.__wrapped__(db)),
+            ('get_weather_data(limit=50)', lambda: db.get_weather_data(limit=50),
+             lambda: WeatherDatabase.get_weather_data.__wrapped__(db, limit=50)),
+        ]
+        for name, instrumented, plain in cases:
+            calls = max(1, args.calls // 20)
+            with_metrics, without = per_call_us(instrumented, calls), per_call_us(plain, calls)
+            print(f"{name:28s} {without:8.1f} us plain  {with_metrics:8.1f} us instrumented  "
+                  f"(+{with_metrics - without:5.2f} us)")
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            for path in ('/api/weather/latest', '/api/weather/data?limit=100', '/api/weather/stats', '/nope'):
+                get(args.port, path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                get(args.port, '/api/weather/data?limit=5000&profile=1')
+            time.sleep(0.1)
+            metrics = get(args.port, '/metrics').decode('utf-8').splitlines()
+            print(f"\n/metrics: {len(metrics)} lines, e.g.")
+            for line in metrics:
+                if line.startswith(('isewan_http_request_seconds_count', 'isewan_db_query_seconds_count')):
+                    print(f"  {line}")
+
+            profiles = sorted(os.listdir(PROFILE_DIR))
+            if profiles:
+                print(f"\nProfile {profiles[-1]}:")
+                stats = pstats.Stats(os.path.join(PROFILE_DIR, profiles[-1]), stream=sys.stdout)
+                stats.sort_stats('cumulative').print_stats(8)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            if OWN_PROFILE_DIR:
+                shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
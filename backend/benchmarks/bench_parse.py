@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+HTMLTableParser benchmark: streaming extractor vs BeautifulSoup
+Checks row parity over a corpus of station pages, then compares parse time and peak memory.
+Usage: python benchmarks/bench_parse.py [--rows 48 500] [--repeat 200] [--corpus DIR]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import HTMLTableParser
+from stub_server import generate_station_page
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'pages')
+
+# Markup quirks seen on (or plausible for) the station pages
+QUIRK_PAGES = {
+    'layout_table_first': '<table><tr><td></td></tr></table><table><tr><th>時刻</th><th>風向</th></tr>'
+                          '<tr><td>10:00</td><td>北</td><td>3.0</td></tr></table>',
+    'unclosed_cells': '<table><tr><th>時刻<th>風向<th>風速<tr><td>10:00<td>北東<td>5.2</table>',
+    'nested_table': '<table><tr><td>a<table><tr><td>n</td></tr></table>z</td></tr></table>',
+    'entities_and_comments': '<table><tr><td> 1&amp;2<!-- x -->3 </td><td>&nbsp;5.0<br>m/s</td></tr></table>',
+    'script_in_cell': '<table><tr><td>7.5<script>var a = "<td>";</script></td></tr></table>',
+    'unterminated_table': '<html><body><table><tr><td>10:00</td><td>南</td><td>1.0</td>',
+    'no_table': '<html><body><p>メンテナンス中</p></body></html>',
+}
+
+
+def build_corpus(corpus_dir=None):
+    corpus = {}
+    for layout in ('datetime', 'time'):
+        for rows in (1, 48, 144):
+            page = generate_station_page(f'{layout}_{rows}', rows=rows, layout=layout)
+            corpus[f'{layout}_{rows}rows'] = page.decode('utf-8')
+    corpus.update(QUIRK_PAGES)
+    if corpus_dir:
+        # Saved station pages (e.g. curl output of the live site)
+        for name in sorted(os.listdir(corpus_dir)):
+            with open(os.path.join(corpus_dir, name), 'rb') as f:
+                raw = f.read()
+            for encoding in ('utf-8', 'shift_jis', 'euc-jp'):
+                try:
+                    corpus[name] = raw.decode(encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+    return corpus
+
+
+def parse(html, backend):
+    parser = HTMLTableParser(backend=backend)
+    parser.parse_html(html)
+    return parser.rows
+
+
+def check_parity(corpus):
+    failures = 0
+    for name, html in corpus.items():
+        expected, actual = parse(html, 'bs4'), parse(html, 'stream')
+        if expected != actual:
+            failures += 1
+            print(f"MISMATCH {name}\n  bs4:    {expected[:3]}\n  stream: {actual[:3]}")
+    print(f"Parity: {len(corpus) - failures}/{len(corpus)} pages identical")
+    return failures == 0
+
+
+def measure(html, backend, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(html, backend)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse(html, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[48, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--corpus', default=CORPUS_DIR,
+                        help='directory of saved station pages to add to the parity check (default: tests/pages)')
+    args = parser.parse_args()
+
+    ok = check_parity(build_corpus(args.corpus))
+
+    for rows in args.rows:
+        # Trailing markup after the table is what the streaming path gets to skip
+        html = generate_station_page('bench', rows=rows).decode('utf-8')
+        html = html.replace('</body>', '<div>' + '<p>footer</p>' * 200 + '</div></body>')
+        results = {backend: measure(html, backend, args.repeat) for backend in ('bs4', 'stream')}
+        for backend, (elapsed, peak) in results.items():
+            print(f"{rows:5d} rows  {backend:6s}  {elapsed * 1000:8.3f} ms/page  peak {peak / 1024:8.1f} KiB")
+        speedup = results['bs4'][0] / results['stream'][0]
+        print(f"{rows:5d} rows  speedup {speedup:.1f}x")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+parse_table_data row handling: per-row dicts vs Observation tuples
+Extracts the cell rows of a synthetic station page once, then checks that both
+implementations give the same records and compares rows/sec, allocations and the
+memory the parsed records keep alive. Also times ingesting them.
+Usage: python benchmarks/bench_parse_rows.py [--rows 100000] [--repeat 3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import HTMLTableParser, WeatherDatabase, WeatherScraper
+from stub_server import generate_station_page
+
+
+def legacy_parse_rows(scraper, rows, station_code):
+    """The former per-row loop of parse_table_data, kept for parity and comparison"""
+    data = []
+    header_found = False
+    for row in rows:
+        if not header_found:
+            row_text = ' '.join(row).lower()
+            if '時刻' in row_text or 'time' in row_text or '時' in row_text:
+                header_found = True
+            continue
+        if len(row) < 3:
+            continue
+        try:
+            if len(row) >= 4:
+                date_text = row[0].strip()
+                time_text = row[1].strip()
+                wind_dir_text = row[2].strip()
+                wind_speed_text = row[3].strip()
+                wave_height_text = row[-1].strip() if len(row) > 4 else ''
+            else:
+                time_text = row[0].strip()
+                wind_dir_text = row[1].strip()
+                wind_speed_text = row[2].strip()
+                wave_height_text = row[3].strip() if len(row) > 3 else ''
+                date_text = None
+            current_date = datetime.now()
+            if ':' in time_text:
+                try:
+                    time_parts = time_text.split(':')
+                    hours = int(time_parts[0])
+                    minutes = int(time_parts[1]) if len(time_parts) > 1 else 0
+                    timestamp = current_date.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+                    if date_text and '/' in date_text:
+                        try:
+                            date_parts = date_text.split('/')
+                            timestamp = timestamp.replace(year=int(date_parts[0]), month=int(date_parts[1]),
+                                                          day=int(date_parts[2]))
+                        except (ValueError, IndexError):
+                            pass
+                except ValueError:
+                    continue
+            else:
+                continue
+            wind_speed = None
+            if wind_speed_text and wind_speed_text != '-':
+                numeric_match = re.search(r'(\d+\.?\d*)', wind_speed_text)
+                if numeric_match:
+                    wind_speed = float(numeric_match.group(1))
+            wave_height = None
+            if wave_height_text and wave_height_text != '-':
+                numeric_match = re.search(r'(\d+\.?\d*)', wave_height_text)
+                if numeric_match:
+                    wave_height = float(numeric_match.group(1))
+            station_name = next((s['name'] for s in scraper.stations if s['code'] == station_code), station_code)
+            data.append({
+                'station_name': station_name,
+                'station_code': station_code,
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'wind_direction': wind_dir_text if wind_dir_text and wind_dir_text != '-' else None,
+                'wind_speed': wind_speed,
+                'wave_height': wave_height
+            })
+        except Exception as e:
+            print(f"Error parsing row for {station_code}: {e}")
+            continue
+    return data
+
+
+# Edge cases for the parity check: bad times, invalid dates, dashes, units, short rows
+EDGE_ROWS = [
+    ['日付', '時刻', '風向', '風速', '波高'],
+    ['2025/02/29', '10:00', '北', '5m/s', '1.5m'],
+    ['2025/13/01', '10:15', '-', '-', '-'],
+    ['2025/01/01', '24:00', '北', '1', '1'],
+    ['2025/01/01', '9:5', '南', '8.5m', ''],
+    ['', '10:30', '東', '3', '0.5'],
+    ['2025/1', '10:45', '西', 'calm', '0'],
+    ['10:50', '北東', '2.5'],
+    ['1050', '北東', '2.5'],
+    ['a', 'b'],
+    ['2025/01/01', '10:00:30', '北', ' 4.0 ', 'x 2.0'],
+]
+
+
+def measure(parse, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(rows)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    records = parse(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in retained)
+    size = sum(stat.size_diff for stat in retained)
+    return best, peak, blocks, size, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    scraper = WeatherScraper()
+    code = scraper.stations[-1]['code']  # Worst case for the old linear station lookup
+
+    identical = True
+    for layout in ('datetime', 'time'):
+        html = generate_station_page(code, rows=args.rows, layout=layout).decode('utf-8')
+        table = HTMLTableParser()
+        table.parse_html(html)
+        rows = table.rows
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = legacy_parse_rows(scraper, EDGE_ROWS + rows[1:200], code)
+            actual = scraper.parse_rows(EDGE_ROWS + rows[1:200], code)
+        same = [dict(d, created_at=None) for d in expected] == [record._asdict() for record in actual]
+        identical = identical and same
+        print(f"{layout:8s} parity on {len(actual)} rows incl. edge cases: {'identical' if same else 'MISMATCH'}")
+
+        results = {}
+        for label, parse in (('dict rows', lambda r: legacy_parse_rows(scraper, r, code)),
+                             ('Observation', lambda r: scraper.parse_rows(r, code))):
+            elapsed, peak, blocks, size, records = measure(parse, rows, args.repeat)
+            results[label] = records
+            print(f"  {label:12s} {len(records) / elapsed:10,.0f} rows/s  peak {peak / 2**20:6.1f} MiB  "
+                  f"retained {blocks:8,} blocks / {size / 2**20:6.1f} MiB")
+
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            timings = {}
+            for label, records in results.items():
+                db = WeatherDatabase(os.path.join(tmp, f'{label}.db'))
+                start = time.perf_counter()
+                db.ingest(records)
+                timings[label] = time.perf_counter() - start
+        print('  ingest      ' + '  '.join(f"{label} {seconds:.2f}s" for label, seconds in timings.items()))
+
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == '__main__':
+    main()
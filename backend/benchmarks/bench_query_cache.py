@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Query result cache for /api/weather/data and the incremental row count behind /api/weather/stats
+Replays History / Download page style requests against a synthetic database with the
+cache disabled and enabled, checks the cached bodies are byte-identical, then ingests
+new observations (what the scraper does every few minutes) and shows which entries
+survive: closed historical ranges stay cached, open-ended queries are rebuilt.
+Usage: python benchmarks/bench_query_cache.py [--rows 1000000] [--repeat 20]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase, get_query_cache
+from synthetic import build_database
+
+# Repeated page queries; the synthetic data ends at 2025-01-01 00:00
+QUERIES = [
+    ('download month', '/api/weather/data?start_date=2024-11-01&end_date=2024-11-30T23:59:59'),
+    ('download station', '/api/weather/data?start_date=2024-06-01&end_date=2024-12-01&station_code=station_2'),
+    ('history day res.', '/api/weather/data?start_date=2023-01-01&end_date=2024-01-01&resolution=day'),
+    ('recent limit=50', '/api/weather/data?start_date=2024-12-31T21:00:00&limit=50'),
+    ('page 1', '/api/weather/data?start_date=2024-01-01&end_date=2024-02-01&page_size=1000'),
+]
+
+
+def get(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.read()
+
+
+def timed_get(conn, path, repeat):
+    """Median seconds of `repeat` requests, and the last body"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = get(conn, path)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8027)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        print(f"Building {args.rows:,} rows...")
+        build_database(db_path, args.rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+
+        count_scan = min(timeit.repeat(
+            lambda: db.connection().execute('SELECT COUNT(*) FROM observations').fetchone(), number=5, repeat=3)) / 5
+        count_meta = min(timeit.repeat(db.get_data_count, number=1000, repeat=3)) / 1000
+        assert db.get_data_count() == db.connection().execute('SELECT COUNT(*) FROM observations').fetchone()[0]
+        print(f"/stats row count: COUNT(*) {count_scan * 1000:8.2f} ms  ->  row_count {count_meta * 1e6:6.1f} us")
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        cache = get_query_cache(db_path)
+        conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=120)
+        try:
+            uncached = {}
+            print(f"\n{'query':18s} {'uncached':>10s} {'cached':>10s}  body")
+            for label, path in QUERIES:
+                times = []
+                for _ in range(max(3, args.repeat // 4)):
+                    cache.clear()
+                    start = time.perf_counter()
+                    uncached[label] = get(conn, path)
+                    times.append(time.perf_counter() - start)
+                cold = sorted(times)[len(times) // 2]
+                warm, body = timed_get(conn, path, args.repeat)
+                same = 'identical' if body == uncached[label] else 'MISMATCH'
+                print(f"{label:18s} {cold * 1000:8.2f}ms {warm * 1000:8.2f}ms  {len(body):>10,} bytes {same}")
+            for _, path in QUERIES:
+                get(conn, path)
+            print(f"cache: {len(cache)} entries, {cache.size / 2**20:.1f} MiB")
+
+            # The scraper's next ingest: a new observation per station after the synthetic data's end
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.save_weather_data([{'station_name': f'観測地点{i}', 'station_code': f'station_{i}',
+                                       'timestamp': '2025-01-01 00:15:00', 'wind_direction': '北',
+                                       'wind_speed': 3.0, 'wave_height': None} for i in range(5)])
+            before = dict(cache.stats)
+            print("\nafter ingesting 2025-01-01 00:15 observations:")
+            for label, path in QUERIES:
+                body = get(conn, path)
+                result = next(name for name, value in cache.stats.items() if value != before[name])
+                before = dict(cache.stats)
+                print(f"  {label:18s} {result:12s} {len(body):>10,} bytes")
+
+            # A corrected historical value (e.g. import-csv) must invalidate the ranges containing it
+            with contextlib.redirect_stdout(io.StringIO()):
+                db.save_weather_data([{'station_name': '観測地点2', 'station_code': 'station_2',
+                                       'timestamp': '2024-11-15 12:00:00', 'wind_direction': '南',
+                                       'wind_speed': 99.0, 'wave_height': 9.9}])
+            print("after correcting a 2024-11-15 observation:")
+            for label, path in QUERIES[:2]:
+                body = get(conn, path)
+                result = next(name for name, value in cache.stats.items() if value != before[name])
+                before = dict(cache.stats)
+                print(f"  {label:18s} {result:12s} {'has the new value' if b'99.0' in body else 'OLD BODY'}")
+            lookups = sum(cache.stats[name] for name in ('hit', 'revalidated', 'stale', 'miss'))
+            hits = cache.stats['hit'] + cache.stats['revalidated']
+            print(f"hit rate {hits / lookups:.1%} over {lookups} lookups {cache.stats}")
+        finally:
+            conn.close()
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
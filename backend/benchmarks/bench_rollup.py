@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+1-year range query latency: raw weather_data rows vs. the hourly / daily rollups
+Times WeatherDatabase directly and /api/weather/data over HTTP (resolution=raw|hour|day|auto).
+Usage: python benchmarks/bench_rollup.py [--stations 5] [--requests 20] [--db PATH]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import HTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherAPIHandler, WeatherDatabase
+from synthetic import build_database
+
+START_DATE = '2024-01-01 00:00:00'
+END_DATE = '2025-01-01 00:00:00'
+
+
+def timed(func, count):
+    samples = []
+    result = None
+    for _ in range(count):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def http_get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    conn.request('GET', path)
+    body = conn.getresponse().read()
+    conn.close()
+    return len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--db', help='existing database to use (built with one year of 15-minute data if missing)')
+    args = parser.parse_args()
+
+    rows = 366 * 24 * 4 * args.stations
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'weather_data.db')
+        if not os.path.exists(db_path):
+            print(f"Building {rows:,} row database (1 year x {args.stations} stations) at {db_path}...")
+            start = time.perf_counter()
+            build_database(db_path, rows, args.stations)
+            print(f"  ingest incl. rollup maintenance: {time.perf_counter() - start:.1f}s")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(db_path)
+
+        print("Direct (WeatherDatabase)")
+        ms, records = timed(lambda: db.get_weather_data(START_DATE, END_DATE), args.requests)
+        print(f"  {'raw':6s} {len(records):9,} rows  p50 {ms:9.2f} ms")
+        for resolution in WeatherDatabase.ROLLUP_RESOLUTIONS:
+            ms, records = timed(lambda: db.get_rollup_data(resolution, START_DATE, END_DATE), args.requests)
+            print(f"  {resolution:6s} {len(records):9,} rows  p50 {ms:9.2f} ms")
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *a):
+                pass
+        Handler.db_path = db_path
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            print("HTTP /api/weather/data")
+            for resolution in ('raw', 'hour', 'day', 'auto'):
+                path = (f'/api/weather/data?start_date={START_DATE}&end_date={END_DATE}'
+                        f'&resolution={resolution}').replace(' ', '%20')
+                ms, size = timed(lambda: http_get(port, path), args.requests)
+                print(f"  {resolution:6s} {size / 1e6:9.2f} MB    p50 {ms:9.2f} ms")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Scrape cycle benchmark against a local stub station server
+Usage: python benchmarks/bench_scrape.py [--stations 5 100] [--latency 0.2]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherScraper
+from stub_server import StubStationServer
+
+
+def run_cycle(scraper, concurrent):
+    # scrape_station prints per station; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        data = scraper.scrape_all_stations(concurrent=concurrent)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, nargs='+', default=[5, 100])
+    parser.add_argument('--hosts', type=int, default=2, help='number of distinct stub hosts')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub response latency (s)')
+    parser.add_argument('--sequential-delay', type=float, default=2.0,
+                        help='sleep between stations in sequential mode (s)')
+    parser.add_argument('--no-sequential', action='store_true', help='skip the sequential baseline')
+    parser.add_argument('--per-host-concurrency', type=int, default=2)
+    parser.add_argument('--per-host-interval', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    with StubStationServer(latency=args.latency) as server:
+        for count in args.stations:
+            scraper = WeatherScraper(
+                max_workers=args.workers,
+                per_host_concurrency=args.per_host_concurrency,
+                per_host_interval=args.per_host_interval,
+                request_delay=args.sequential_delay
+            )
+            scraper.stations = server.make_stations(count, hosts=args.hosts)
+
+            if not args.no_sequential:
+                elapsed, records = run_cycle(scraper, concurrent=False)
+                print(f"{count:4d} stations  sequential  {elapsed:8.2f}s  ({records} records)")
+
+            elapsed, records = run_cycle(scraper, concurrent=True)
+            print(f"{count:4d} stations  concurrent  {elapsed:8.2f}s  ({records} records)")
+            scraper.close()
+
+
+if __name__ == '__main__':
+    main()
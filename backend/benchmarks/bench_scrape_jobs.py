@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Burst of concurrent POST /api/weather/scrape triggers: synchronous scrapes vs. single-flight jobs
+Before, every POST ran its own scrape inside the request. Now the triggers share one
+background job. Reports station page fetches, POST latency and jobs started per burst.
+Usage: python benchmarks/bench_scrape_jobs.py [--clients 20] [--stations 5] [--latency 0.2]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KeepAliveHTTPServer, ScrapeJobManager, WeatherAPIHandler, WeatherDatabase, WeatherScraper
+from stub_server import StubStationServer
+
+
+def burst(clients, send):
+    """Run send() from `clients` threads at once; returns the per-call latencies and results"""
+    latencies, results = [], []
+    barrier = threading.Barrier(clients)
+
+    def client():
+        barrier.wait()
+        start = time.perf_counter()
+        result = send()
+        latencies.append(time.perf_counter() - start)
+        results.append(result)
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), results
+
+
+def post_scrape(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/api/weather/scrape')
+    result = json.loads(conn.getresponse().read())
+    conn.close()
+    return result
+
+
+def wait_for_job(port, job_id):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while True:
+        conn.request('GET', f'/api/weather/scrape/{job_id}')
+        job = json.loads(conn.getresponse().read())
+        if job['status'] != 'running':
+            conn.close()
+            return job
+        time.sleep(0.05)
+
+
+def report(label, stub, latencies, jobs):
+    print(f"{label:16s} fetches {stub.request_count:5d}  jobs {jobs:3d}  "
+          f"POST p50 {latencies[len(latencies) // 2] * 1000:7.1f}ms  max {latencies[-1] * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub response latency (s)')
+    parser.add_argument('--port', type=int, default=8023)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubStationServer(latency=args.latency) as stub:
+        stations = stub.make_stations(args.stations, hosts=2)
+
+        def make_scraper():
+            scraper = WeatherScraper(per_host_interval=0)
+            scraper.stations = stations
+            return scraper
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Old handler: each POST scrapes and saves inside the request
+            db = WeatherDatabase(os.path.join(tmp, 'sync.db'))
+
+            def sync_scrape():
+                scraper = make_scraper()
+                saved = db.save_weather_data(scraper.scrape_all_stations())
+                scraper.close()
+                return saved
+            latencies, _ = burst(args.clients, sync_scrape)
+        report('synchronous', stub, latencies, args.clients)
+
+        db_path = os.path.join(tmp, 'jobs.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            WeatherDatabase(db_path)
+        manager = ScrapeJobManager(db_path, cooldown=60, scraper_factory=make_scraper)
+
+        class Handler(WeatherAPIHandler):
+            def scrape_jobs(self):
+                return manager
+
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=args.clients + 4)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                stub.request_count = 0
+                latencies, results = burst(args.clients, lambda: post_scrape(args.port))
+                job = wait_for_job(args.port, results[0]['job_id'])
+            report('single-flight', stub, latencies, len({result['job_id'] for result in results}))
+            print(f"  job {job['job_id']}: {job['message']} ({job['requests']} triggers)")
+            for station in job['stations']:
+                print(f"    {station['code']:20s} {station['status']:10s} {station['seconds']:6.3f}s  "
+                      f"{station['records']} records")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                stub.request_count = 0
+                latencies, results = burst(args.clients, lambda: post_scrape(args.port))
+            report('within cooldown', stub, latencies, len({result['job_id'] for result in results}))
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            manager.close()
+
+
+if __name__ == '__main__':
+    main()
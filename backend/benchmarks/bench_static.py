@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+/static/ serving: read-per-request handler vs. StaticFiles
+Builds a synthetic Vite dist (index.html, a hashed JS bundle larger than the
+in-memory limit so it goes through sendfile, a small CSS file) with .gz siblings,
+then runs keep-alive clients against the old handler code and the new one.
+Also covers gzip, 304 revalidation and path traversal attempts.
+Usage: python benchmarks/bench_static.py [--clients 16] [--duration 3] [--bundle-kb 600]
+"""
+
+import argparse
+import contextlib
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KeepAliveHTTPServer, WeatherAPIHandler
+from manage import compress_file
+
+
+class LegacyHandler(WeatherAPIHandler):
+    """The former static branch: exists() + read() of the whole file on every request"""
+
+    def send_static(self, relative_path):
+        static_path = relative_path or 'index.html'
+        file_path = os.path.join(self.static_root, static_path)
+        if not os.path.exists(file_path):
+            file_path = os.path.join(self.static_root, 'index.html')
+        content_type = {'.html': 'text/html', '.js': 'application/javascript',
+                        '.css': 'text/css'}.get(os.path.splitext(file_path)[1], 'application/octet-stream')
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Handler(WeatherAPIHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def build_dist(root, bundle_kb):
+    """Minified-looking JS/CSS so the compression ratio is realistic"""
+    rng = random.Random(1)
+    words = ['function', 'return', 'const', 'useState', 'props', 'station', 'wind_speed', 'wave_height',
+             'null', 'undefined', 'className', 'children', 'map', 'filter', 'length', 'data']
+
+    def text(size):
+        parts, length = [], 0
+        while length < size:
+            part = f"{rng.choice(words)}{rng.randrange(1000)}={rng.choice(words)}({rng.randrange(99)});"
+            parts.append(part)
+            length += len(part)
+        return ''.join(parts)
+    os.makedirs(os.path.join(root, 'assets'))
+    files = {
+        'index.html': '<!doctype html><html><head><script type="module" src="/static/assets/index-a1B2c3D4.js">'
+                      '</script></head><body><div id="root"></div>' + text(2000) + '</body></html>',
+        'assets/index-a1B2c3D4.js': text(bundle_kb * 1024),
+        'assets/index-e5F6g7H8.css': text(24 * 1024),
+    }
+    for name, content in files.items():
+        with open(os.path.join(root, name), 'w') as f:
+            f.write(content)
+        compress_file(os.path.join(root, name))
+    return files
+
+
+def request(conn, path, headers=None):
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def load(port, path, headers, clients, duration):
+    """Returns requests/s and body MB/s over keep-alive connections"""
+    counts, sizes = [], []
+    deadline = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        done = size = 0
+        while time.monotonic() < deadline:
+            _, body = request(conn, path, headers)
+            done += 1
+            size += len(body)
+        conn.close()
+        counts.append(done)
+        sizes.append(size)
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, sum(sizes) / elapsed / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--bundle-kb', type=int, default=600)
+    parser.add_argument('--port', type=int, default=8026)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'static')
+        build_dist(root, args.bundle_kb)
+        with open(os.path.join(tmp, 'secret.txt'), 'w') as f:
+            f.write('outside the static root')
+        bundle = '/static/assets/index-a1B2c3D4.js'
+
+        for handler in (LegacyHandler, Handler):
+            handler.static_root = root
+            handler.db_path = os.path.join(tmp, 'weather_data.db')
+            httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), handler, max_workers=args.clients)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+                response, body = request(conn, bundle)
+                etag = response.getheader('ETag')
+                gz_response, gz_body = request(conn, bundle, {'Accept-Encoding': 'gzip, br'})
+                print(f"{handler.__name__:14s} {bundle}: {len(body):,} bytes, "
+                      f"Cache-Control {response.getheader('Cache-Control')}, "
+                      f"gzip {len(gz_body):,} bytes ({gz_response.getheader('Content-Encoding')})")
+
+                cases = [('identity', bundle, {}),
+                         ('gzip', bundle, {'Accept-Encoding': 'gzip'}),
+                         ('index.html', '/static/', {})]
+                if etag:
+                    cases.append(('If-None-Match', bundle, {'If-None-Match': etag}))
+                for label, path, headers in cases:
+                    rate, throughput = load(args.port, path, headers, args.clients, args.duration)
+                    print(f"  {label:14s} {rate:10,.0f} req/s  {throughput:8,.1f} MB/s")
+
+                leaks = []
+                for path in ('/static/../secret.txt', '/static/%2e%2e/secret.txt', '/static/..%2fsecret.txt',
+                             '/static/assets/%2e%2e/%2e%2e/secret.txt', f'/static/{root}/../secret.txt'):
+                    with contextlib.suppress(http.client.HTTPException, OSError):
+                        _, body = request(conn, path)
+                        if b'outside the static root' in body:
+                            leaks.append(path)
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', args.port, timeout=30)
+                print(f"  traversal     {'LEAKED ' + ', '.join(leaks) if leaks else 'no file outside the root served'}")
+                conn.close()
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
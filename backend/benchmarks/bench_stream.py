@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+/api/weather/stream fan-out load test
+Holds N SSE subscribers open against a server with a small worker pool, then
+ingests new observations and measures the time until every subscriber has the
+event. Ingests run in the server process (direct wakeup) and in a separate
+process like the scraper daemon (picked up by data_version polling). Also
+checks Last-Event-ID replay.
+Usage: python benchmarks/bench_stream.py [--subscribers 500] [--rounds 5] [--workers 8]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from app import KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase, get_event_stream
+from synthetic import build_database
+
+EXTERNAL_WRITER = '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from app import WeatherDatabase
+db = WeatherDatabase(sys.argv[2])
+db.save_weather_data(json.loads(sys.argv[3]))
+print(time.time())
+'''
+
+
+def observation(minutes):
+    timestamp = datetime(2025, 1, 1) + timedelta(minutes=minutes)
+    return {'station_name': '観測地点0', 'station_code': 'station_0',
+            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'wind_direction': '北', 'wind_speed': minutes % 20, 'wave_height': None}
+
+
+def subscribe(port, last_event_id=None):
+    sock = socket.create_connection(('127.0.0.1', port))
+    request = 'GET /api/weather/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n'
+    if last_event_id is not None:
+        request += f'Last-Event-ID: {last_event_id}\r\n'
+    sock.sendall((request + '\r\n').encode('ascii'))
+    return sock
+
+
+class Subscribers:
+    """Raw SSE client sockets read from one selector; tracks the newest event id per socket"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        self.last_ids = {}
+        self.event_counts = {}  # event name -> events received (all sockets)
+
+    def add(self, sock):
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.buffers[sock] = b''
+        self.last_ids[sock] = None
+
+    def read_until(self, done, timeout=30):
+        """Read until done(self) is true; returns the time it became true"""
+        deadline = time.time() + timeout
+        while not done(self):
+            if time.time() > deadline:
+                raise TimeoutError('subscribers did not receive the event')
+            for key, _ in self.selector.select(timeout=0.5):
+                sock = key.fileobj
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionError('stream closed by server')
+                buffered = self.buffers[sock] + data
+                *events, self.buffers[sock] = buffered.split(b'\n\n')
+                for event in events:
+                    for line in event.split(b'\n'):
+                        if line.startswith(b'id: '):
+                            self.last_ids[sock] = int(line[4:])
+                        elif line.startswith(b'event: '):
+                            name = line[7:].decode()
+                            self.event_counts[name] = self.event_counts.get(name, 0) + 1
+        return time.time()
+
+    def all_at(self, version):
+        return lambda subs: all(v is not None and v >= version for v in subs.last_ids.values())
+
+    def close(self):
+        for sock in self.buffers:
+            sock.close()
+        self.selector.close()
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8024)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.subscribers * 2 + 256)), hard))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'weather_data.db')
+        build_database(db_path, 10000)
+
+        class Handler(WeatherAPIHandler):
+            def log_message(self, format, *args):
+                pass
+        Handler.db_path = db_path
+        httpd = KeepAliveHTTPServer(('127.0.0.1', args.port), Handler, max_workers=args.workers)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        db = WeatherDatabase(db_path)
+        broadcaster = get_event_stream(db_path)
+
+        subs = Subscribers()
+        start = time.time()
+        for _ in range(args.subscribers):
+            subs.add(subscribe(args.port))
+        version = db._read_data_version()
+        subs.read_until(subs.all_at(version))
+        print(f"{args.subscribers} subscribers connected in {time.time() - start:.2f}s "
+              f"({args.workers} HTTP workers, {threading.active_count()} threads in process)")
+
+        minute = 0
+        for label, external in (('in-process ingest', False), ('other process', True)):
+            latencies = []
+            for _ in range(args.rounds):
+                minute += 15
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if external:
+                        output = subprocess.run(
+                            [sys.executable, '-c', EXTERNAL_WRITER, os.path.dirname(BENCH_DIR), db_path,
+                             json.dumps([observation(minute)])],
+                            capture_output=True, text=True, check=True).stdout
+                        committed = float(output.split()[-1])
+                    else:
+                        committed = time.time()
+                        db.save_weather_data([observation(minute)])
+                version += 1
+                received = subs.read_until(subs.all_at(version))
+                latencies.append(received - committed)
+            latencies = [latency * 1000 for latency in latencies]
+            print(f"  {label:18s} all {args.subscribers} received: median {percentile(latencies, 0.5):7.1f}ms  "
+                  f"max {max(latencies):7.1f}ms  (poll interval {broadcaster.poll_interval * 1000:.0f}ms)")
+
+        # Reconnect from an older id: the missed events are replayed, not a full snapshot
+        resumed = Subscribers()
+        resumed.add(subscribe(args.port, last_event_id=version - 2))
+        resumed.read_until(resumed.all_at(version), timeout=5)
+        print(f"  Last-Event-ID {version - 2} -> events {resumed.event_counts}; broadcaster {broadcaster.stats}")
+        resumed.close()
+
+        subs.close()
+        httpd.shutdown()
+        httpd.server_close()
+        broadcaster.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+HTTP load test: concurrent keep-alive clients against a running API server
+Reports p50/p99 latency and requests/second.
+Usage: python benchmarks/loadtest.py [--url http://127.0.0.1:8001/api/weather/latest] [--clients 50] [--duration 10]
+"""
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def client_loop(url, deadline, latencies, errors, keepalive):
+    target = urlparse(url)
+    path = target.path + (f'?{target.query}' if target.query else '')
+    conn = None
+    while time.monotonic() < deadline:
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+            start = time.perf_counter()
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors.append(response.status)
+            if not keepalive or response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', action='append',
+                        help='URL to request (repeatable; clients are spread over the URLs)')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--no-keepalive', action='store_true', help='new connection per request')
+    args = parser.parse_args()
+    urls = args.url or ['http://127.0.0.1:8001/api/weather/latest']
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client_loop,
+                                args=(urls[i % len(urls)], deadline, latencies, errors, not args.no_keepalive))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print(f"No successful requests ({len(errors)} errors)")
+        return
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"{args.clients} clients, {elapsed:.1f}s: {len(latencies)} requests, {len(errors)} errors")
+    print(f"  requests/s  {len(latencies) / elapsed:10.1f}")
+    print(f"  p50         {statistics.median(latencies) * 1000:10.2f} ms")
+    print(f"  p99         {p99 * 1000:10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
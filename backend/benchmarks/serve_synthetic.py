@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Run the API server on a throwaway synthetic database (target for loadtest.py)
+Usage: python benchmarks/serve_synthetic.py [--rows 100000] [--port 8001] [--workers 32] [--db PATH] [--no-query-cache]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherAPIHandler, run_server
+from synthetic import build_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--db', help='reuse this database instead of a temporary one')
+    parser.add_argument('--no-query-cache', action='store_true', help='measure queries, not cached responses')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'weather_data.db')
+        if not args.db:
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_database(db_path, args.rows)
+        WeatherAPIHandler.db_path = db_path
+        WeatherAPIHandler.log_message = lambda self, format, *a: None
+        if args.no_query_cache:
+            WeatherAPIHandler.QUERY_CACHE_BYTES = 0
+        run_server(args.port, max_workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Scrape scheduling simulation: 5-minute cron runs vs. the resident ScrapeScheduler
+Runs both against the local stub server on a fake clock. Each station publishes
+observation T at T + its publish lag (plus occasional late publishes). Reports
+page fetches, rows saved and freshness (publish -> saved delay).
+Usage: python benchmarks/sim_scheduler.py [--hours 24] [--stations 5] [--seed 1]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import JST, ScrapeScheduler, StationFetchCache, WeatherDatabase, WeatherScraper
+from stub_server import StubStationServer, generate_station_page
+
+START = datetime(2025, 1, 1, 0, 7)  # JST, like the station pages
+CRON_PERIOD = 300
+
+
+def epoch(observation):
+    """Real epoch seconds of a JST wall-clock time, whatever the local time zone"""
+    return observation.replace(tzinfo=JST).timestamp()
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = epoch(start)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class PublishingStub(StubStationServer):
+    """Station pages whose newest row is the newest observation already published at the fake time"""
+
+    def __init__(self, clock, stations, seed, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.clock = clock
+        self.seed = seed
+        self.intervals = {}
+        self.base_lags = {}
+        rng = random.Random(seed)
+        for i, station in enumerate(stations):
+            self.intervals[station['code']] = station['update_interval']
+            self.base_lags[station['code']] = rng.uniform(60, 240)
+
+    def publish_lag(self, code, observation):
+        """Seconds after `observation` that it appears; one in ten is 2-8 minutes late"""
+        rng = random.Random(f'{self.seed}:{code}:{observation}')
+        late = rng.uniform(120, 480) if rng.random() < 0.1 else 0
+        return self.base_lags[code] + rng.uniform(-20, 20) + late
+
+    def newest_published(self, code):
+        interval = self.intervals[code]
+        now = datetime.fromtimestamp(self.clock.now, JST).replace(tzinfo=None)
+        observation = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % interval)
+        while epoch(observation) + self.publish_lag(code, observation) > self.clock.now:
+            observation -= timedelta(minutes=interval)
+        return observation
+
+    def page(self, code):
+        return generate_station_page(code, rows=self.rows, interval=self.intervals[code],
+                                     end_time=self.newest_published(code))
+
+
+def record_saves(db, clock, saved_at):
+    """Wrap save_weather_data to note the fake time each real observation is first stored"""
+    save = db.save_weather_data
+
+    def save_weather_data(data_list):
+        for data in data_list:
+            if data.wind_speed is not None:
+                saved_at.setdefault((data.station_code, data.timestamp), clock.now)
+        return save(data_list)
+    db.save_weather_data = save_weather_data
+
+
+def cron_runs(scraper, db, clock, end):
+    """What scraper_cron.py did every 5 minutes: scrape everything, save rows newer than the DB"""
+    while clock.now < end:
+        latest = {data['station_code']: data['timestamp'] for data in db.get_latest_data()}
+        new_data = [data for data in scraper.scrape_all_stations()
+                    if data.station_code not in latest or data.timestamp > latest[data.station_code]]
+        if new_data:
+            db.save_weather_data(new_data)
+        scraper.fetch_cache.commit()
+        clock.sleep(CRON_PERIOD)
+
+
+def scheduler_runs(scraper, db, clock, end):
+    scheduler = ScrapeScheduler(scraper, db, clock=clock.time, sleep=clock.sleep)
+    while clock.now < end:
+        scheduler.run_once()
+        clock.sleep(max(1, min(scheduler.next_wakeup() - clock.now, scheduler.max_sleep)))
+    return scheduler
+
+
+def simulate(mode, args, tmp):
+    clock = FakeClock(START)
+    end = clock.now + args.hours * 3600
+    saved_at = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        probe = StubStationServer()
+        stations = probe.make_stations(args.stations, hosts=1)
+        probe.httpd.server_close()
+    with PublishingStub(clock, stations, args.seed, rows=12) as stub:
+        for station in stations:
+            station['url'] = station['url'].replace(f':{probe.port}/', f':{stub.port}/')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(os.path.join(tmp, f'{mode}.db'))
+            scraper = WeatherScraper(per_host_interval=0,
+                                     fetch_cache=StationFetchCache(os.path.join(tmp, f'{mode}_cache.json')),
+                                     clock=clock.time)
+            scraper.stations = stations
+            record_saves(db, clock, saved_at)
+            if mode == 'cron':
+                cron_runs(scraper, db, clock, end)
+            else:
+                scheduler_runs(scraper, db, clock, end)
+            scraper.close()
+
+        delays = []
+        for (code, timestamp), saved in saved_at.items():
+            observation = datetime.fromisoformat(timestamp)
+            if observation < START:
+                continue  # Already on the first page fetched
+            delays.append(saved - epoch(observation) - stub.publish_lag(code, observation))
+        published = 0
+        for code, interval in stub.intervals.items():
+            observation = START.replace(minute=0)
+            while epoch(observation) + stub.publish_lag(code, observation) < end:
+                published += observation >= START
+                observation += timedelta(minutes=interval)
+        return stub.request_count, published, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('cron', 'scheduler'):
+            fetches, published, delays = simulate(mode, args, tmp)
+            delays.sort()
+            print(f"{mode:10s} fetches {fetches:6,}  observations {len(delays):5,}/{published:5,}  "
+                  f"delay mean {statistics.mean(delays):6.0f}s  p95 {delays[int(len(delays) * 0.95)]:6.0f}s  "
+                  f"max {delays[-1]:6.0f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Local stub of the kaiho.mlit.go.jp station pages for benchmarks
+Usage: python benchmarks/stub_server.py [--port 8090] [--stations 5] [--latency 0.2]
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WIND_DIRECTIONS = ['北', '北北東', '北東', '東北東', '東', '東南東', '南東', '南南東',
+                   '南', '南南西', '南西', '西南西', '西', '西北西', '北西', '北北西']
+
+
+def generate_station_page(station_code, rows=48, interval=15, end_time=None, with_wave_height=True,
+                          layout='datetime', encoding='utf-8'):
+    """Build a station page; layout is 'datetime' (date and time columns) or 'time' (time only),
+    encoding 'utf-8' or 'shift_jis' (as some of the real pages are served)"""
+    end_time = end_time or datetime.now().replace(second=0, microsecond=0)
+    end_time -= timedelta(minutes=end_time.minute % interval)
+    seed = sum(ord(c) for c in station_code)
+
+    # The time-only layout has no room for a wave height column (4 cells parse as date+time)
+    with_wave_height = with_wave_height and layout == 'datetime'
+    header = '<tr><th>日付</th><th>時刻</th>' if layout == 'datetime' else '<tr><th>時刻</th>'
+    header += '<th>風向</th><th>風速(m/s)</th>'
+    header += '<th>波高(m)</th></tr>' if with_wave_height else '</tr>'
+    lines = [header]
+    for i in range(rows):
+        ts = end_time - timedelta(minutes=interval * i)
+        cells = [ts.strftime('%Y/%m/%d')] if layout == 'datetime' else []
+        cells += [
+            ts.strftime('%H:%M'),
+            WIND_DIRECTIONS[(seed + i) % 16],
+            f'{(seed * 7 + i * 3) % 150 / 10:.1f}',
+        ]
+        if with_wave_height:
+            cells.append(f'{(seed + i) % 40 / 10:.1f}')
+        lines.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+
+    return (
+        f'<html><head><meta charset="{encoding}"><title>気象現況</title></head><body>'
+        f'<h1>{station_code}</h1><table border="1">' + '\n'.join(lines) + '</table>'
+        '</body></html>'
+    ).encode(encoding)
+
+
+class StubStationServer:
+    """Serves generated station pages on 127.0.0.x with an artificial response latency
+
+    Stations from make_stations cycle through `layouts` and `encodings`, so a
+    mixed list covers every page variant the scraper handles.
+    """
+
+    def __init__(self, latency=0.2, rows=48, port=0, layouts=('datetime',), encodings=('utf-8',)):
+        self.latency = latency
+        self.rows = rows
+        self.layouts = layouts
+        self.encodings = encodings
+        self.pages = {}
+        self.page_options = {}  # code -> generate_station_page keyword arguments
+        self.request_count = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                code = self.path.strip('/').split('/')[-1].replace('.html', '')
+                body = stub.page(code)
+                etag = f'"{hash(body) & 0xffffffff:08x}"'
+                time.sleep(stub.latency)
+                stub.request_count += 1
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        # Bind all loopback addresses so 127.0.0.1, 127.0.0.2, ... act as separate hosts
+        self.httpd = ThreadingHTTPServer(('', port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    def page(self, code):
+        if code not in self.pages:
+            self.pages[code] = generate_station_page(code, rows=self.rows, **self.page_options.get(code, {}))
+        return self.pages[code]
+
+    def make_stations(self, count, hosts=2):
+        """Synthetic station list in the WeatherScraper.stations format, spread over `hosts` hosts"""
+        stations = []
+        for i in range(count):
+            code = 'iragomisaki_vtss' if i == 0 else f'station_{i:03d}'
+            host = f'127.0.0.{i % hosts + 1}'
+            layout = self.layouts[i % len(self.layouts)]
+            self.page_options[code] = {'layout': layout, 'encoding': self.encodings[i % len(self.encodings)]}
+            self.pages.pop(code, None)
+            stations.append({
+                'name': code,
+                'code': code,
+                'url': f'http://{host}:{self.port}/kisyou/{code}.html',
+                'has_wave_height': layout == 'datetime',
+                'update_interval': 15 if i % 2 == 0 else 30
+            })
+        return stations
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic station pages until interrupted')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--hosts', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.2, help='response latency (s)')
+    parser.add_argument('--rows', type=int, default=48, help='table rows per page')
+    parser.add_argument('--layouts', nargs='+', default=['datetime', 'time'], choices=['datetime', 'time'])
+    parser.add_argument('--encodings', nargs='+', default=['utf-8', 'shift_jis'])
+    args = parser.parse_args()
+
+    with StubStationServer(args.latency, args.rows, args.port, args.layouts, args.encodings) as server:
+        # Paste into WeatherScraper.stations (or scraper.stations = ...) to scrape the stub
+        print(json.dumps(server.make_stations(args.stations, args.hosts), ensure_ascii=False, indent=2))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
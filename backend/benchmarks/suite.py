@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: fixed scenarios on synthetic data, JSON results, comparison across commits
+Scenarios:
+  scrape  scrape cycle against the stub station server (UTF-8 / Shift_JIS, date+time / time-only pages)
+  ingest  WeatherDatabase.ingest of new rows and of an unchanged re-delivery
+  latest  /api/weather/latest under concurrent keep-alive clients
+  range   range queries, directly and over /api/weather/data (response cache off)
+  export  /api/weather/export CSV / NDJSON throughput
+Every scenario runs --repeat times and the median of each metric is kept. HTTP
+scenarios run the server in a separate process (serve_synthetic.py).
+Usage:
+  python benchmarks/suite.py run [--rows 1000000] [--scenarios scrape ingest ...] [--output FILE]
+  python benchmarks/suite.py compare BASELINE.json CURRENT.json [--threshold 0.15]
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+from app import WeatherDatabase, WeatherScraper
+from bench_data_memory import wait_for_server
+from bench_export import export
+from loadtest import client_loop
+from stub_server import StubStationServer
+from synthetic import build_database, build_database_bulk, synthetic_records
+
+# metric -> (unit, 'lower' / 'higher' is better)
+METRICS = {
+    'scrape.cycle_s': ('s', 'lower'),
+    'scrape.parse_us_per_page': ('us', 'lower'),
+    'ingest.new_rows_per_s': ('rows/s', 'higher'),
+    'ingest.unchanged_rows_per_s': ('rows/s', 'higher'),
+    'latest.requests_per_s': ('req/s', 'higher'),
+    'latest.p50_ms': ('ms', 'lower'),
+    'latest.p99_ms': ('ms', 'lower'),
+    'range.db_1day_ms': ('ms', 'lower'),
+    'range.db_7days_ms': ('ms', 'lower'),
+    'range.db_1year_station_ms': ('ms', 'lower'),
+    'range.http_7days_ms': ('ms', 'lower'),
+    'range.http_1year_day_ms': ('ms', 'lower'),
+    'export.csv_mb_per_s': ('MB/s', 'higher'),
+    'export.ndjson_mb_per_s': ('MB/s', 'higher'),
+}
+# The synthetic data ends at 2025-01-01 00:00
+RANGES = {
+    '1day': ('2024-12-31T00:00:00', '2024-12-31T23:59:59', None),
+    '7days': ('2024-12-25T00:00:00', '2024-12-31T23:59:59', None),
+    '1year_station': ('2024-01-01T00:00:00', '2024-12-31T23:59:59', 'station_1'),
+}
+
+
+def scenario_scrape(context):
+    with StubStationServer(latency=context.latency, layouts=('datetime', 'time'),
+                           encodings=('utf-8', 'shift_jis')) as stub:
+        scraper = WeatherScraper(max_workers=8, per_host_concurrency=2, per_host_interval=0)
+        scraper.stations = stub.make_stations(context.stations, hosts=4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            records = scraper.scrape_all_stations()
+            cycle = time.perf_counter() - start
+        scraper.close()
+        assert records, 'scrape returned no records'
+
+        pages = [(station, stub.page(station['code']).decode(stub.page_options[station['code']]['encoding']))
+                 for station in scraper.stations]
+        start = time.perf_counter()
+        for station, html in pages:
+            scraper.parse_table_data(html, station['code'], station['has_wave_height'])
+        parse = (time.perf_counter() - start) / len(pages)
+    return {'scrape.cycle_s': cycle, 'scrape.parse_us_per_page': parse * 1e6}
+
+
+def scenario_ingest(context):
+    rows = min(context.rows, 200000)
+    records = list(synthetic_records(rows))
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = WeatherDatabase(os.path.join(tmp, 'weather_data.db'))
+        result = {}
+        for metric in ('ingest.new_rows_per_s', 'ingest.unchanged_rows_per_s'):
+            start = time.perf_counter()
+            for offset in range(0, rows, 10000):
+                db.ingest(records[offset:offset + 10000])
+            result[metric] = rows / (time.perf_counter() - start)
+    return result
+
+
+def scenario_latest(context):
+    latencies, errors = [], []
+    deadline = time.monotonic() + context.duration
+    threads = [threading.Thread(target=client_loop, args=(
+        f'http://127.0.0.1:{context.port}/api/weather/latest', deadline, latencies, errors, True))
+        for _ in range(context.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert latencies and not errors, f'{len(errors)} errors: {errors[:3]}'
+    latencies.sort()
+    return {'latest.requests_per_s': len(latencies) / elapsed,
+            'latest.p50_ms': statistics.median(latencies) * 1000,
+            'latest.p99_ms': latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000}
+
+
+def median_ms(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def http_get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    assert response.status == 200, f'{path}: HTTP {response.status}'
+    return body
+
+
+def scenario_range(context):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = WeatherDatabase(context.db_path)
+    result = {f'range.db_{name}_ms': median_ms(lambda: db.get_weather_data(start, end, code))
+              for name, (start, end, code) in RANGES.items()}
+    start, end, _ = RANGES['7days']
+    result['range.http_7days_ms'] = median_ms(
+        lambda: http_get(context.port, f'/api/weather/data?start_date={start}&end_date={end}'))
+    start, end, _ = RANGES['1year_station']
+    result['range.http_1year_day_ms'] = median_ms(
+        lambda: http_get(context.port, f'/api/weather/data?start_date={start}&end_date={end}&resolution=day'))
+    return result
+
+
+def scenario_export(context):
+    result = {}
+    for export_format in ('csv', 'ndjson'):
+        raw, _, elapsed = export(context.port, export_format, False)
+        result[f'export.{export_format}_mb_per_s'] = raw / 1e6 / elapsed
+    return result
+
+
+SCENARIOS = {
+    'scrape': (scenario_scrape, False),  # (function, needs the database / server)
+    'ingest': (scenario_ingest, False),
+    'latest': (scenario_latest, True),
+    'range': (scenario_range, True),
+    'export': (scenario_export, True),
+}
+
+
+def git_revision():
+    """(short commit, dirty) of the working tree, (None, None) outside a git checkout"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCH_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip() != ''
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+@contextlib.contextmanager
+def api_server(db_path, port):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_synthetic.py'), '--db', db_path, '--port', str(port),
+         '--no-query-cache'], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(args):
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': f'{platform.machine()} {os.cpu_count()} CPUs',
+        'params': {name: getattr(args, name) for name in
+                   ('rows', 'repeat', 'stations', 'latency', 'clients', 'duration', 'scenarios')},
+        'results': {},
+    }
+    samples = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        args.db_path = args.db or os.path.join(tmp, 'weather_data.db')
+        if any(SCENARIOS[name][1] for name in args.scenarios) and not os.path.exists(args.db_path):
+            print(f"Building {args.rows:,} rows...")
+            start = time.perf_counter()
+            build = build_database_bulk if args.rows > 5000000 else build_database
+            build(args.db_path, args.rows)
+            print(f"  {time.perf_counter() - start:.1f}s")
+        with contextlib.ExitStack() as stack:
+            if any(SCENARIOS[name][1] for name in args.scenarios):
+                stack.enter_context(api_server(args.db_path, args.port))
+            for name in args.scenarios:
+                scenario = SCENARIOS[name][0]
+                for _ in range(args.repeat):
+                    for metric, value in scenario(args).items():
+                        samples.setdefault(metric, []).append(value)
+                print(f"{name:8s} " + '  '.join(
+                    f"{metric.split('.', 1)[1]} {statistics.median(values):,.2f}"
+                    for metric, values in samples.items() if metric.startswith(f'{name}.')))
+
+    for metric, values in samples.items():
+        unit, better = METRICS[metric]
+        report['results'][metric] = {'value': statistics.median(values), 'unit': unit, 'better': better,
+                                     'samples': values}
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{commit or 'unknown'}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+def compare(args):
+    """Print the change of every metric; exit status 1 when one got worse by more than the threshold"""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if {k: v for k, v in baseline['params'].items() if k != 'scenarios'} != \
+            {k: v for k, v in current['params'].items() if k != 'scenarios'}:
+        print(f"warning: different parameters\n  {baseline['params']}\n  {current['params']}")
+    print(f"{'metric':30s} {baseline['commit'] or '?':>12s} {current['commit'] or '?':>12s}  change")
+    regressions = []
+    for metric, result in current['results'].items():
+        if metric not in baseline['results']:
+            continue
+        old, new = baseline['results'][metric]['value'], result['value']
+        change = (new - old) / old if old else 0.0
+        worse = change > args.threshold if result['better'] == 'lower' else change < -args.threshold
+        better = change < -args.threshold if result['better'] == 'lower' else change > args.threshold
+        flag = 'REGRESSION' if worse else 'improved' if better else ''
+        if worse:
+            regressions.append(metric)
+        print(f"{metric:30s} {old:12,.2f} {new:12,.2f}  {change:+7.1%} {result['unit']:7s} {flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('run', help='run scenarios and write a JSON result file')
+    command.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    command.add_argument('--rows', type=int, default=1000000, help='synthetic database size (1M-100M)')
+    command.add_argument('--db', help='reuse this database (built with --rows if missing)')
+    command.add_argument('--repeat', type=int, default=3)
+    command.add_argument('--stations', type=int, default=20, help='stub stations for the scrape scenario')
+    command.add_argument('--latency', type=float, default=0.05, help='stub response latency (s)')
+    command.add_argument('--clients', type=int, default=8, help='concurrent clients for /latest')
+    command.add_argument('--duration', type=float, default=3.0, help='seconds per /latest run')
+    command.add_argument('--port', type=int, default=8031)
+    command.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    command.set_defaults(func=run)
+
+    command = commands.add_parser('compare', help='compare two result files')
+    command.add_argument('baseline')
+    command.add_argument('current')
+    command.add_argument('--threshold', type=float, default=0.15, help='relative change counted as a regression')
+    command.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Synthetic weather_data databases for benchmarks
+Usage: python benchmarks/synthetic.py PATH [--rows 1000000] [--stations 5] [--legacy | --bulk]
+"""
+
+import argparse
+import calendar
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WeatherDatabase
+
+# The original text-keyed layout, as created before the station / epoch migration
+LEGACY_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS weather_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_name TEXT NOT NULL,
+        station_code TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        wind_direction TEXT,
+        wind_speed REAL,
+        wave_height REAL,
+        created_at TEXT NOT NULL,
+        UNIQUE(station_code, timestamp)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_station_timestamp ON weather_data(station_code, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_timestamp_station ON weather_data(timestamp, station_code)',
+)
+
+WIND_DIRECTIONS = ['北', '北北東', '北東', '東北東', '東', '東南東', '南東', '南南東',
+                   '南', '南南西', '南西', '西南西', '西', '西北西', '北西', '北北西']
+
+
+def synthetic_records(rows, stations=5, end=datetime(2025, 1, 1), interval=15):
+    """Yield `rows` records walking back from `end`, one per station every `interval` minutes"""
+    created_at = end.isoformat()
+    for i in range(rows):
+        ts = end - timedelta(minutes=interval * (i // stations))
+        station = i % stations
+        yield {
+            'station_name': f'観測地点{station}',
+            'station_code': f'station_{station}',
+            'timestamp': ts.strftime('%Y-%m-%d %H:%M:%S'),
+            'wind_direction': WIND_DIRECTIONS[(i * 7) % 16],
+            'wind_speed': (i * 37 % 200) / 10,
+            'wave_height': (i * 13 % 50) / 10 if station % 2 else None,
+            'created_at': created_at
+        }
+
+
+def build_database(path, rows, stations=5, batch_size=100000, verbose=False):
+    """Fill a database through WeatherDatabase.ingest in large batches"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = WeatherDatabase(path)
+    start = time.perf_counter()
+    batch = []
+    for count, record in enumerate(synthetic_records(rows, stations), start=1):
+        batch.append(record)
+        if len(batch) == batch_size:
+            db.ingest(batch)
+            batch = []
+            if verbose:
+                print(f"  {count:,} rows ({count / (time.perf_counter() - start):,.0f} rows/s)")
+    if batch:
+        db.ingest(batch)
+    return db
+
+
+def build_database_bulk(path, rows, stations=5, end=datetime(2025, 1, 1), interval=15, batch_size=500000,
+                        verbose=False):
+    """The rows of build_database written straight into observations, for 10M-100M row databases.
+
+    Skips ingest's change detection and per-batch rollup refresh: each station's
+    range is appended in key order, then row_count / change_seq are set and the
+    rollups rebuilt once. Only for a new database.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = WeatherDatabase(path)
+    conn = db.connection()
+    with conn:
+        conn.executemany('INSERT INTO stations (station_code, station_name) VALUES (?, ?)',
+                         [(f'station_{station}', f'観測地点{station}') for station in range(stations)])
+    station_ids = dict(conn.execute('SELECT station_code, station_id FROM stations'))
+    end_ts = calendar.timegm(end.timetuple())
+    created_at = end_ts * 1000000
+    start = time.perf_counter()
+    written = 0
+    for station in range(stations):
+        station_id = station_ids[f'station_{station}']
+        steps = (rows - station + stations - 1) // stations  # i = station + k * stations for k < steps
+        for first in range(steps - 1, -1, -batch_size):
+            batch = []
+            for k in range(first, max(first - batch_size, -1), -1):  # Oldest first: appends to the b-tree
+                i = station + k * stations
+                batch.append((station_id, end_ts - interval * 60 * k, WIND_DIRECTIONS[(i * 7) % 16],
+                              (i * 37 % 200) / 10, (i * 13 % 50) / 10 if station % 2 else None, created_at, i + 1))
+            with conn:
+                conn.executemany('''
+                    INSERT INTO observations
+                    (station_id, ts, wind_direction, wind_speed, wave_height, created_at, seq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', batch)
+            written += len(batch)
+            if verbose:
+                print(f"  {written:,} rows ({written / (time.perf_counter() - start):,.0f} rows/s)")
+    with conn:
+        conn.execute("UPDATE db_meta SET value = ? WHERE key = 'row_count'", (written,))
+        conn.execute("UPDATE db_meta SET value = ? WHERE key = 'change_seq'", (rows,))
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.rebuild_rollups()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return db
+
+
+def build_legacy_database(path, rows, stations=5, batch_size=100000):
+    """Fill a database in the original weather_data layout (input for manage.py migrate-schema)"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    records = synthetic_records(rows, stations)
+    while True:
+        batch = [tuple(record[key] for key in WeatherDatabase.COLUMNS[1:])
+                 for _, record in zip(range(batch_size), records)]
+        if not batch:
+            break
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO weather_data
+                (station_name, station_code, timestamp, wind_direction, wind_speed, wave_height, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--stations', type=int, default=5)
+    parser.add_argument('--legacy', action='store_true', help='use the pre-migration weather_data layout')
+    parser.add_argument('--bulk', action='store_true', help='write observations directly (10M+ rows)')
+    args = parser.parse_args()
+    if args.legacy:
+        build_legacy_database(args.path, args.rows, args.stations)
+    elif args.bulk:
+        build_database_bulk(args.path, args.rows, args.stations, verbose=True)
+    else:
+        build_database(args.path, args.rows, args.stations, verbose=True)
+    print(f"{args.path}: {os.path.getsize(args.path) / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Database maintenance commands
+Usage:
+  python manage.py import-csv FILE [FILE ...] [--db PATH] [--batch-size N]
+  python manage.py rebuild-rollups [--db PATH]
+  python manage.py migrate-schema [--db PATH] [--no-vacuum]
+  python manage.py compress-static [DIR] [--min-size BYTES]
+  python manage.py archive [--db PATH] [--older-than-days N] [--retain-months N] [--vacuum]
+"""
+
+import argparse
+import calendar
+import csv
+import gzip
+import re
+import sqlite3
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import DB_PATH, JST, WeatherDatabase, WeatherAPIHandler
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip siblings are written without it
+    brotli = None
+
+# CSV列名 -> レコードのキー（画面からのCSV出力形式とAPIのJSON形式の両方に対応）
+CSV_COLUMNS = {
+    '観測地点': 'station_name',
+    '地点コード': 'station_code',
+    '日時': 'timestamp',
+    '風向': 'wind_direction',
+    '風速(m/s)': 'wind_speed',
+    '波高(m)': 'wave_height',
+    '登録日時': 'created_at',
+}
+# 2024/01/15 14:00, 2024-01-15 14:00:00, 2024-01-15T14:00:00 ... (strptime is too slow for millions of rows)
+TIMESTAMP_RE = re.compile(r'(\d{4})[-/](\d{1,2})[-/](\d{1,2})[ T](\d{1,2}):(\d{2})(?::(\d{2}))?$')
+
+
+def normalize_timestamp(text):
+    """Return the database timestamp format ('%Y-%m-%d %H:%M:%S') for a CSV date/time cell"""
+    match = TIMESTAMP_RE.match(text.strip())
+    if not match:
+        return datetime.fromisoformat(text.strip()).strftime('%Y-%m-%d %H:%M:%S')
+    year, month, day, hour, minute, second = match.groups()
+    return f"{year}-{month:0>2}-{day:0>2} {hour:0>2}:{minute}:{second or '00'}"
+
+
+def normalize_created_at(text):
+    """created_at is stored as datetime.isoformat(); keep sub-second precision when present"""
+    if TIMESTAMP_RE.match(text):
+        return normalize_timestamp(text).replace(' ', 'T')
+    return datetime.fromisoformat(text).isoformat()
+
+
+def parse_number(text):
+    text = (text or '').strip()
+    return float(text) if text and text != '-' else None
+
+
+def read_csv_records(path):
+    """Yield ingest records from a CSV export; rows that cannot be parsed are reported and skipped"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        for line_number, row in enumerate(reader, start=2):
+            row = {CSV_COLUMNS.get(key.strip(), key.strip()): value for key, value in row.items() if key}
+            try:
+                created_at = (row.get('created_at') or '').strip()
+                yield {
+                    'station_name': row['station_name'].strip(),
+                    'station_code': row['station_code'].strip(),
+                    'timestamp': normalize_timestamp(row['timestamp']),
+                    'wind_direction': (row.get('wind_direction') or '').strip() or None,
+                    'wind_speed': parse_number(row.get('wind_speed')),
+                    'wave_height': parse_number(row.get('wave_height')),
+                    'created_at': normalize_created_at(created_at) if created_at else None
+                }
+            except (KeyError, ValueError, AttributeError) as e:
+                print(f"{path}:{line_number}: skipping row ({e})")
+
+
+def import_csv(args):
+    db = WeatherDatabase(args.db)
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    row_count = 0
+    start = time.perf_counter()
+
+    def flush(batch):
+        stats = db.ingest(batch)
+        for key in totals:
+            totals[key] += stats[key]
+
+    for path in args.files:
+        batch = []
+        for record in read_csv_records(path):
+            batch.append(record)
+            if len(batch) >= args.batch_size:
+                flush(batch)
+                row_count += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - start
+                print(f"  {row_count:,} rows  {row_count / elapsed:,.0f} rows/s")
+        if batch:
+            flush(batch)
+            row_count += len(batch)
+
+    elapsed = time.perf_counter() - start
+    print(f"Imported {row_count:,} rows in {elapsed:.1f}s ({row_count / max(elapsed, 1e-9):,.0f} rows/s): "
+          f"{totals['inserted']:,} inserted, {totals['updated']:,} updated, {totals['unchanged']:,} unchanged, "
+          f"{totals['skipped']:,} skipped")
+
+
+def rebuild_rollups(args):
+    db = WeatherDatabase(args.db)
+    start = time.perf_counter()
+    db.rebuild_rollups()
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+def database_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(func())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count, best
+
+
+def legacy_range_query(conn, start_date, end_date, station_code=None):
+    """What get_weather_data ran against the original weather_data table"""
+    query = 'SELECT * FROM weather_data WHERE timestamp >= ? AND timestamp <= ?'
+    params = [start_date, end_date]
+    if station_code:
+        query += ' AND station_code = ?'
+        params.append(station_code)
+    query += ' ORDER BY timestamp DESC, station_code DESC'
+    return [dict(zip(WeatherDatabase.COLUMNS, row)) for row in conn.execute(query, params)]
+
+
+def migrate_schema(args):
+    conn = sqlite3.connect(args.db)
+    if not WeatherDatabase.has_legacy_schema(conn.cursor()):
+        conn.close()
+        print(f"{args.db} already uses the station / epoch layout")
+        return
+
+    # Range queries ending at the newest row: last week, last year, last year for one station
+    latest, station_code = conn.execute(
+        'SELECT timestamp, station_code FROM weather_data ORDER BY timestamp DESC LIMIT 1').fetchone()
+    end = datetime.fromisoformat(latest)
+    queries = [
+        ('7 days, all stations', (end - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S'), latest, None),
+        ('365 days, all stations', (end - timedelta(days=365)).strftime('%Y-%m-%d %H:%M:%S'), latest, None),
+        (f'365 days, {station_code}', (end - timedelta(days=365)).strftime('%Y-%m-%d %H:%M:%S'), latest, station_code),
+    ]
+    size_before = database_size(args.db)
+    before = [best_time(lambda: legacy_range_query(conn, start, stop, code)) for _, start, stop, code in queries]
+    conn.close()
+
+    start = time.perf_counter()
+    db = WeatherDatabase(args.db)  # Migrates on first open
+    print(f"Migration took {time.perf_counter() - start:.1f}s")
+    conn = db.connection()
+    if args.vacuum:
+        print("Compacting (VACUUM)...")
+        conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size_after = database_size(args.db)
+    after = [best_time(lambda: db.get_weather_data(start, stop, code)) for _, start, stop, code in queries]
+
+    print(f"Database size: {size_before / 1024 / 1024:,.1f} MiB -> {size_after / 1024 / 1024:,.1f} MiB")
+    for (label, *_), (rows, old), (_, new) in zip(queries, before, after):
+        print(f"  {label:28s} {rows:>10,} rows  {old * 1000:9.1f} ms -> {new * 1000:9.1f} ms")
+
+
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.webmanifest')
+
+
+def compress_file(path, min_size=1024):
+    """Write path.gz (and path.br with the brotli module) next to a text asset; returns the sizes written"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return {}
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    stat = os.stat(path)
+    written = {}
+    for suffix, compressed in variants.items():
+        if len(compressed) >= len(data):
+            continue  # Not worth a sibling
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        # Same mtime as the original: the server ignores siblings older than their source
+        os.utime(path + suffix, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        written[suffix] = len(compressed)
+    return written
+
+
+def compress_static(args):
+    total = compressed = 0
+    for directory, _, files in os.walk(args.dir):
+        for name in sorted(files):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            written = compress_file(path, args.min_size)
+            if written:
+                size = os.path.getsize(path)
+                total += size
+                compressed += min(written.values())
+                sizes = '  '.join(f"{suffix} {length:,}" for suffix, length in written.items())
+                print(f"  {os.path.relpath(path, args.dir):40s} {size:>10,}  {sizes}")
+    if brotli is None:
+        print("brotli module not installed: wrote .gz only")
+    print(f"{total:,} bytes -> {compressed:,} bytes for clients that accept compression")
+
+
+def archive(args):
+    db = WeatherDatabase(args.db)
+    conn = db.connection()
+    today = datetime.now(JST)
+    now = calendar.timegm(today.timetuple())  # Same JST wall-clock scale as observation ts
+    size_before = database_size(args.db)
+    start = time.perf_counter()
+    totals = db.archive_observations(now - args.older_than_days * 86400)
+    print(f"Archived {totals['rows']:,} rows into {totals['segments']:,} segments "
+          f"({totals['bytes'] / 1024 / 1024:,.1f} MiB) in {time.perf_counter() - start:.1f}s")
+    if args.retain_months:
+        year, month = today.year, today.month - args.retain_months
+        dropped = db.drop_archived_months(calendar.timegm((year + (month - 1) // 12, (month - 1) % 12 + 1, 1, 0, 0, 0)))
+        print(f"Dropped {dropped['rows']:,} rows in {dropped['segments']:,} segments older than {args.retain_months} months")
+    if args.vacuum:
+        print("Compacting (VACUUM)...")
+        conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    stats = db.get_archive_stats()
+    print(f"Database size: {size_before / 1024 / 1024:,.1f} MiB -> {database_size(args.db) / 1024 / 1024:,.1f} MiB, "
+          f"archive: {stats['rows']:,} rows in {stats['segments']:,} segments, {stats['bytes'] / 1024 / 1024:,.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather database maintenance')
+    parser.add_argument('--db', default=DB_PATH, help=f'database path (default: {DB_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import-csv', help='bulk-load historical CSV exports')
+    command.add_argument('files', nargs='+')
+    command.add_argument('--batch-size', type=int, default=50000)
+    command.set_defaults(func=import_csv)
+
+    command = commands.add_parser('rebuild-rollups', help='recompute the hourly / daily rollup tables')
+    command.set_defaults(func=rebuild_rollups)
+
+    command = commands.add_parser('migrate-schema',
+                                  help='move weather_data to the station / epoch layout while the service runs')
+    command.add_argument('--no-vacuum', dest='vacuum', action='store_false',
+                         help='skip compacting the file afterwards')
+    command.set_defaults(func=migrate_schema)
+
+    command = commands.add_parser('compress-static',
+                                  help='write .gz / .br siblings of the frontend build for the static file server')
+    command.add_argument('dir', nargs='?', default=WeatherAPIHandler.static_root)
+    command.add_argument('--min-size', type=int, default=1024, help='skip smaller files (bytes)')
+    command.set_defaults(func=compress_static)
+
+    command = commands.add_parser('archive',
+                                  help='move old observations into compressed monthly segment files')
+    command.add_argument('--older-than-days', type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', 365)),
+                         help='archive months that ended more than N days ago (default: $ARCHIVE_AFTER_DAYS or 365)')
+    command.add_argument('--retain-months', type=int, default=int(os.environ.get('RETAIN_MONTHS', 0)),
+                         help='delete archived months older than N months (default: $RETAIN_MONTHS, 0 = keep all)')
+    command.add_argument('--vacuum', action='store_true', help='compact the database file afterwards')
+    command.set_defaults(func=archive)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
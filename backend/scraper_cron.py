@@ -1,22 +1,31 @@
 #!/usr/bin/env python3
 """
-Standalone scraper script for cron execution
-Usage: python scraper_cron.py
+Standalone scraper script
+Usage:
+  python scraper_cron.py            # one scrape of every station (cron)
+  python scraper_cron.py --daemon   # resident scheduler polling each station when its data is due
 """
 
+import argparse
+import signal
 import sys
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import WeatherDatabase, WeatherScraper
+from app import DB_PATH, METRICS, WeatherDatabase, WeatherScraper, StationFetchCache, ScrapeScheduler, profiled
 from datetime import datetime
 
+FETCH_CACHE_PATH = '/app/data/fetch_cache.json'
+
+@profiled('scrapes', 'cron')
 def main():
     print(f"[{datetime.now()}] Starting scheduled weather data scraping...")
     
     try:
-        db = WeatherDatabase('/app/data/weather_data.db')
-        scraper = WeatherScraper()
+        db = WeatherDatabase(DB_PATH)
+        scraper = WeatherScraper(fetch_cache=StationFetchCache(FETCH_CACHE_PATH))
         
         # Get latest data from database to check for updates
         latest_db_data = db.get_latest_data()
@@ -27,12 +36,15 @@ def main():
         # Scrape data from all stations
         scraped_data = scraper.scrape_all_stations()
         
+        skipped = len(scraper.unchanged_stations)
+        print(f"[{datetime.now()}] Skipped {skipped}/{len(scraper.stations)} stations as unchanged")
+        
         if scraped_data:
             # Filter out data that already exists in database
             new_data = []
             for data in scraped_data:
-                station_code = data['station_code']
-                timestamp = data['timestamp']
+                station_code = data.station_code
+                timestamp = data.timestamp
                 
                 if station_code not in latest_timestamps or timestamp > latest_timestamps[station_code]:
                     new_data.append(data)
@@ -48,10 +60,61 @@ def main():
                 print(f"[{datetime.now()}] No new data to save")
         else:
             print(f"[{datetime.now()}] No data was scraped")
+        
+        # Only mark pages as seen once their data is safely in the database
+        scraper.fetch_cache.commit()
             
     except Exception as e:
         print(f"[{datetime.now()}] Error during scraping: {e}")
         sys.exit(1)
 
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def run_daemon():
+    print(f"[{datetime.now()}] Starting scrape scheduler...")
+    db = WeatherDatabase(DB_PATH)
+    scraper = WeatherScraper(fetch_cache=StationFetchCache(FETCH_CACHE_PATH))
+    scheduler = ScrapeScheduler(scraper, db)
+    METRICS.gauge('isewan_scheduler_events', 'ScrapeScheduler polls / hits / misses / rows saved',
+                  lambda: {(name,): value for name, value in scheduler.stats.items()}, ('event',))
+    
+    # Fetch / parse / ingest metrics of this process (the API server's /metrics only sees its own)
+    metrics_port = os.environ.get('SCRAPER_METRICS_PORT')
+    if metrics_port:
+        metrics_server = ThreadingHTTPServer(('127.0.0.1', int(metrics_port)), MetricsHandler)
+        metrics_server.daemon_threads = True
+        threading.Thread(target=metrics_server.serve_forever, name='metrics', daemon=True).start()
+        print(f"[{datetime.now()}] Metrics on http://127.0.0.1:{metrics_port}/metrics")
+    
+    def shutdown(signum, frame):
+        print(f"[{datetime.now()}] Stopping scrape scheduler (signal {signum})")
+        scheduler.stop()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    
+    try:
+        scheduler.run()
+    finally:
+        scraper.close()
+        print(f"[{datetime.now()}] Scheduler stopped: {scheduler.stats}")
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Scrape the weather stations into the database')
+    parser.add_argument('--daemon', action='store_true', help='keep running and poll each station when it is due')
+    if parser.parse_args().daemon:
+        run_daemon()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import contextlib
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import KeepAliveHTTPServer, WeatherAPIHandler, WeatherDatabase
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'weather_data.db')
+
+
+@pytest.fixture
+def db(db_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return WeatherDatabase(db_path)
+
+
+@pytest.fixture
+def server(db):
+    class Handler(WeatherAPIHandler):
+        db_path = db.db_path
+        
+        def log_message(self, format, *args):
+            pass
+    httpd = KeepAliveHTTPServer(('127.0.0.1', 0), Handler, max_workers=2, keepalive_timeout=2)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,79 @@
+"""Stand-ins for the station site used by the scraper tests"""
+
+import zlib
+from datetime import timedelta
+
+import requests
+
+WIND_DIRECTIONS = ['北', '北北東', '北東', '東北東', '東', '東南東', '南東', '南南東',
+                   '南', '南南西', '南西', '西南西', '西', '西北西', '北西', '北北西']
+
+
+def station_page(end_time, rows=8, interval=15, encoding='utf-8', dated=True):
+    """A station page in the date + time column layout (time column only unless dated), newest row first"""
+    date_header = '<th>日付</th>' if dated else ''
+    lines = [f'<tr>{date_header}<th>時刻</th><th>風向</th><th>風速(m/s)</th></tr>']
+    for i in range(rows):
+        ts = end_time - timedelta(minutes=interval * i)
+        minutes = ts.day * 1440 + ts.hour * 60 + ts.minute
+        date_cell = f'<td>{ts:%Y/%m/%d}</td>' if dated else ''
+        lines.append(f'<tr>{date_cell}<td>{ts:%H:%M}</td>'
+                     f'<td>{WIND_DIRECTIONS[minutes % 16]}</td><td>{minutes % 150 / 10:.1f}</td></tr>')
+    return (f'<html><head><meta charset="{encoding}"></head><body><table>'
+            + ''.join(lines) + '</table></body></html>').encode(encoding)
+
+
+class StubResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}')
+
+
+class StubSession:
+    """Replaces WeatherScraper.session: serves pages[url] with an ETag and answers 304 to a match"""
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        body = self.pages.get(url)
+        if body is None:
+            return StubResponse(404)
+        etag = f'"{zlib.crc32(body):08x}"'
+        if headers.get('If-None-Match') == etag:
+            return StubResponse(304, headers={'ETag': etag})
+        return StubResponse(200, body, {'ETag': etag})
+
+    def close(self):
+        pass
+
+
+def make_stations(count=3):
+    """Stations in the WeatherScraper.stations format; the first is the reference station"""
+    stations = []
+    for i in range(count):
+        code = 'iragomisaki_vtss' if i == 0 else f'station_{i}'
+        stations.append({
+            'name': f'観測地点{i}',
+            'code': code,
+            'url': f'http://stations.test/{code}.html',
+            'has_wave_height': False,
+            'update_interval': 15 if i % 2 == 0 else 30
+        })
+    return stations
+
+
+def make_scraper(session, stations, fetch_cache=None):
+    from app import WeatherScraper
+    scraper = WeatherScraper(per_host_interval=0, fetch_cache=fetch_cache)
+    scraper.stations = stations
+    scraper._session = session
+    return scraper
@@ -0,0 +1,467 @@
+import contextlib
+import gzip
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+from datetime import datetime
+
+import app
+from app import QueryResultCache, ScrapeJobManager, dumps_json, get_query_cache, iter_json_array
+from stubs import StubSession, make_scraper, make_stations, station_page
+
+
+def record(timestamp, speed=5.0, code='station_1'):
+    return {'station_code': code, 'station_name': code, 'timestamp': timestamp,
+            'wind_direction': '北', 'wind_speed': speed, 'wave_height': 1.0}
+
+
+def ingest(db, records):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return db.ingest(records)
+
+
+def request(server, path, headers=None, method='GET'):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    try:
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+
+def test_latest_answers_304_until_a_station_changes(db, server):
+    ingest(db, [record('2024-07-01 12:00:00'), record('2024-07-01 12:00:00', code='station_2')])
+    status, headers, body = request(server, '/api/weather/latest')
+    assert status == 200
+    assert {r['station_code'] for r in json.loads(body)} == {'station_1', 'station_2'}
+    etag = headers['ETag']
+    
+    status, headers, body = request(server, '/api/weather/latest', {'If-None-Match': etag})
+    assert (status, body) == (304, b'')
+    assert headers['ETag'] == etag
+    
+    ingest(db, [record('2024-07-01 12:15:00', speed=8.0)])
+    status, headers, body = request(server, '/api/weather/latest', {'If-None-Match': etag})
+    assert status == 200
+    assert headers['ETag'] != etag
+    latest = {r['station_code']: r for r in json.loads(body)}
+    assert (latest['station_1']['timestamp'], latest['station_1']['wind_speed']) == ('2024-07-01 12:15:00', 8.0)
+
+
+def test_data_pages_follow_the_keyset_cursor(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00', code=code) for hour in range(10)
+                for code in ('station_1', 'station_2')])
+    _, _, body = request(server, '/api/weather/data')
+    everything = json.loads(body)
+    assert len(everything) == 20
+    
+    pages, cursor = [], None
+    while True:
+        status, _, body = request(server, '/api/weather/data?page_size=3' + (f'&cursor={cursor}' if cursor else ''))
+        assert status == 200
+        page = json.loads(body)
+        pages.append(page['data'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+        if len(pages) == 2:
+            # Rows newer than the cursor do not shift the pages after it
+            ingest(db, [record('2024-07-01 23:00:00')])
+    assert [len(page) for page in pages] == [3] * 6 + [2]
+    assert [row for page in pages for row in page] == everything
+    
+    status, _, body = request(server, '/api/weather/data?page_size=3&cursor=not-a-cursor')
+    assert status == 400
+
+
+def test_columns_shape_carries_the_same_rows(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00', code=code) for hour in range(3)
+                for code in ('station_1', 'station_2')])
+    _, _, body = request(server, '/api/weather/data')
+    rows = json.loads(body)
+    for query in ('', '&limit=4', '&page_size=4'):
+        status, _, body = request(server, f'/api/weather/data?shape=columns{query}')
+        assert status == 200
+        columns = json.loads(body)
+        if query == '&page_size=4':
+            assert columns['next_cursor']
+            columns = columns['data']
+        names = columns.pop('stations')
+        assert names == {'station_1': 'station_1', 'station_2': 'station_2'}
+        rebuilt = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        assert [dict(r, station_name=names[r['station_code']]) for r in rebuilt] == rows[:len(rebuilt)]
+        assert len(rebuilt) == (6 if not query else 4)
+    
+    status, _, _ = request(server, '/api/weather/data?shape=table')
+    assert status == 400
+
+
+def test_json_without_orjson_is_the_same_document(db, server, monkeypatch):
+    ingest(db, [dict(record(f'2024-07-01 {hour:02d}:00:00', speed=hour / 3), wave_height=None) for hour in range(5)])
+    records = db.get_weather_data()
+    encoded = dumps_json(records)
+    assert b''.join(iter_json_array(iter(records), batch_size=2)) == encoded
+    _, _, body = request(server, '/api/weather/data')
+    
+    monkeypatch.setattr(app, 'orjson', None)
+    assert json.loads(dumps_json(records)) == json.loads(encoded) == records
+    assert b''.join(iter_json_array(iter(records), batch_size=2)) == dumps_json(records)
+    _, _, fallback = request(server, '/api/weather/data?limit=100')
+    assert json.loads(fallback) == json.loads(body)
+
+
+def test_responses_are_compressed_as_negotiated(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00') for hour in range(24)])
+    path = '/api/weather/data?limit=100'
+    _, headers, identity = request(server, path)
+    assert len(identity) >= 1024 and headers['Content-Encoding'] is None
+    assert headers['Vary'] == 'Accept-Encoding'
+    
+    _, gzip_headers, body = request(server, path, {'Accept-Encoding': 'gzip, deflate'})
+    assert gzip_headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == identity
+    assert gzip_headers['ETag'] != headers['ETag']
+    status, _, _ = request(server, path, {'Accept-Encoding': 'gzip', 'If-None-Match': gzip_headers['ETag']})
+    assert status == 304
+    
+    _, headers, body = request(server, path, {'Accept-Encoding': 'gzip;q=0'})
+    assert headers['Content-Encoding'] is None and body == identity
+    
+    # brotli is preferred when both sides have it, otherwise gzip is used
+    _, headers, body = request(server, path, {'Accept-Encoding': 'gzip, br'})
+    if app.brotli is None:
+        assert headers['Content-Encoding'] == 'gzip'
+    else:
+        assert headers['Content-Encoding'] == 'br'
+        assert app.brotli.decompress(body) == identity
+    
+    # Small bodies are not worth compressing
+    _, headers, _ = request(server, '/api/weather/data?limit=1', {'Accept-Encoding': 'gzip'})
+    assert headers['Content-Encoding'] is None
+
+
+def test_streams_to_http_10_clients_are_not_chunked(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00') for hour in range(10)])
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(b'GET /api/weather/data HTTP/1.0\r\n\r\n')
+        response = b''
+        while chunk := sock.recv(65536):
+            response += chunk
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.0 200') or head.startswith(b'HTTP/1.1 200')
+    assert b'transfer-encoding' not in head.lower()
+    assert len(json.loads(body)) == 10
+    
+    # HTTP/1.1 clients still get a chunked stream on a kept-alive connection
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    try:
+        for _ in range(2):
+            conn.request('GET', '/api/weather/export?format=ndjson&gzip=0')
+            response = conn.getresponse()
+            assert response.headers['Transfer-Encoding'] == 'chunked'
+            assert len(response.read().splitlines()) == 10
+    finally:
+        conn.close()
+
+
+def test_rollups_aggregate_and_follow_corrections(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:{minute:02d}:00', speed=hour + minute / 15)
+                for hour in (9, 10) for minute in (0, 15, 30, 45)])
+    status, _, body = request(server, '/api/weather/data?resolution=hour&station_code=station_1')
+    assert status == 200
+    hours = [(r['timestamp'], r['sample_count'], r['wind_speed_min'], r['wind_speed'], r['wind_speed_max'])
+             for r in json.loads(body)]
+    assert hours == [('2024-07-01 10:00:00', 4, 10.0, 11.5, 13.0), ('2024-07-01 09:00:00', 4, 9.0, 10.5, 12.0)]
+    
+    ingest(db, [record('2024-07-01 09:30:00', speed=20.0)])
+    _, _, body = request(server, '/api/weather/data?resolution=day')
+    (day,) = json.loads(body)
+    assert (day['timestamp'], day['sample_count'], day['wind_speed_max']) == ('2024-07-01 00:00:00', 8, 20.0)
+    assert day['wind_speed'] == (9 + 10 + 20 + 12 + 10 + 11 + 12 + 13) / 8
+
+
+def test_compressed_variants_count_towards_the_cache_size(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00') for hour in range(24)])
+    path = '/api/weather/data?limit=100'
+    _, _, identity = request(server, path)
+    _, _, compressed = request(server, path, {'Accept-Encoding': 'gzip'})
+    assert get_query_cache(db.db_path).size == len(identity) + len(compressed)
+    
+    cache = QueryResultCache(max_bytes=1000)
+    first = cache.put('first', 1, (None, None), b'x' * 400)
+    first.variants['gzip'] = b'g' * 100
+    cache.put('second', 1, (None, None), b'y' * 400)
+    assert (cache.size, len(cache)) == (900, 2)
+    first.variants['br'] = b'b' * 200  # Over max_bytes: the least recently used entry goes
+    assert (cache.size, len(cache), cache.stats['evicted']) == (400, 1, 1)
+    first.variants['gzip'] = b'g' * 50  # No longer cached: not counted
+    assert cache.size == 400
+
+
+def test_auto_resolution_fits_max_points(db, server):
+    ingest(db, [record(f'2024-07-0{day} {minute // 60:02d}:{minute % 60:02d}:00')
+                for day in (1, 2) for minute in range(0, 1440, 15)])
+    query = '/api/weather/data?resolution=auto&start_date=2024-07-01T00:00:00&end_date=2024-07-02T23:45:00'
+    for max_points, resolution, count in ((500, None, 192), (100, 'hour', 48), (10, 'day', 2)):
+        status, _, body = request(server, f'{query}&max_points={max_points}')
+        assert status == 200
+        records = json.loads(body)
+        assert len(records) == count <= max_points
+        assert {r.get('resolution') for r in records} == {resolution}
+    
+    status, _, _ = request(server, '/api/weather/data?resolution=minute')
+    assert status == 400
+
+
+def test_cached_data_keeps_its_etag_until_its_range_changes(db, server):
+    ingest(db, [record(f'2024-07-0{day} 12:00:00') for day in (1, 2, 3)])
+    path = '/api/weather/data?start_date=2024-07-02T00:00:00&limit=10'
+    status, headers, body = request(server, path)
+    assert status == 200
+    assert [r['timestamp'] for r in json.loads(body)] == ['2024-07-03 12:00:00', '2024-07-02 12:00:00']
+    etag = headers['ETag']
+    
+    # A write before start_date leaves the cached response valid
+    ingest(db, [record('2024-06-30 12:00:00')])
+    status, headers, _ = request(server, path, {'If-None-Match': etag})
+    assert (status, headers['ETag']) == (304, etag)
+    
+    ingest(db, [record('2024-07-02 12:00:00', speed=6.0)])
+    status, headers, body = request(server, path, {'If-None-Match': etag})
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert [r['wind_speed'] for r in json.loads(body)] == [5.0, 6.0]
+
+
+def test_csv_export_matches_the_frontend_csv(db, server):
+    ingest(db, [
+        dict(record('2024-07-01 12:00:00', speed=0.0), wave_height=None, created_at='2024-07-01T12:07:30.250000'),
+        dict(record('2024-07-01 12:15:00', speed=7.0), wave_height=1.25, created_at='2024-07-01T12:22:00'),
+        dict(record('2024-07-01 12:15:00', speed=3.5, code='station_2'), station_name='観測地点2',
+             wind_direction=None, created_at='2024-07-01T12:22:00'),
+    ])
+    status, headers, body = request(server, '/api/weather/export?format=csv&gzip=0')
+    assert status == 200
+    assert headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert headers['Content-Disposition'].endswith('_all_stations.csv"')
+    # What exportToCSV in src/utils/csvExport.ts wrote for the same rows
+    assert body.decode('utf-8') == '\n'.join([
+        '\ufeff観測地点,地点コード,日時,風向,風速(m/s),波高(m),登録日時',
+        '"観測地点2",station_2,2024/07/01 12:15,,3.5,1,2024/07/01 12:22',
+        '"station_1",station_1,2024/07/01 12:15,北,7,1.25,2024/07/01 12:22',
+        '"station_1",station_1,2024/07/01 12:00,北,,,2024/07/01 12:07',
+    ])
+
+
+def test_ndjson_and_gzip_exports(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00') for hour in range(24)])
+    _, _, body = request(server, '/api/weather/data')
+    status, headers, ndjson = request(server, '/api/weather/export?format=ndjson&gzip=0&station_code=station_1')
+    assert status == 200
+    assert headers['Content-Type'] == 'application/x-ndjson; charset=utf-8'
+    assert headers['Content-Disposition'].endswith('_station_1.ndjson"')
+    assert [json.loads(line) for line in ndjson.splitlines()] == json.loads(body)
+    
+    status, headers, compressed = request(server, '/api/weather/export?format=ndjson',
+                                          {'Accept-Encoding': 'gzip'})
+    assert headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed) == ndjson
+    _, headers, _ = request(server, '/api/weather/export?format=ndjson&gzip=0', {'Accept-Encoding': 'gzip'})
+    assert headers['Content-Encoding'] is None
+    
+    status, _, _ = request(server, '/api/weather/export?format=xml')
+    assert status == 400
+
+
+class GatedSession(StubSession):
+    """Holds every fetch until `gate` is set, so a job stays running while more triggers arrive"""
+    
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+    
+    def get(self, url, headers=None, timeout=None):
+        assert self.gate.wait(5)
+        return super().get(url, headers, timeout)
+
+
+def wait_for_job(server, job_id):
+    for _ in range(100):
+        _, _, body = request(server, f'/api/weather/scrape/{job_id}')
+        job = json.loads(body)
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} still running')
+
+
+def test_scrape_triggers_share_one_job(db, server, monkeypatch):
+    stations = make_stations()
+    session = GatedSession()
+    for station in stations:
+        session.pages[station['url']] = station_page(datetime(2024, 7, 1, 12, 0), interval=station['update_interval'])
+    scrapers = []
+    
+    def scraper_factory():
+        scrapers.append(make_scraper(session, stations))
+        return scrapers[-1]
+    manager = ScrapeJobManager(db.db_path, cooldown=60, scraper_factory=scraper_factory)
+    monkeypatch.setitem(app._scrape_jobs, db.db_path, manager)
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        responses = [request(server, '/api/weather/scrape', method='POST') for _ in range(3)]
+        assert [status for status, _, _ in responses] == [202] * 3
+        jobs = [json.loads(body) for _, _, body in responses]
+        job_id = jobs[0]['job_id']
+        assert {job['job_id'] for job in jobs} == {job_id}
+        assert jobs[-1]['requests'] == 3
+        assert jobs[-1]['status_url'] == f'/api/weather/scrape/{job_id}'
+        assert {station['status'] for station in jobs[-1]['stations']} == {'pending'}
+        
+        session.gate.set()
+        job = wait_for_job(server, job_id)
+        assert (job['status'], job['success']) == ('succeeded', True)
+        assert job['records_saved'] == db.get_data_count() > 0
+        for station in job['stations']:
+            assert (station['status'], station['records']) == ('done', 8)
+            assert station['seconds'] >= 0
+        fetches = len(session.requests)
+        
+        # Within the cooldown the finished job is returned without scraping again
+        status, _, body = request(server, '/api/weather/scrape', method='POST')
+        assert (status, json.loads(body)['job_id']) == (200, job_id)
+        assert len(session.requests) == fetches
+        
+        manager.cooldown = 0
+        status, _, body = request(server, '/api/weather/scrape', method='POST')
+        assert status == 202
+        second = wait_for_job(server, json.loads(body)['job_id'])
+        assert second['job_id'] != job_id and second['status'] == 'succeeded'
+    assert len(scrapers) == 1  # Both jobs used the same scraper and session
+    
+    _, _, body = request(server, '/api/weather/scrape')
+    assert json.loads(body)['job_id'] == second['job_id']
+    status, _, _ = request(server, '/api/weather/scrape/unknown')
+    assert status == 404
+    manager.close()
+
+
+def read_events(sock, count):
+    """The next `count` SSE events from sock as (id, event, data) tuples"""
+    events = []
+    buffered = b''
+    while len(events) < count:
+        while b'\n\n' not in buffered:
+            chunk = sock.recv(65536)
+            assert chunk, 'stream closed'
+            buffered += chunk
+        block, buffered = buffered.split(b'\n\n', 1)
+        fields = dict(line.split(': ', 1) for line in block.decode('utf-8').split('\n')
+                      if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def open_stream(server, last_event_id=None):
+    sock = socket.create_connection(server.server_address, timeout=5)
+    extra = f'Last-Event-ID: {last_event_id}\r\n' if last_event_id is not None else ''
+    sock.sendall(f'GET /api/weather/stream HTTP/1.1\r\nHost: test\r\n{extra}\r\n'.encode('ascii'))
+    head = b''
+    while b'\r\n\r\n' not in head:
+        head += sock.recv(1)
+    assert b'text/event-stream' in head
+    return sock
+
+
+def test_event_stream_sends_a_snapshot_then_changed_stations(db, server):
+    ingest(db, [record('2024-07-01 12:00:00'), record('2024-07-01 12:00:00', code='station_2')])
+    try:
+        with open_stream(server) as sock:
+            ((version, event, records),) = read_events(sock, 1)
+            assert event == 'snapshot'
+            assert {r['station_code'] for r in records} == {'station_1', 'station_2'}
+            
+            ingest(db, [record('2024-07-01 12:15:00', speed=9.0)])
+            ((update, event, records),) = read_events(sock, 1)
+            assert (event, update) == ('observations', db._read_data_version())
+            assert [(r['station_code'], r['timestamp'], r['wind_speed']) for r in records] == [
+                ('station_1', '2024-07-01 12:15:00', 9.0)]
+        
+        # Reconnecting with the last id seen replays only what was missed
+        ingest(db, [record('2024-07-01 12:15:00', code='station_2')])
+        with open_stream(server, last_event_id=update) as sock:
+            ((replayed, event, records),) = read_events(sock, 1)
+            assert (replayed, event, [r['station_code'] for r in records]) == (
+                db._read_data_version(), 'observations', ['station_2'])
+    finally:
+        with app._event_streams_lock:
+            broadcaster = app._event_streams.pop(db.db_path, None)
+        if broadcaster is not None:
+            broadcaster.close()
+
+
+def test_analytics_summarizes_each_station(db, server):
+    ingest(db, [record('2024-07-01 12:00:00', speed=1.0), record('2024-07-01 12:15:00', speed=3.0),
+                record('2024-07-01 12:30:00', speed=5.0),
+                dict(record('2024-08-01 12:00:00', speed=12.0), wind_direction=None, wave_height=None)])
+    status, _, body = request(server, '/api/weather/analytics?station_code=station_1&group=month'
+                                      '&speed_bins=0,5,10&percentiles=50&wind_thresholds=5,10&wave_thresholds=1')
+    assert status == 200
+    result = json.loads(body)
+    (station,) = result['stations']
+    assert (station['station_code'], station['count'], station['start'], station['end']) == (
+        'station_1', 4, '2024-07-01 12:00:00', '2024-08-01 12:00:00')
+    assert station['wind_speed'] == {'count': 4, 'mean': 5.25, 'max': 12.0, 'percentiles': {'p50': 4.0},
+                                     'exceedance': {'5': 50.0, '10': 25.0}}
+    assert station['wave_height'] == {'count': 3, 'mean': 1.0, 'max': 1.0, 'percentiles': {'p50': 1.0},
+                                      'exceedance': {'1': 100.0}}
+    rose = station['wind_rose']
+    assert rose['speed_bins'] == ['0-5', '5-10', '10+']
+    assert rose['percent'][rose['sectors'].index('北')] == [50.0, 25.0, 0.0]
+    assert rose['calm_or_variable'] == 25.0
+    assert [(month['month'], month['count']) for month in station['months']] == [('2024-07', 3), ('2024-08', 1)]
+    
+    for query in ('group=week', 'percentiles=101'):
+        status, _, _ = request(server, f'/api/weather/analytics?{query}')
+        assert status == 400
+
+
+def test_changes_feed_pages_until_caught_up(db, server):
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00', code=code) for hour in range(6)
+                for code in ('station_1', 'station_2')])
+    server.RequestHandlerClass.MAX_PAGE_SIZE = 5
+    
+    def follow(since):
+        changes = []
+        while True:
+            status, _, body = request(server, f'/api/weather/changes?since={since}&limit=1000')
+            assert status == 200
+            page = json.loads(body)
+            assert len(page['changes']) <= 5  # limit is capped at MAX_PAGE_SIZE
+            changes += page['changes']
+            since = page['next_since']
+            if not page['has_more']:
+                assert page['change_seq'] == since
+                return changes, since
+    changes, since = follow(0)
+    assert len(changes) == 12 and len({c['id'] for c in changes}) == 12
+    assert [c['seq'] for c in changes] == list(range(1, 13))
+    
+    _, _, body = request(server, '/api/weather/changes?since=0&limit=0')
+    assert len(json.loads(body)['changes']) == 1
+    
+    # Re-ingesting unchanged rows is not a change; a corrected value is
+    ingest(db, [record(f'2024-07-01 {hour:02d}:00:00') for hour in range(6)])
+    ingest(db, [record('2024-07-01 03:00:00', speed=6.5)])
+    changes, _ = follow(since)
+    assert [(c['station_code'], c['timestamp'], c['wind_speed']) for c in changes] == [
+        ('station_1', '2024-07-01 03:00:00', 6.5)]
+    
+    for query in ('since=abc', 'limit=ten', 'since=1.5'):
+        status, _, body = request(server, f'/api/weather/changes?{query}')
+        assert status == 400 and 'error' in json.loads(body)
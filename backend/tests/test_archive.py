@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import WeatherDatabase
+
+
+def hourly(code, first, last):
+    """Hourly records of station `code` from date `first` up to (not including) `last`"""
+    records = []
+    moment = datetime.fromisoformat(first)
+    while moment < datetime.fromisoformat(last):
+        records.append({'station_code': code, 'station_name': code, 'timestamp': moment.isoformat(),
+                        'wind_direction': '北', 'wind_speed': moment.hour / 2, 'wave_height': None})
+        moment += timedelta(hours=1)
+    return records
+
+
+@pytest.fixture
+def archived(db):
+    """Jan-May 2024 archived into segments, June 2024 left in observations"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for code in ('station_1', 'station_2'):
+            db.ingest(hourly(code, '2024-01-01', '2024-07-01'))
+    totals = db.archive_observations(WeatherDatabase.to_epoch('2024-06-15T00:00:00'))
+    assert totals['segments'] == 10
+    return db
+
+
+def segment_files(db):
+    return sorted(os.path.join(directory, name)
+                  for directory, _, files in os.walk(db.archive_dir) for name in files)
+
+
+def test_stream_survives_segments_unlinked_under_it(archived):
+    expected = archived.get_weather_data(station_code='station_1')
+    rows = archived.iter_weather_data(station_code='station_1')
+    # Read into the archived months, then delete every segment file as a concurrent retention run would
+    head = [next(rows) for _ in range(30 * 24 + 1)]
+    assert head[-1]['timestamp'] < '2024-06-01'
+    for path in segment_files(archived):
+        os.unlink(path)
+    assert head + list(rows) == expected
+    assert len(expected) == 182 * 24
+
+
+def test_retired_segments_are_kept_for_the_grace_period(archived):
+    files = segment_files(archived)
+    dropped = archived.drop_archived_months(WeatherDatabase.to_epoch('2024-03-01T00:00:00'))
+    assert dropped['segments'] == 4
+    assert segment_files(archived) == files
+    
+    archived.SEGMENT_GRACE_SECONDS = -1
+    archived.archive_observations(WeatherDatabase.to_epoch('2024-06-15T00:00:00'))
+    assert len(segment_files(archived)) == 6
+
+
+def test_changes_include_archived_rows(archived):
+    changes, next_since, has_more = archived.get_changes(since=0, limit=100000)
+    assert not has_more
+    assert len(changes) == archived.get_data_count() == 2 * 182 * 24
+    assert [c['seq'] for c in changes] == sorted(c['seq'] for c in changes)
+    first = changes[0]
+    assert (first['station_code'], first['timestamp'], first['wind_speed']) == ('station_1', '2024-01-01 00:00:00', 0.0)
+    assert first['created_at'] is not None
+    
+    paged, since = [], 0
+    while True:
+        batch, since, has_more = archived.get_changes(since=since, limit=500)
+        paged += batch
+        if not has_more:
+            break
+    assert paged == changes
@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+from app import Observation
+
+
+def record(timestamp, speed=5.0, code='station_1', name='観測地点1', direction='北'):
+    return {'station_code': code, 'station_name': name, 'timestamp': timestamp,
+            'wind_direction': direction, 'wind_speed': speed, 'wave_height': None}
+
+
+def ingest(db, records):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return db.ingest(records)
+
+
+def test_reingesting_the_same_batch_changes_nothing(db):
+    batch = [record(f'2024-07-01 12:{minute:02d}:00') for minute in (0, 15, 30, 45)]
+    assert ingest(db, batch) == {'inserted': 4, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    version, seq = db._read_data_version(), db.get_change_seq()
+    
+    assert ingest(db, batch) == {'inserted': 0, 'updated': 0, 'unchanged': 4, 'skipped': 0}
+    assert db._read_data_version() == version
+    assert db.get_change_seq() == seq
+    assert db.get_data_count() == 4
+
+
+def test_only_changed_values_are_rewritten(db):
+    ingest(db, [record('2024-07-01 12:00:00'), record('2024-07-01 12:15:00')])
+    seq = db.get_change_seq()
+    
+    stats = ingest(db, [record('2024-07-01 12:00:00'), record('2024-07-01 12:15:00', speed=7.5),
+                        record('2024-07-01 12:30:00')])
+    assert stats == {'inserted': 1, 'updated': 1, 'unchanged': 1, 'skipped': 0}
+    assert db.get_change_seq() == seq + 2
+    changes, next_since, has_more = db.get_changes(since=seq)
+    assert [(c['timestamp'], c['wind_speed']) for c in changes] == [
+        ('2024-07-01 12:15:00', 7.5), ('2024-07-01 12:30:00', 5.0)]
+    assert (next_since, has_more) == (seq + 2, False)
+    assert db.get_data_count() == 3
+
+
+def test_later_duplicates_in_a_batch_win(db):
+    stats = ingest(db, [record('2024-07-01 12:00:00', speed=1.0), record('2024-07-01 12:00:00', speed=2.0)])
+    assert stats['inserted'] == 1
+    assert [r['wind_speed'] for r in db.get_weather_data()] == [2.0]
+
+
+def test_bad_records_are_skipped_not_the_batch(db):
+    batch = [
+        record('2024-07-01 12:00:00'),
+        record('2024/07/01 12:15'),  # Not a timestamp SQLite understands
+        record('2024-13-01 00:00:00'),
+        record(None),
+        {'station_name': '観測地点1', 'timestamp': '2024-07-01 12:30:00'},  # No station_code
+        Observation('station_2', '観測地点2', '2024-07-01 12:45:00', '南', 3.0, None),
+    ]
+    stats = ingest(db, batch)
+    assert stats == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'skipped': 4}
+    assert sorted((r['station_code'], r['timestamp']) for r in db.get_weather_data()) == [
+        ('station_1', '2024-07-01 12:00:00'), ('station_2', '2024-07-01 12:45:00')]
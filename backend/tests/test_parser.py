@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+from app import HTMLTableParser, WeatherScraper
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+# Station page -> (encoding, layout, data rows)
+PAGES = {
+    'iragomisaki_vtss.html': ('utf-8', 'time', 24),
+    'iragosuido_southeast_aisss.html': ('shift_jis', 'datetime', 48),
+    'daiosaki_lt.html': ('shift_jis', 'datetime', 36),
+    'nagoyako_bw.html': ('utf-8', 'datetime', 24),
+    'yokkaichiko_bkw_lt.html': ('shift_jis', 'time', 24),
+}
+
+
+def read_page(name):
+    """Decode a saved page the way WeatherScraper.fetch_page_content does"""
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        raw = f.read()
+    for encoding in ('utf-8', 'shift_jis', 'euc-jp'):
+        try:
+            return encoding, raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise AssertionError(f'{name} does not decode')
+
+
+def parse(html, backend):
+    parser = HTMLTableParser(backend=backend)
+    parser.parse_html(html)
+    return parser.rows
+
+
+def test_corpus_covers_both_layouts_and_encodings():
+    assert {(encoding, layout) for encoding, layout, _ in PAGES.values()} == {
+        ('utf-8', 'time'), ('utf-8', 'datetime'), ('shift_jis', 'time'), ('shift_jis', 'datetime')}
+    assert sorted(PAGES) == sorted(os.listdir(PAGES_DIR))
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_stream_extractor_matches_beautifulsoup(name):
+    encoding, html = read_page(name)
+    assert encoding == PAGES[name][0]
+    rows = parse(html, 'stream')
+    assert rows
+    assert rows == parse(html, 'bs4')
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_station_pages_parse_into_observations(name):
+    _, html = read_page(name)
+    _, layout, expected = PAGES[name]
+    scraper = WeatherScraper()
+    code = name[:-len('.html')]
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = scraper.parse_table_data(html, code, scraper.stations_by_code[code]['has_wave_height'])
+    assert len(data) == expected
+    assert all(d.station_code == code and d.timestamp[10:] and d.timestamp[13] == ':' for d in data)
+    if layout == 'datetime':
+        assert data[0].timestamp.startswith('2024-11-0')
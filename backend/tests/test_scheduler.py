@@ -0,0 +1,144 @@
+import calendar
+import contextlib
+import io
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import JST, ScrapeScheduler
+from stubs import StubSession, make_scraper, make_stations, station_page
+
+START = datetime(2024, 7, 1, 12, 5)  # JST
+PUBLISH_LAGS = [200, 300, 420]  # Seconds after an observation's time that its row appears, per station
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    """Run as the Docker image and the systemd unit do: local time zone UTC"""
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def epoch(wall_clock):
+    return wall_clock.replace(tzinfo=JST).timestamp()
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = epoch(start)
+
+    def time(self):
+        return self.now
+
+    def wall_clock(self):
+        return datetime.fromtimestamp(self.now, JST).replace(tzinfo=None)
+
+
+class PublishingSite(StubSession):
+    """Serves each station's page as of the fake clock: observation T is up from T + its publish lag"""
+
+    def __init__(self, clock, stations, dated=True):
+        super().__init__()
+        self.clock = clock
+        self.dated = dated
+        self.stations = {station['url']: (station, lag) for station, lag in zip(stations, PUBLISH_LAGS)}
+
+    def newest_published(self, station, lag):
+        interval = station['update_interval']
+        newest = (self.clock.wall_clock() - timedelta(seconds=lag)).replace(second=0, microsecond=0)
+        return newest - timedelta(minutes=newest.minute % interval)
+
+    def get(self, url, headers=None, timeout=None):
+        station, lag = self.stations[url]
+        self.pages[url] = station_page(self.newest_published(station, lag), interval=station['update_interval'],
+                                       dated=self.dated)
+        return super().get(url, headers, timeout)
+
+
+def test_epoch_does_not_depend_on_the_local_time_zone(utc, monkeypatch):
+    expected = calendar.timegm((2024, 7, 1, 3, 0, 0))  # 12:00 JST is 03:00 UTC
+    assert ScrapeScheduler._epoch('2024-07-01 12:00:00') == expected
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    assert ScrapeScheduler._epoch('2024-07-01 12:00:00') == expected
+
+
+def run_scheduler(db, start, hours, dated=True):
+    """Run a scheduler on the fake clock for `hours`; returns stations, end and when each row was saved"""
+    clock = FakeClock(start)
+    stations = make_stations(len(PUBLISH_LAGS))
+    site = PublishingSite(clock, stations, dated)
+    scraper = make_scraper(site, stations)
+    scraper.clock = clock.time
+    # The database already has each station's newest published row, as after a restart
+    db.ingest([{'station_code': station['code'], 'station_name': station['name'],
+                'timestamp': f'{site.newest_published(station, lag):%Y-%m-%d %H:%M:%S}',
+                'wind_direction': '北', 'wind_speed': 1.0, 'wave_height': None}
+               for station, lag in zip(stations, PUBLISH_LAGS)])
+    
+    saved_at = {}
+    save = db.save_weather_data
+    
+    def save_weather_data(data_list):
+        for data in data_list:
+            if data.wind_speed is not None:
+                saved_at.setdefault((data.station_code, data.timestamp), clock.now)
+        return save(data_list)
+    db.save_weather_data = save_weather_data
+    
+    end = clock.now + hours * 3600
+    scheduler = None
+    
+    def sleep(seconds):
+        clock.now += seconds
+        if clock.now >= end:
+            scheduler.stop()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scheduler = ScrapeScheduler(scraper, db, clock=clock.time, sleep=sleep)
+        scheduler.run()
+    return scheduler, stations, end, saved_at
+
+
+def assert_saved_within_an_interval(stations, first, end, saved_at):
+    """Every observation from `first` on that was published an interval before end was saved in time.
+    
+    Returns the number of observations checked per station.
+    """
+    counts = []
+    for station, lag in zip(stations, PUBLISH_LAGS):
+        interval = station['update_interval'] * 60
+        observation = first
+        checked = 0
+        while epoch(observation) + lag + interval < end:
+            key = (station['code'], f'{observation:%Y-%m-%d %H:%M:%S}')
+            assert key in saved_at, f'{key} never saved'
+            assert saved_at[key] - (epoch(observation) + lag) <= interval, key
+            observation += timedelta(seconds=interval)
+            checked += 1
+        counts.append(checked)
+    assert all(timestamp < f'{datetime.fromtimestamp(end, JST):%Y-%m-%d %H:%M:%S}' for _, timestamp in saved_at)
+    return counts
+
+
+def test_stations_are_polled_within_an_interval_of_publishing(utc, db):
+    scheduler, stations, end, saved_at = run_scheduler(db, START, 6)
+    first = START.replace(minute=0) + timedelta(hours=1)
+    counts = assert_saved_within_an_interval(stations, first, end, saved_at)
+    assert all(checked >= 4 * 3600 // (s['update_interval'] * 60) for s, checked in zip(stations, counts))
+    # No tight polling loop: about one fetch per published page, plus retries
+    assert scheduler.stats['polls'] < 4 * sum(6 * 3600 // (s['update_interval'] * 60) for s in stations)
+
+
+def test_time_only_pages_keep_polling_across_midnight(utc, db):
+    # Pages without a date column: just after midnight the newest rows are still yesterday's
+    start = datetime(2024, 7, 1, 23, 20)
+    scheduler, stations, end, saved_at = run_scheduler(db, start, 3, dated=False)
+    assert_saved_within_an_interval(stations, datetime(2024, 7, 1, 23, 30), end, saved_at)
+    assert ('iragomisaki_vtss', '2024-07-01 23:45:00') in saved_at
+    assert ('iragomisaki_vtss', '2024-07-02 01:00:00') in saved_at
+    for state in scheduler.state.values():
+        assert state['next_due'] - end < 3600
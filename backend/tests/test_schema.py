@@ -0,0 +1,97 @@
+import contextlib
+import io
+import sqlite3
+
+import pytest
+
+from app import WeatherDatabase
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS weather_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_name TEXT NOT NULL,
+        station_code TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        wind_direction TEXT,
+        wind_speed REAL,
+        wave_height REAL,
+        created_at TEXT NOT NULL,
+        UNIQUE(station_code, timestamp)
+    )
+'''
+
+
+def legacy_rows():
+    return [(f'観測地点{n}', f'station_{n}', f'2024-07-01T{hour:02d}:00:00', '北東', hour + n / 10,
+             None if hour % 2 else 0.5, f'2024-07-01T{hour:02d}:05:00.250000')
+            for n in (1, 2) for hour in range(6)]
+
+
+def insert_legacy(path, rows):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.executemany('''
+            INSERT OR REPLACE INTO weather_data
+            (station_name, station_code, timestamp, wind_direction, wind_speed, wave_height, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    conn.close()
+
+
+def open_database(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return WeatherDatabase(path)
+
+
+def as_legacy(records):
+    return sorted((r['station_name'], r['station_code'], r['timestamp'].replace(' ', 'T'), r['wind_direction'],
+                   r['wind_speed'], r['wave_height'], r['created_at']) for r in records)
+
+
+def test_legacy_database_is_migrated_on_open(db_path):
+    rows = legacy_rows()
+    insert_legacy(db_path, rows)
+    db = open_database(db_path)
+    cursor = db.connection().cursor()
+    
+    assert not db.has_legacy_schema(cursor)
+    assert cursor.execute("SELECT type FROM sqlite_master WHERE name = 'weather_data'").fetchone() == ('view',)
+    assert cursor.execute('SELECT COUNT(*) FROM stations').fetchone() == (2,)
+    assert as_legacy(db.get_weather_data()) == sorted(rows)
+    assert db.get_data_count() == 12
+    changes, _, _ = db.get_changes(since=0)
+    assert len(changes) == db.get_change_seq() == 12
+    (hour,) = db.get_rollup_data('hour', '2024-07-01T05:00:00', '2024-07-01T05:00:00', 'station_2')
+    assert (hour['sample_count'], hour['wind_speed']) == (1, 5.2)
+
+
+def test_interrupted_migration_resumes_and_copies_later_writes(db_path, monkeypatch):
+    rows = legacy_rows()
+    insert_legacy(db_path, rows)
+    # Open without the automatic migration, then run it by hand as manage.py migrate-schema does
+    monkeypatch.setattr(WeatherDatabase, 'migrate_legacy_schema', lambda self, batch_size=50000: 0)
+    db = open_database(db_path)
+    monkeypatch.undo()
+    
+    copy = WeatherDatabase._copy_legacy_rows
+    batches = []
+    
+    def interrupted(self, cursor, condition, params):
+        batches.append(params)
+        if len(batches) == 2:
+            raise KeyboardInterrupt
+        return copy(self, cursor, condition, params)
+    monkeypatch.setattr(WeatherDatabase, '_copy_legacy_rows', interrupted)
+    with pytest.raises(KeyboardInterrupt), contextlib.redirect_stdout(io.StringIO()):
+        db.migrate_legacy_schema(batch_size=5)
+    monkeypatch.undo()
+    
+    # The old scraper keeps writing until the final switch: a correction and a new row
+    corrected = rows[0][:4] + (9.9,) + rows[0][5:6] + ('2024-07-01T07:00:00',)
+    added = ('観測地点1', 'station_1', '2024-07-01T06:00:00', '北', 1.0, 0.5, '2024-07-01T07:00:00')
+    insert_legacy(db_path, [corrected, added])
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert db.migrate_legacy_schema(batch_size=5) == 13
+    assert as_legacy(db.get_weather_data()) == sorted([corrected, added] + rows[1:])
@@ -0,0 +1,74 @@
+import contextlib
+import io
+import json
+from datetime import datetime, timedelta
+
+from app import StationFetchCache
+from stubs import StubSession, make_scraper, make_stations, station_page
+
+END = datetime(2024, 7, 1, 12, 0)
+
+
+def scrape(session, stations, cache_path):
+    """One cron run: a fresh scraper and fetch cache, committed after the scrape"""
+    scraper = make_scraper(session, stations, StationFetchCache(cache_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = scraper.scrape_all_stations()
+    scraper.fetch_cache.commit()
+    return scraper, data
+
+
+def publish(session, stations, end):
+    for station in stations:
+        session.pages[station['url']] = station_page(end, interval=station['update_interval'])
+
+
+def test_unchanged_reference_still_aligns_changed_stations(tmp_path):
+    session, stations = StubSession(), make_stations()
+    cache_path = str(tmp_path / 'fetch_cache.json')
+    publish(session, stations, END)
+    _, first = scrape(session, stations, cache_path)
+    
+    # Only station_1 publishes a new page; the reference page answers 304
+    session.pages[stations[1]['url']] = station_page(END + timedelta(minutes=30), interval=30)
+    scraper, second = scrape(session, stations, cache_path)
+    
+    assert scraper.unchanged_stations == {'iragomisaki_vtss', 'station_2'}
+    reference_times = [d.timestamp for d in second if d.station_code == 'iragomisaki_vtss']
+    assert reference_times == [d.timestamp for d in first if d.station_code == 'iragomisaki_vtss']
+    for station in stations:
+        assert sum(d.station_code == station['code'] for d in second) == len(reference_times)
+
+
+def test_every_page_unchanged_saves_nothing(tmp_path):
+    session, stations = StubSession(), make_stations()
+    cache_path = str(tmp_path / 'fetch_cache.json')
+    publish(session, stations, END)
+    scrape(session, stations, cache_path)
+    
+    session.requests.clear()
+    scraper, data = scrape(session, stations, cache_path)
+    assert data == []
+    assert scraper.all_unchanged()
+    assert all(headers.get('If-None-Match') for _, headers in session.requests)
+
+
+def test_cache_without_rows_refetches_unchanged_pages(tmp_path):
+    session, stations = StubSession(), make_stations()
+    cache_path = str(tmp_path / 'fetch_cache.json')
+    publish(session, stations, END)
+    _, first = scrape(session, stations, cache_path)
+    
+    # A fetch cache written before rows were stored
+    with open(cache_path, encoding='utf-8') as f:
+        entries = json.load(f)
+    for entry in entries.values():
+        del entry['records']
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    
+    session.pages[stations[1]['url']] = station_page(END + timedelta(minutes=30), interval=30)
+    _, second = scrape(session, stations, cache_path)
+    assert {d.station_code for d in second} == {station['code'] for station in stations}
+    assert [d for d in second if d.station_code == 'iragomisaki_vtss'] == \
+        [d for d in first if d.station_code == 'iragomisaki_vtss']
@@ -0,0 +1,51 @@
+import socket
+import time
+import http.client
+
+
+def get(server, path, timeout=5):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_silent_connections_do_not_hold_workers(server):
+    # More connections than workers that never send a request
+    idle = [socket.create_connection(server.server_address) for _ in range(5)]
+    try:
+        time.sleep(0.2)
+        start = time.monotonic()
+        status, _ = get(server, '/api/stations', timeout=3)
+        assert status == 200
+        assert time.monotonic() - start < 1
+    finally:
+        for sock in idle:
+            sock.close()
+
+
+def test_silent_connections_are_closed_after_the_keepalive_timeout(server):
+    sock = socket.create_connection(server.server_address)
+    sock.settimeout(5)
+    try:
+        start = time.monotonic()
+        assert sock.recv(1) == b''
+        assert 1.5 < time.monotonic() - start < 4
+    finally:
+        sock.close()
+
+
+def test_keepalive_connection_serves_several_requests(server):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    try:
+        for _ in range(3):
+            conn.request('GET', '/api/stations')
+            response = conn.getresponse()
+            assert response.status == 200
+            response.read()
+            time.sleep(0.05)  # Long enough for the connection to be parked between requests
+    finally:
+        conn.close()
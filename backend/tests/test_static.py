@@ -0,0 +1,106 @@
+import email.utils
+import gzip
+import http.client
+import os
+
+import pytest
+
+from app import get_static_files
+
+ASSET = 'assets/index-Bq3xY7_a.js'
+
+
+@pytest.fixture
+def static_root(tmp_path, server):
+    """A frontend build under tmp_path/static served by `server`; a secret file sits next to it"""
+    root = tmp_path / 'static'
+    (root / 'assets').mkdir(parents=True)
+    (root / 'index.html').write_bytes(b'<!doctype html><div id="root"></div>')
+    (root / ASSET).write_bytes(b'console.log("app");' * 200)
+    (tmp_path / 'secret.txt').write_bytes(b'do not serve')
+    server.RequestHandlerClass.static_root = str(root)
+    return root
+
+
+def request(server, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+
+def test_paths_outside_the_root_are_not_served(static_root, server):
+    index = (static_root / 'index.html').read_bytes()
+    os.symlink(static_root.parent / 'secret.txt', static_root / 'link.txt')
+    for path in ('/static/../secret.txt', '/static/%2e%2e/secret.txt', '/static/assets/..%2f..%2fsecret.txt',
+                 '/static/link.txt', '/static/%00index.html'):
+        status, _, body = request(server, path)
+        assert (status, body) == (200, index), path
+
+
+def test_hashed_assets_are_immutable_and_revalidate_to_304(static_root, server):
+    status, headers, body = request(server, f'/static/{ASSET}')
+    assert status == 200
+    assert body == (static_root / ASSET).read_bytes()
+    assert headers['Content-Type'] == 'application/javascript; charset=utf-8'
+    assert headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    
+    status, _, body = request(server, f'/static/{ASSET}', {'If-None-Match': headers['ETag']})
+    assert (status, body) == (304, b'')
+    status, _, _ = request(server, f'/static/{ASSET}', {'If-Modified-Since': headers['Last-Modified']})
+    assert status == 304
+    long_ago = email.utils.formatdate(0, usegmt=True)
+    status, _, _ = request(server, f'/static/{ASSET}', {'If-Modified-Since': long_ago})
+    assert status == 200
+    # If-None-Match wins over If-Modified-Since
+    status, _, _ = request(server, f'/static/{ASSET}',
+                           {'If-None-Match': '"other"', 'If-Modified-Since': headers['Last-Modified']})
+    assert status == 200
+    
+    _, headers, _ = request(server, '/static/index.html')
+    assert headers['Cache-Control'] == 'no-cache'
+
+
+def test_precompressed_siblings_follow_accept_encoding(static_root, server):
+    original = (static_root / ASSET).read_bytes()
+    (static_root / (ASSET + '.gz')).write_bytes(gzip.compress(original))
+    (static_root / (ASSET + '.br')).write_bytes(b'brotli bytes')  # Served as they are, never decoded
+    
+    cases = [(None, None), ('gzip', 'gzip'), ('gzip, br', 'br'), ('br;q=0, gzip', 'gzip'), ('identity', None)]
+    etags = set()
+    for accept, encoding in cases:
+        _, headers, body = request(server, f'/static/{ASSET}', {'Accept-Encoding': accept} if accept else {})
+        assert headers['Content-Encoding'] == encoding, accept
+        assert headers['Vary'] == 'Accept-Encoding'
+        assert (gzip.decompress(body) if encoding == 'gzip' else body) == (
+            b'brotli bytes' if encoding == 'br' else original)
+        etags.add(headers['ETag'])
+    assert len(etags) == 3  # One validator per representation
+    
+    # A sibling older than its original is stale and ignored
+    os.utime(static_root / (ASSET + '.br'), ns=(0, 0))
+    get_static_files(str(static_root)).check_interval = 0
+    _, headers, _ = request(server, f'/static/{ASSET}', {'Accept-Encoding': 'br'})
+    assert headers['Content-Encoding'] is None
+
+
+def test_unknown_routes_fall_back_to_the_cached_index(static_root, server):
+    status, headers, body = request(server, '/static/stations/iragomisaki')
+    assert (status, body) == (200, (static_root / 'index.html').read_bytes())
+    assert headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert headers['Cache-Control'] == 'no-cache'
+    status, _, _ = request(server, '/static/deep/route', {'If-None-Match': headers['ETag']})
+    assert status == 304
+    
+    # A rebuilt index.html is picked up once the entry is revalidated
+    (static_root / 'index.html').write_bytes(b'<!doctype html><div id="app"></div>')
+    get_static_files(str(static_root)).check_interval = 0
+    status, _, body = request(server, '/static/stations/daiosaki')
+    assert (status, body) == (200, b'<!doctype html><div id="app"></div>')
+    
+    (static_root / 'index.html').unlink()
+    status, _, _ = request(server, '/static/stations/daiosaki')
+    assert status == 404
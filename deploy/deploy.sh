@@ -46,10 +46,10 @@ sudo ln -sf $DB_DIR/weather_data.db $PROJECT_DIR/backend/weather_data.db
 
 # 7. systemdサービス設定
 echo "7. systemdサービスを設定中..."
-sudo cp deploy/isewan-weather.service /etc/systemd/system/
+sudo cp deploy/isewan-weather.service deploy/isewan-weather-scraper.service /etc/systemd/system/
 sudo systemctl daemon-reload
-sudo systemctl enable isewan-weather
-sudo systemctl start isewan-weather
+sudo systemctl enable isewan-weather isewan-weather-scraper
+sudo systemctl start isewan-weather isewan-weather-scraper
 
 # 8. Nginx設定
 echo "8. Nginxを設定中..."
@@ -80,10 +80,11 @@ echo "=== デプロイ完了 ==="
 echo ""
 echo "サービス状態確認:"
 echo "  sudo systemctl status isewan-weather"
+echo "  sudo systemctl status isewan-weather-scraper"
 echo "  sudo systemctl status nginx"
 echo ""
 echo "ログ確認:"
 echo "  sudo journalctl -u isewan-weather -f"
-echo "  sudo tail -f /var/log/isewan-weather-cron.log"
+echo "  sudo journalctl -u isewan-weather-scraper -f"
 echo ""
 echo "アクセス: http://$DOMAIN"
\ No newline at end of file
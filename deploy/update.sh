@@ -12,7 +12,7 @@ cd $PROJECT_DIR
 
 # 1. サービス停止
 echo "1. サービスを停止中..."
-sudo systemctl stop isewan-weather
+sudo systemctl stop isewan-weather isewan-weather-scraper
 
 # 2. バックアップ作成
 echo "2. データベースをバックアップ中..."
@@ -28,13 +28,16 @@ source venv/bin/activate
 pip install -r backend/requirements.txt
 npm install
 
+# データベース形式の移行（移行済みの場合は何もしません）
+sudo -u www-data venv/bin/python backend/manage.py --db /var/lib/isewan-weather/weather_data.db migrate-schema
+
 # 5. フロントエンドビルド
 echo "5. フロントエンドを再ビルド中..."
 npm run build
 
 # 6. サービス再開
 echo "6. サービスを再開中..."
-sudo systemctl start isewan-weather
+sudo systemctl start isewan-weather isewan-weather-scraper
 sudo systemctl restart nginx
 
 echo "=== 更新完了 ==="
@@ -3,5 +3,9 @@
 # Start cron daemon
 service cron start
 
+# Start the resident scrape scheduler
+mkdir -p /app/logs
+python -u scraper_cron.py --daemon >> /app/logs/scraper.log 2>&1 &
+
 # Start Python application
 exec python app.py
\ No newline at end of file
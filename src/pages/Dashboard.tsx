@@ -12,28 +12,28 @@ export const Dashboard: React.FC = () => {
   const [lastUpdated, setLastUpdated] = useState<Date | null>(null);
 
   useEffect(() => {
-    loadLatestData();
     loadRecentData();
     
-    // Set up auto-refresh every 5 minutes
-    const interval = setInterval(() => {
-      loadLatestData();
-      loadRecentData();
-    }, 5 * 60 * 1000); // 5 minutes
+    // Pushed by the backend as soon as new observations are saved
+    const unsubscribe = apiService.subscribeLatest(
+      (data) => {
+        setLatestData(data);
+        setLastUpdated(new Date());
+      },
+      (updates) => {
+        setLatestData((current) => {
+          const byStation = new Map(current.map((record) => [record.station_code, record]));
+          updates.forEach((record) => byStation.set(record.station_code, record));
+          return Array.from(byStation.values()).sort((a, b) => a.station_code.localeCompare(b.station_code));
+        });
+        setLastUpdated(new Date());
+        loadRecentData();
+      }
+    );
     
-    return () => clearInterval(interval);
+    return unsubscribe;
   }, []);
 
-  const loadLatestData = async () => {
-    try {
-      const data = await apiService.getLatestData();
-      setLatestData(data);
-      setLastUpdated(new Date());
-    } catch (error) {
-      console.error('Error loading latest data:', error);
-    }
-  };
-
   const loadRecentData = async () => {
     try {
       // Get data from last 3 hours
@@ -113,7 +113,7 @@ export const Dashboard: React.FC = () => {
             <strong>データ項目:</strong> 風向・風速・波高
           </div>
           <div>
-            <strong>自動更新:</strong> 5分間隔<br />
+            <strong>自動更新:</strong> 新着データを即時反映<br />
             <strong>時間精度:</strong> 時まで
           </div>
           <div>
@@ -4,7 +4,7 @@ import { apiService } from '../services/api';
 import { DateTimeSelector } from '../components/DateTimeSelector';
 import { StationSelector } from '../components/StationSelector';
 import { DataTable } from '../components/DataTable';
-import { exportToCSV, exportToCSVForMarine, formatDateTimeForFilename } from '../utils/csvExport';
+import { downloadFromUrl, exportToCSVForMarine } from '../utils/csvExport';
 import { Download, Search, Database } from 'lucide-react';
 
 export const DownloadPage: React.FC = () => {
@@ -15,17 +15,24 @@ export const DownloadPage: React.FC = () => {
   const [endDate, setEndDate] = useState('');
   const [isSearching, setIsSearching] = useState(false);
 
-  const handleSearch = async () => {
-    // バリデーション
+  // バリデーション
+  const isValidRange = () => {
     if (startDate && endDate) {
       const startTime = new Date(startDate).getTime();
       const endTime = new Date(endDate).getTime();
       
       if (startTime >= endTime) {
         alert('開始時間は終了時間より前に設定してください');
-        return;
+        return false;
       }
     }
+    return true;
+  };
+
+  const handleSearch = async () => {
+    if (!isValidRange()) {
+      return;
+    }
 
     setIsSearching(true);
     try {
@@ -43,9 +50,9 @@ export const DownloadPage: React.FC = () => {
     }
   };
 
+  // 検索は不要：サーバーが指定期間のCSVを直接ストリーミングする（長期間でもブラウザに全件を読み込まない）
   const handleDownload = () => {
-    if (filteredData.length === 0) {
-      alert('ダウンロードするデータがありません');
+    if (!isValidRange()) {
       return;
     }
     
@@ -56,7 +63,10 @@ export const DownloadPage: React.FC = () => {
     const stationStr = selectedStation ? `_${selectedStation}` : '_all_stations';
     const filename = `isewan_weather_${dateStr}_${timeStr}${stationStr}.csv`;
     
-    exportToCSV(filteredData, filename);
+    downloadFromUrl(
+      apiService.getExportUrl('csv', startDate || undefined, endDate || undefined, selectedStation || undefined),
+      filename
+    );
   };
 
   const handleMarineDownload = () => {
@@ -93,7 +103,7 @@ export const DownloadPage: React.FC = () => {
       <div className="bg-white p-6 rounded-lg shadow-md">
         <h2 className="text-2xl font-bold text-gray-900 mb-6">データダウンロード</h2>
         <p className="text-gray-600 mb-6">
-          期間と観測地点を指定してデータを検索し、CSVファイルとしてダウンロードできます。
+          期間と観測地点を指定して、CSVファイルとしてダウンロードできます（検索なしで直接ダウンロードできます）。検索すると内容をプレビューできます。
           「湾内乗下船用」を選択すると、伊良湖岬基準の時間軸で3箇所の観測データを横並びで出力できます。
         </p>
       </div>
@@ -144,7 +154,6 @@ export const DownloadPage: React.FC = () => {
             ) : (
               <button
                 onClick={handleDownload}
-                disabled={filteredData.length === 0}
                 className="flex items-center gap-2 px-4 py-2 bg-green-600 text-white rounded-lg hover:bg-green-700 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
               >
                 <Download className="w-4 h-4" />
@@ -167,7 +176,7 @@ export const DownloadPage: React.FC = () => {
         <div className="bg-yellow-50 border border-yellow-200 rounded-lg p-4">
           <p className="text-yellow-800">
             <strong>注意:</strong> 検索結果が100件を超えています。プレビューでは最初の100件のみ表示されていますが、
-            CSVダウンロードでは全{filteredData.length}件のデータが含まれます。
+            CSVダウンロードでは指定期間の全データが含まれます。
           </p>
         </div>
       )}
@@ -1,4 +1,4 @@
-import { WeatherData, Station } from '../types/weather';
+import { WeatherData, Station, ScrapeJob } from '../types/weather';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
@@ -28,11 +28,21 @@ export class ApiService {
     return this.fetchWithErrorHandling(`${API_BASE_URL}/api/weather/latest`);
   }
 
+  // Server-Sent Events: a full snapshot on connect, then the stations whose latest record changed.
+  // EventSource reconnects on its own and resumes with Last-Event-ID.
+  subscribeLatest(onSnapshot: (data: WeatherData[]) => void, onUpdate: (data: WeatherData[]) => void): () => void {
+    const source = new EventSource(`${API_BASE_URL}/api/weather/stream`);
+    source.addEventListener('snapshot', (event) => onSnapshot(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('observations', (event) => onUpdate(JSON.parse((event as MessageEvent).data)));
+    return () => source.close();
+  }
+
   async getWeatherData(
     startDate?: string,
     endDate?: string,
     stationCode?: string,
-    limit?: number
+    limit?: number,
+    resolution?: 'raw' | 'hour' | 'day' | 'auto'
   ): Promise<WeatherData[]> {
     const params = new URLSearchParams();
     
@@ -40,17 +50,47 @@ export class ApiService {
     if (endDate) params.append('end_date', endDate);
     if (stationCode) params.append('station_code', stationCode);
     if (limit) params.append('limit', limit.toString());
+    if (resolution) params.append('resolution', resolution);
 
     const url = `${API_BASE_URL}/api/weather/data${params.toString() ? '?' + params.toString() : ''}`;
     return this.fetchWithErrorHandling(url);
   }
 
-  async scrapeData(): Promise<{ success: boolean; message: string; records_saved?: number }> {
+  getExportUrl(
+    format: 'csv' | 'ndjson' = 'csv',
+    startDate?: string,
+    endDate?: string,
+    stationCode?: string
+  ): string {
+    const params = new URLSearchParams({ format });
+
+    if (startDate) params.append('start_date', startDate);
+    if (endDate) params.append('end_date', endDate);
+    if (stationCode) params.append('station_code', stationCode);
+
+    return `${API_BASE_URL}/api/weather/export?${params.toString()}`;
+  }
+
+  async startScrape(): Promise<ScrapeJob> {
+    // Returns the running job if a scrape is already in progress
     return this.fetchWithErrorHandling(`${API_BASE_URL}/api/weather/scrape`, {
       method: 'POST',
     });
   }
 
+  async getScrapeJob(jobId: string): Promise<ScrapeJob> {
+    return this.fetchWithErrorHandling(`${API_BASE_URL}/api/weather/scrape/${jobId}`);
+  }
+
+  async scrapeData(pollInterval = 1000): Promise<ScrapeJob> {
+    let job = await this.startScrape();
+    while (job.status === 'running') {
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+      job = await this.getScrapeJob(job.job_id);
+    }
+    return job;
+  }
+
   async getStations(): Promise<Station[]> {
     return this.fetchWithErrorHandling(`${API_BASE_URL}/api/stations`);
   }
@@ -7,6 +7,11 @@ export interface WeatherData {
   wind_speed?: number;
   wave_height?: number;
   created_at?: string;
+  // Present on rollup rows (resolution=hour|day)
+  resolution?: 'hour' | 'day';
+  sample_count?: number;
+  wind_speed_min?: number;
+  wind_speed_max?: number;
 }
 
 export interface Station {
@@ -16,6 +21,24 @@ export interface Station {
   hasWaveHeight: boolean;
 }
 
+export interface ScrapeJob {
+  job_id: string;
+  status: 'running' | 'succeeded' | 'failed';
+  success: boolean;
+  message: string;
+  records_saved: number | null;
+  requests: number;
+  requested_at: string;
+  finished_at: string | null;
+  stations: {
+    code: string;
+    name: string;
+    status: 'pending' | 'done' | 'unchanged' | 'no_data';
+    seconds: number | null;
+    records: number | null;
+  }[];
+}
+
 export const STATIONS: Station[] = [
   {
     name: '伊良湖岬',
@@ -52,6 +52,17 @@ export function exportToCSV(data: WeatherData[], filename: string = 'weather_dat
 }
 }
 
+// サーバー側でストリーミング生成されたファイルをそのままダウンロードする（大容量でもメモリを消費しない）
+export function downloadFromUrl(url: string, filename: string): void {
+  const link = document.createElement('a');
+  link.setAttribute('href', url);
+  link.setAttribute('download', filename);
+  link.style.visibility = 'hidden';
+  document.body.appendChild(link);
+  link.click();
+  document.body.removeChild(link);
+}
+
 function formatTimestampForCSV(timestamp: string): string {
   if (!timestamp) return '';
   const date = new Date(timestamp);